@@ -13,6 +13,7 @@ MAX_FILE_SEARCH = 2 # Depth from job dir
 REGION_ORTHOPHOTO = "region_orthophoto.tif"
 REGION_ORTHOPHOTO_PNG = "region_orthophoto.png"
 REGION_COG = "region_cog.tif"
+REGION_TILE_ARCHIVE = "region_tiles.mbtiles" # Pre-seeded tile pyramid, next to the COG
 REGION_FILE = "region_contour.geojson"
 SEARCH_TARGETS_FILE = "targets.geojson"
 APPROVED_TARGETS_FILE = "approved_targets.geojson"
@@ -23,9 +24,61 @@ MACRO_ROUTES_FILE = "macro_routes.geojson"
 MICRO_ROUTES_FILE = "micro_routes.geojson"
 CV_OUTPUT_FILE = "processed_region.tif"
 CV_OUTPUT_FILE_PNG = "processed_region.png"
+CV_CACHE_FILE = "processed_region_cache.npy"
+CV_THRESHOLD_INDEX_FILE = "threshold_index.npz"
+CV_PREVIEW_FILE = "processed_preview.tif"
+CV_PREVIEW_FILE_PNG = "processed_preview.png"
+CV_REGION_INDEX_FILE = "region_index.npz"
+CV_CANDIDATES_FILE = "candidate_regions.geojson"
+CV_CHANGED_CELLS_FILE = "changed_cells.geojson"
+CV_RESAMPLED_FILE = "resampled_orthophoto.tif"
+CV_MEMORY_PROFILE_FILE = "memory_profile.json"
 BINARY_MASK = "binary_mask.tif"
 BINARY_MASK_PNG = "binary_mask.png"
 
+# Search (CV) processing limits
+CV_MAX_MEMORY_BYTES = int(os.getenv("CV_MAX_MEMORY_BYTES", 2 * 1024**3)) # Working-set budget per process
+CV_PNG_MAX_SIZE = int(os.getenv("CV_PNG_MAX_SIZE", 8192)) # Longest side of PNG previews for large rasters
+CV_WORKERS = int(os.getenv("CV_WORKERS", os.cpu_count() or 1)) # Worker processes for tiled processing
+CV_FILTER_BACKEND = os.getenv("CV_FILTER_BACKEND", "reference") # See plant_search/filter_backends.py
+CV_TRACE_MEMORY = os.getenv("CV_TRACE_MEMORY", "0") == "1" # Per-stage memory high-water marks (slower)
+
+# Search engine: "filters" (ExG filter chain) or "onnx" (segmentation model, see plant_search/onnx_detector.py)
+CV_SEARCH_ENGINE = os.getenv("CV_SEARCH_ENGINE", "filters")
+CV_DETECTOR_MODEL = os.getenv("CV_DETECTOR_MODEL", "") # ONNX model used by the "onnx" engine
+CV_DETECTOR_THREADS = int(os.getenv("CV_DETECTOR_THREADS", os.cpu_count() or 1)) # onnxruntime intra-op threads
+CV_DETECTOR_BATCH_SIZE = int(os.getenv("CV_DETECTOR_BATCH_SIZE", 8)) # Tiles per inference call
+CV_DETECTOR_TILE_SIZE = int(os.getenv("CV_DETECTOR_TILE_SIZE", 512)) # Model input edge length
+CV_DETECTOR_OVERLAP = int(os.getenv("CV_DETECTOR_OVERLAP", 32)) # Context pixels discarded on each tile side
+
+# Macro planning: a cell's workload is the length (m) of the minimum spanning tree of its targets
+# plus this weight times their canopy area (m²), i.e. the walking distance that treating one m² of
+# canopy is worth. Set it to treatment time per m² x walking speed (e.g. 5 s/m² at 1 m/s -> 5);
+# 0 ranks cells by walking distance only.
+CANOPY_WORKLOAD_PER_M2 = float(os.getenv("CANOPY_WORKLOAD_PER_M2", 1.0))
+
+# Open COG readers kept by the tile endpoints of each process
+READER_POOL_MAX_OPEN = int(os.getenv("READER_POOL_MAX_OPEN", 32)) # Open file budget
+READER_POOL_IDLE_SECONDS = float(os.getenv("READER_POOL_IDLE_SECONDS", 300)) # Readers idle longer are closed
+
+# Rendered map tiles, cached in memory and under each job's tiles/ directory
+TILE_CACHE_DIR = "cache" # Inside the job's tiles directory
+TILE_CACHE_MEMORY_BYTES = int(os.getenv("TILE_CACHE_MEMORY_BYTES", 256 * 1024**2)) # In-process LRU budget
+TILE_CACHE_MAX_AGE = int(os.getenv("TILE_CACHE_MAX_AGE", 60)) # Seconds browsers reuse a tile before revalidating
+TILE_COVERAGE_SIZE = int(os.getenv("TILE_COVERAGE_SIZE", 1024)) # Cells along the longer side of a COG's coverage index
+
+# Tile serving runtime, see services/tile_runtime.py
+TILE_RENDER_WORKERS = int(os.getenv("TILE_RENDER_WORKERS", min(8, os.cpu_count() or 1))) # Concurrent tile renders
+GDAL_CACHEMAX_MB = int(os.getenv("GDAL_CACHEMAX_MB", 512)) # GDAL block cache, shared by the process
+GDAL_NUM_THREADS = os.getenv("GDAL_NUM_THREADS", "ALL_CPUS") # Threads decoding the blocks of one read
+GDAL_VSI_CACHE_BYTES = int(os.getenv("GDAL_VSI_CACHE_BYTES", 64 * 1024**2)) # Per-file read-ahead cache; 0 disables it
+TILE_SEED_WORKERS = int(os.getenv("TILE_SEED_WORKERS", os.cpu_count() or 1)) # Processes pre-seeding tile archives
+TILE_SEED_CHUNK = int(os.getenv("TILE_SEED_CHUNK", 64)) # Tiles per seeding task and progress update
+
+# Content-addressed cache of CV stage outputs, per job
+ARTIFACT_CACHE_DIR = "cache" # Inside the job directory
+ARTIFACT_CACHE_QUOTA_BYTES = int(os.getenv("ARTIFACT_CACHE_QUOTA_BYTES", 10 * 1024**3)) # Disk quota per job
+
 # Base directory for all storage
 BASE_DIR = "backend/media"
 
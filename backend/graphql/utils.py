@@ -34,7 +34,7 @@ def initialize_target_files(job_path):
     approved_targets = targets_data.copy()
     approved_targets["name"] = "Approved Targets"
     with open(approved_targets_path, "w", encoding="utf-8") as f:
-        json.dump(approved_targets, f, indent=4)
+        json.dump(approved_targets, f, separators=(",", ":"))
 
     # Reset 'removed_targets' to new data value
     removed_targets = targets_data.copy()
@@ -42,7 +42,7 @@ def initialize_target_files(job_path):
     removed_targets["name"] = "Removed Targets"
 
     with open(removed_targets_path, "w", encoding="utf-8") as f:
-        json.dump(removed_targets, f, indent=4)
+        json.dump(removed_targets, f, separators=(",", ":"))
 
 
 def ensure_audit_files(job_path):
@@ -1,6 +1,7 @@
 import geopandas as gpd
 import pandas as pd
 import numpy as np
+import shapely
 
 # TODO: remove plant_search dependency
 from backend.macro_planning.macro_utils import calculate_intra_cell_workload
@@ -110,20 +111,23 @@ def create_cell_workloads_df(cells_gdf, targets_gdf, cell_targets_df=None):
     if cell_targets_df is None:
         cell_targets_df = create_cell_targets_df(cells_gdf, targets_gdf)
 
-    cell_workloads = []
-    for cell_id, group in cell_targets_df.groupby("cell_id"):
-        target_ids = group['target_id'].values # IDs of all targets associated with this cell_id
-
-        # Get GDFs of all these targets
-        cell_targets = targets_gdf[targets_gdf['target_id'].isin(target_ids)]
+    # Look targets up by their integer index rather than matching IDs, which may be
+    # job-scoped integers, uuid4 strings from older searches, or a mix of both
+    target_coords = shapely.get_coordinates(targets_gdf.geometry.values)
+    target_areas = targets_gdf["area_m2"].to_numpy() if "area_m2" in targets_gdf else None
+    target_positions = targets_gdf.index.get_indexer(cell_targets_df["target_index"])
 
-        # Extract coordinates from geometry
-        targets_coords = np.array([[geom.x, geom.y] for geom in cell_targets["geometry"]])
+    cell_workloads = []
+    for cell_id, positions in sorted(cell_targets_df.groupby("cell_id").indices.items()):
+        positions = target_positions[positions] # Rows of this cell's targets in targets_gdf
+        targets_coords = target_coords[positions]
 
-        workload = calculate_intra_cell_workload(targets_coords) if len(targets_coords) > 1 else 0
+        # Targets detected with canopy attributes also weigh in their area
+        canopy_areas = target_areas[positions] if target_areas is not None else None
+        workload = calculate_intra_cell_workload(targets_coords, canopy_areas)
         cell_workloads.append({
             "cell_id": cell_id,
-            "target_count": len(group),
+            "target_count": len(positions),
             "workload": workload
         })
 
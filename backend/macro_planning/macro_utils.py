@@ -5,28 +5,39 @@ from scipy.spatial import distance_matrix
 from scipy.sparse.csgraph import minimum_spanning_tree
 from ortools.constraint_solver import pywrapcp, routing_enums_pb2
 
+from backend.config import CANOPY_WORKLOAD_PER_M2
 
-def calculate_intra_cell_workload(cell_targets):
+
+def calculate_intra_cell_workload(cell_targets, canopy_areas=None, canopy_weight=CANOPY_WORKLOAD_PER_M2):
     """
-    Calculate the intra-cell workload as the sum of the Minimum Spanning Tree (MST) distances.
+    Calculate the intra-cell workload as the sum of the Minimum Spanning Tree (MST) distances,
+    plus the work of treating the targets' canopy when its area is known.
 
     Parameters:
     - cell_targets: ndarray of shape (n, 2)
         Coordinates of the targets within a cell.
+    - canopy_areas: optional ndarray of shape (n,)
+        Canopy area (m²) of each target, e.g. the targets' "area_m2".
+    - canopy_weight: float
+        Metres of travel that treating one m² of canopy is worth (see CANOPY_WORKLOAD_PER_M2 in config).
 
     Returns:
-    - mst_distance: float
-        Total intra-cell workload based on MST distances.
+    - workload: float
+        Total intra-cell workload based on MST distances and canopy area.
     """
+    canopy_workload = 0
+    if canopy_areas is not None:
+        canopy_workload = canopy_weight * np.nansum(canopy_areas)
+
     if cell_targets.shape[0] < 2:
-        return 0
+        return canopy_workload
 
     # Compute pairwise distance matrix
     pairwise_dist = distance_matrix(cell_targets, cell_targets)
 
     mst = minimum_spanning_tree(pairwise_dist) # Compute MST and sum its edges
     mst_distance = mst.sum()
-    return mst_distance
+    return mst_distance + canopy_workload
 
 
 def calculate_cell_workloads(cells_gdf, targets_gdf):
@@ -68,7 +79,8 @@ def calculate_cell_workloads(cells_gdf, targets_gdf):
         if not cell_targets.empty:
             # Extract target coordinates
             target_coords = np.array([(point.x, point.y) for point in cell_targets["geometry"]])
-            workload = calculate_intra_cell_workload(target_coords)
+            canopy_areas = cell_targets["area_m2"].values if "area_m2" in cell_targets else None
+            workload = calculate_intra_cell_workload(target_coords, canopy_areas)
         else:
             workload = 0  # No targets in the cell
 
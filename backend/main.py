@@ -4,8 +4,6 @@ from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from contextlib import asynccontextmanager
-from PIL import Image
-from io import BytesIO
 import os
 import time
 import logging
@@ -14,6 +12,10 @@ import strawberry
 from strawberry.fastapi import GraphQLRouter
 
 from backend.graphql.schema import schema
+from backend.services.reader_pool import reader_pool
+from backend.services.tile_coverage import transparent_tile
+from backend.services.tile_runtime import set_gdal_cache, start_tile_executor, shutdown_tile_executor
+from backend.services.tile_archive import tile_archives
 from backend.routes import (
     locations, jobs, upload, download, files, 
     pipeline, targets, tiles, image_search, waypoints
@@ -31,18 +33,16 @@ async def app_lifespan(app: FastAPI):
     """
     Setup tasks for the FastAPI application.
     """
-    global TRANSPARENT_TILE
-
-    # Generate the transparent tile during startup
-    img = Image.new("RGBA", (256, 256), (0, 0, 0, 0))  # Transparent RGBA image
-    buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    buffer.seek(0)
-    TRANSPARENT_TILE = buffer.getvalue()
+    # Encode the shared transparent tile served for empty tiles during startup
+    transparent_tile(256)
+    set_gdal_cache() # Process-wide GDAL block cache
+    start_tile_executor() # Tile render threads, stopped again at shutdown
     # Lifespan enter (app startup)
     yield
     # Lifespan exit (app shutdown)
-    TRANSPARENT_TILE = None  # Clean up the cached tile if needed
+    shutdown_tile_executor()
+    reader_pool.close() # Release pooled COG file handles
+    tile_archives.close()
 
 app = FastAPI(lifespan=app_lifespan)
 
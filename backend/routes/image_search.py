@@ -1,23 +1,45 @@
 from fastapi import APIRouter, BackgroundTasks, File, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from pydantic import BaseModel
 from pathlib import Path
+from typing import Optional
 import cv2
 import os
 import uuid
 import numpy as np
 import json
+import time
+import rasterio
+from rasterio.windows import Window
+from rasterio.errors import RasterioIOError, WindowError
 # import geojson
 from backend.config import (
-    LOCATIONS_DIR, load_data, save_data, REGION_ORTHOPHOTO, CV_OUTPUT_FILE, CV_OUTPUT_FILE_PNG,
-    BINARY_MASK, BINARY_MASK_PNG, SEARCH_TARGETS_FILE,
+    LOCATIONS_DIR, DISPLAY_CRS, load_data, save_data, REGION_ORTHOPHOTO, CV_OUTPUT_FILE, CV_OUTPUT_FILE_PNG,
+    BINARY_MASK, BINARY_MASK_PNG, SEARCH_TARGETS_FILE, CV_MAX_MEMORY_BYTES, CV_WORKERS, CV_FILTER_BACKEND,
+    REGION_COG, CV_PREVIEW_FILE, CV_PREVIEW_FILE_PNG, CV_CACHE_FILE, CV_THRESHOLD_INDEX_FILE,
+    ARTIFACT_CACHE_DIR, REGION_FILE, CV_REGION_INDEX_FILE, CV_CANDIDATES_FILE, CV_RESAMPLED_FILE,
+    CV_MEMORY_PROFILE_FILE, CV_CHANGED_CELLS_FILE, CV_SEARCH_ENGINE, CV_DETECTOR_MODEL, CV_DETECTOR_TILE_SIZE, CV_DETECTOR_OVERLAP, logger,
 )
-from backend.services.plant_search.load_image import load_image
+from backend.services.plant_search.raster_source import RasterSource
 from backend.services.plant_search.image_preprocess import (
-    preprocess_image, threshold_image, identify_targets, assign_target_metadata
+    preprocess_image, assign_target_metadata, write_targets_geojson, filter_params, threshold_cutoff, CLAHE_CLIP_LIMIT
 )
+from backend.services.plant_search.filter_backends import FILTER_BACKENDS
+from backend.services.plant_search.tiled_processing import (
+    preprocess_raster, write_png_preview, estimate_working_set, output_profile
+)
+from backend.services.plant_search.raster_cache import TiledRasterCache
+from backend.services.plant_search.threshold_index import ThresholdIndex
+from backend.services.plant_search.component_stitching import identify_targets_tiled
+from backend.services.plant_search.preview import preprocess_preview
+from backend.services.plant_search.region_coverage import RegionCoverage, REGION_BLOCK_SIZE
+from backend.services.plant_search.coarse_detection import candidate_regions, candidate_block_size, COARSE_DILATION
+from backend.services.plant_search.resampling import analysis_scale, resample_raster
+from backend.services.plant_search.memory_policy import StageMemory
+from backend.services.plant_search.onnx_detector import OnnxDetector, detect_raster, detector_available
+from backend.services.plant_search.change_detection import changed_cells, carry_over_targets
+from backend.services.artifact_cache import ArtifactCache
 from backend.graphql.utils import save_geojson_file, initialize_target_files
-from backend.routes.upload import ensure_crs
 
 router = APIRouter()
 
@@ -25,6 +47,9 @@ router = APIRouter()
 BASE_DIR = Path("jobs_data")
 BASE_DIR.mkdir(exist_ok=True)
 
+# How process_cv scores pixels: the ExG filter chain, or a segmentation model
+SEARCH_ENGINES = ("filters", "onnx")
+
 
 class ThresholdingRequest(BaseModel):
     job_id: str
@@ -34,9 +59,71 @@ class TargetGenerationRequest(BaseModel):
     job_id: str
 
 
-def process_cv_background(job_id: str, background_task_id: str):
+def job_artifact_cache(job_dir: str) -> ArtifactCache:
+    """Cache of CV stage outputs for one job."""
+    return ArtifactCache(os.path.join(job_dir, ARTIFACT_CACHE_DIR))
+
+
+def job_region_paths(job_dir: str) -> list:
+    """
+    Files that restrict the job's search area, if present: the region contour,
+    coarse candidates, and the cells changed since a previous job.
+    """
+    paths = [
+        os.path.join(job_dir, "map", REGION_FILE),
+        os.path.join(job_dir, "search", CV_CANDIDATES_FILE),
+        os.path.join(job_dir, "search", CV_CHANGED_CELLS_FILE),
+    ]
+    return [path for path in paths if os.path.exists(path)]
+
+
+def job_region(job_dir: str, raster_path) -> Optional[RegionCoverage]:
+    """Coverage index of the job's search area over `raster_path` (path or RasterSource), None if it is unrestricted."""
+    region_paths = job_region_paths(job_dir)
+    if not region_paths:
+        return None
+
+    search_dir = os.path.join(job_dir, "search")
+    os.makedirs(search_dir, exist_ok=True)
+    # Blocks as fine as the coarse candidates, so the gaps between them are skipped
+    candidates_path = os.path.join(search_dir, CV_CANDIDATES_FILE)
+    block_size = REGION_BLOCK_SIZE
+    if candidates_path in region_paths:
+        block_size = candidate_block_size(candidates_path, raster_path)
+    return RegionCoverage.open(
+        region_paths, raster_path, os.path.join(search_dir, CV_REGION_INDEX_FILE), block_size
+    )
+
+
+def job_overview_source(job_dir: str) -> str:
+    """The job's COG, whose overviews make reduced reads cheap, or else its orthophoto."""
+    cog_path = os.path.join(job_dir, "tiles", REGION_COG)
+    if os.path.exists(cog_path):
+        return cog_path
+    return os.path.join(job_dir, "orthophoto", REGION_ORTHOPHOTO)
+
+
+def process_cv_background(
+    job_id: str, background_task_id: str, 
+    tiled: Optional[bool] = None, workers: int = CV_WORKERS,
+    filter_backend: str = CV_FILTER_BACKEND,
+    coarse: bool = False, coarse_threshold: Optional[float] = None, coarse_dilation: float = COARSE_DILATION,
+    target_gsd: Optional[float] = None, min_target_diameter: Optional[float] = None,
+    engine: str = CV_SEARCH_ENGINE, previous_job_id: Optional[str] = None
+):
     """
     Applies CV techniques to the job's orthophoto and saves output.
+    Large orthophotos (or `tiled=True`) are processed in windows, spread over `workers` processes;
+    the result is the same either way.
+    `filter_backend` selects the filter chain implementation (see `filter_backends`).
+    With `coarse`, vegetation is first scored on an overview (ExG above `coarse_threshold`, Otsu by default)
+    and the full-resolution chain only runs within `coarse_dilation` of those candidates.
+    With `target_gsd` or `min_target_diameter` (CRS units, metres), the orthophoto is analyzed at a
+    coarser resolution with filter kernels scaled to match; outputs are georeferenced at that resolution.
+    With CV_TRACE_MEMORY=1, each stage's memory high-water mark is saved to search/memory_profile.json.
+    With `engine="onnx"`, pixels are scored by the CV_DETECTOR_MODEL segmentation model instead of the filter chain.
+    With `previous_job_id` (an earlier flight of the same location), only cells whose content changed are
+    searched; generate_targets carries the previous job's targets over everywhere else.
     """
     # 1) Find job from passed ID
     data = load_data()
@@ -55,29 +142,207 @@ def process_cv_background(job_id: str, background_task_id: str):
     output_path = os.path.join(search_dir, CV_OUTPUT_FILE)
     png_path = os.path.join(search_dir, CV_OUTPUT_FILE_PNG)
 
-    # 3) Load and process image
-    image, transform, bounds, image_crs = load_image(ortho_path)
-    processed_image = preprocess_image(image)
-
-    # 5) Save processed image to correct directory
-    cv2.imwrite(str(output_path), processed_image)
-    cv2.imwrite(str(png_path), processed_image)
-
-    # 6) Write outputs to file
+    index_path = os.path.join(search_dir, CV_THRESHOLD_INDEX_FILE)
+    outputs = {CV_OUTPUT_FILE: output_path, CV_OUTPUT_FILE_PNG: png_path, CV_THRESHOLD_INDEX_FILE: index_path}
+
+    # 3) Resolution to analyze at, relative to the orthophoto's
+    ortho = RasterSource(ortho_path)
+    native_gsd = max(ortho.res)
+    try:
+        scale = analysis_scale(native_gsd, target_gsd, min_target_diameter)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 4) Coarse pass: candidate areas from an overview, used as part of the search region
+    candidates_path = os.path.join(search_dir, CV_CANDIDATES_FILE)
+    if coarse:
+        candidate_regions(job_overview_source(job_dir), coarse_threshold, coarse_dilation).to_file(
+            candidates_path, driver="GeoJSON"
+        )
+    elif os.path.exists(candidates_path):
+        os.remove(candidates_path)
+
+    # 4b) Repeat flight: cells that changed since the previous job, also part of the search region
+    changed_path = os.path.join(search_dir, CV_CHANGED_CELLS_FILE)
+    previous_job = None
+    if previous_job_id is not None:
+        previous_job = next((j for j in data["jobs"] if j["id"] == previous_job_id), None)
+        if previous_job is None: # Deleted since the request was accepted
+            logger.warning(f"Previous job {previous_job_id} not found, processing the whole search area")
+    if previous_job is not None:
+        previous_dir = os.path.join(LOCATIONS_DIR, previous_job["location_id"], previous_job["id"])
+        changed, counts = changed_cells(job_overview_source(job_dir), job_overview_source(previous_dir))
+        changed.to_file(changed_path, driver="GeoJSON")
+        logger.info(f"{counts['changed']} of {counts['cells']} cells changed since job {previous_job_id}")
+        job["previous_job_id"] = previous_job_id
+    else:
+        if os.path.exists(changed_path):
+            os.remove(changed_path)
+        job.pop("previous_job_id", None)
+
+    # 5) Reuse earlier outputs for the same orthophoto, search area, resolution and filter chain (or model)
+    inputs = [ortho_path] + job_region_paths(job_dir)
+    params = {
+        "filter_backend": filter_backend, "clahe_clip_limit": CLAHE_CLIP_LIMIT, "scale": scale,
+        **filter_params(scale)
+    }
+    if engine == "onnx":
+        inputs.append(CV_DETECTOR_MODEL)
+        params = {
+            "engine": engine, "scale": scale, "tile_size": CV_DETECTOR_TILE_SIZE, "overlap": CV_DETECTOR_OVERLAP
+        }
+    artifacts = job_artifact_cache(job_dir)
+    cache_key = artifacts.key("process_cv", inputs, params)
+    if artifacts.fetch(cache_key, "process_cv", outputs):
+        TiledRasterCache.open(output_path, os.path.join(search_dir, CV_CACHE_FILE))
+        job["completed_tasks"] = background_task_id
+        save_data(data)
+        return
+    start = time.perf_counter()
+    memory = StageMemory()
+
+    # 6) Coarser resolutions are read from overviews into a resampled copy
+    source = ortho
+    if scale < 1.0:
+        resampled_path = os.path.join(search_dir, CV_RESAMPLED_FILE)
+        with memory.stage("resample"):
+            source = RasterSource(resample_raster(job_overview_source(job_dir), resampled_path, scale))
+        logger.info(f"Analyzing at {native_gsd / scale:.3f} GSD ({scale:.0%} of native resolution)")
+    region = job_region(job_dir, source)
+
+    # 7) Decide whether the whole image fits in our memory budget.
+    #    Only the windowed path can skip pixels outside the search area.
+    if region is not None:
+        logger.info(f"Search area covers {region.coverage_fraction():.0%} of the orthophoto blocks")
+        tiled = True
+    elif tiled is None:
+        tiled = estimate_working_set(source.width, source.height) > CV_MAX_MEMORY_BYTES
+
+    # 8) Process image, saving a georeferenced output to the correct directory
+    with source:
+        if engine == "onnx":
+            detect_raster(source, output_path, OnnxDetector(CV_DETECTOR_MODEL), region=region, memory=memory)
+        elif tiled:
+            preprocess_raster(
+                source, output_path, workers=workers, filter_backend=filter_backend,
+                region=region, scale=scale, memory=memory
+            )
+        else:
+            with memory.stage("read"):
+                image = source.read(bands=[1, 2, 3])
+            processed_image = preprocess_image(image, scale=scale, filter_backend=filter_backend, memory=memory)
+            del image
+            with rasterio.open(output_path, "w", **output_profile(source)) as dst:
+                dst.write(processed_image, 1)
+    write_png_preview(output_path, png_path)
+    if source is not ortho:
+        os.remove(source.path)
+
+    # 9) Memory-mapped copy and histogram index for fast re-thresholding
+    with memory.stage("threshold_index"):
+        cache = TiledRasterCache.build(output_path, os.path.join(search_dir, CV_CACHE_FILE))
+        ThresholdIndex.build(cache).save(index_path)
+    artifacts.store(cache_key, "process_cv", outputs, time.perf_counter() - start)
+
+    if memory.enabled:
+        with open(os.path.join(search_dir, CV_MEMORY_PROFILE_FILE), "w", encoding="utf-8") as f:
+            json.dump(memory.report(), f, indent=2)
+        peaks = ", ".join(f"{name} {stage['peak_bytes'] / 1024**2:.0f} MiB" for name, stage in memory.stages.items())
+        logger.info(f"CV stage memory high-water marks: {peaks}")
+
+    # 10) Write outputs to file
     job["completed_tasks"] = background_task_id
     save_data(data)
 
 
 
 @router.post("/process_cv/{job_id}")
-async def process_cv(job_id: str, background_tasks: BackgroundTasks):
+async def process_cv(
+    job_id: str, background_tasks: BackgroundTasks, 
+    tiled: Optional[bool] = None, workers: int = CV_WORKERS,
+    filter_backend: str = CV_FILTER_BACKEND,
+    coarse: bool = False, coarse_threshold: Optional[float] = None, coarse_dilation: float = COARSE_DILATION,
+    target_gsd: Optional[float] = None, min_target_diameter: Optional[float] = None,
+    engine: str = CV_SEARCH_ENGINE, previous_job_id: Optional[str] = None
+):
+    if filter_backend not in FILTER_BACKENDS:
+        raise HTTPException(status_code=400, detail=f"Unknown filter backend: {filter_backend}")
+    if any(value is not None and value <= 0 for value in (target_gsd, min_target_diameter)):
+        raise HTTPException(status_code=400, detail="Target GSD and diameter must be positive")
+    if engine not in SEARCH_ENGINES:
+        raise HTTPException(status_code=400, detail=f"Unknown search engine: {engine}")
+    if engine == "onnx":
+        if not detector_available():
+            raise HTTPException(status_code=400, detail="The onnx engine requires onnxruntime, which is not installed")
+        if not os.path.isfile(CV_DETECTOR_MODEL):
+            raise HTTPException(status_code=400, detail="No detector model found; set CV_DETECTOR_MODEL")
+    if previous_job_id is not None:
+        data = load_data()
+        job = next((j for j in data["jobs"] if j["id"] == job_id), None)
+        previous_job = next((j for j in data["jobs"] if j["id"] == previous_job_id), None)
+        if not job or not previous_job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if previous_job_id == job_id or previous_job["location_id"] != job["location_id"]:
+            raise HTTPException(status_code=400, detail="The previous job must be another job at the same location")
+        previous_dir = os.path.join(LOCATIONS_DIR, previous_job["location_id"], previous_job["id"])
+        if not os.path.exists(os.path.join(previous_dir, "map", SEARCH_TARGETS_FILE)):
+            raise HTTPException(status_code=400, detail="The previous job has no targets to carry over")
+        if not os.path.exists(job_overview_source(previous_dir)):
+            raise HTTPException(status_code=404, detail="Orthophoto of the previous job not found")
+
     background_task_id = str(uuid.uuid4())
-    background_tasks.add_task(process_cv_background, job_id, background_task_id)
+    background_tasks.add_task(
+        process_cv_background, job_id, background_task_id, tiled, workers, filter_backend,
+        coarse, coarse_threshold, coarse_dilation, target_gsd, min_target_diameter, engine, previous_job_id
+    )
     
     return {"message": "Processing started", "task_id": background_task_id}
     # return FileResponse(png_path, media_type="image/png", filename=CV_OUTPUT_FILE_PNG)
 
 
+@router.post("/process_cv_preview/{job_id}")
+def process_cv_preview(
+    job_id: str, overview_level: Optional[int] = None, max_size: int = 2048,
+    filter_backend: str = CV_FILTER_BACKEND
+):
+    """
+    Quick, reduced-resolution run of process_cv for tuning parameters.
+    Reads an overview of the job's COG (or a decimated orthophoto) and scales filter kernels to match.
+    """
+    if filter_backend not in FILTER_BACKENDS:
+        raise HTTPException(status_code=400, detail=f"Unknown filter backend: {filter_backend}")
+
+    # 1) Find job from passed ID
+    data = load_data()
+    job = next((j for j in data["jobs"] if j["id"] == job_id), None)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    # 2) Prefer the COG, whose overviews make reduced reads cheap
+    job_dir = os.path.join(LOCATIONS_DIR, job["location_id"], job["id"])
+    source_path = job_overview_source(job_dir)
+    if not os.path.exists(source_path):
+        raise HTTPException(status_code=404, detail="Orthophoto not found")
+
+    search_dir = os.path.join(job_dir, "search")
+    os.makedirs(search_dir, exist_ok=True)
+    preview_path = os.path.join(search_dir, CV_PREVIEW_FILE)
+    png_path = os.path.join(search_dir, CV_PREVIEW_FILE_PNG)
+
+    # 3) Process and save preview
+    try:
+        scale = preprocess_preview(
+            source_path, preview_path, png_path, overview_level, max_size, filter_backend
+        )
+    except RasterioIOError as e:
+        raise HTTPException(status_code=400, detail=f"Unable to read overview: {e}")
+
+    return FileResponse(
+        png_path, media_type="image/png", filename=CV_PREVIEW_FILE_PNG,
+        headers={"X-Preview-Scale": f"{scale:.6f}"},
+    )
+
+
 @router.get("/check_status/{job_id}/{process_id}")
 async def check_status(job_id: str, process_id: str):
     """ Checks if the processed image exists. """
@@ -112,13 +377,24 @@ async def apply_threshold(request: ThresholdingRequest):
     binary_mask_png_path = os.path.join(search_dir, BINARY_MASK_PNG)
 
 
-    # 3) Peform manual thresholding
-    image = cv2.imread(str(processed_path), cv2.IMREAD_GRAYSCALE)
-    binary_mask = threshold_image(image, request.threshold)
+    # 3) Thresholds that give the same mask share a cache entry
+    outputs = {BINARY_MASK: binary_mask_path, BINARY_MASK_PNG: binary_mask_png_path}
+    artifacts = job_artifact_cache(job_dir)
+    cache_key = artifacts.key("apply_threshold", [processed_path], {"cutoff": threshold_cutoff(request.threshold)})
+    if not artifacts.fetch(cache_key, "apply_threshold", outputs):
+        start = time.perf_counter()
 
-    # 4) Save image(s) to directory
-    cv2.imwrite(str(binary_mask_path), binary_mask)
-    cv2.imwrite(str(binary_mask_png_path), binary_mask)
+        # 4) Peform manual thresholding on the cached uint8 values, one strip at a time
+        cache = TiledRasterCache.open(processed_path, os.path.join(search_dir, CV_CACHE_FILE))
+        with rasterio.open(processed_path) as src:
+            profile = output_profile(src)
+
+        # 5) Save image(s) to directory
+        with rasterio.open(binary_mask_path, "w", **profile) as dst:
+            for window in cache.windows():
+                dst.write(cache.threshold(request.threshold, window), 1, window=window)
+        write_png_preview(binary_mask_path, binary_mask_png_path)
+        artifacts.store(cache_key, "apply_threshold", outputs, time.perf_counter() - start)
 
     # return {"message": "Thresholding applied", "output_path": str(binary_mask_path)}
     # return FileResponse(binary_mask_path, media_type="image/tif", filename=BINARY_MASK)
@@ -126,6 +402,89 @@ async def apply_threshold(request: ThresholdingRequest):
 
 
 
+@router.get("/threshold_window/{job_id}")
+def threshold_window(
+    job_id: str, threshold: float,
+    col_off: int = 0, row_off: int = 0, width: int = 1024, height: int = 1024,
+):
+    """
+    Binary mask PNG of one window of the processed image, thresholded on demand.
+    Cheap enough to call on every slider move for the visible viewport.
+    """
+    data = load_data()
+    job = next((j for j in data["jobs"] if j["id"] == job_id), None)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    search_dir = os.path.join(LOCATIONS_DIR, job["location_id"], job["id"], "search")
+    processed_path = os.path.join(search_dir, CV_OUTPUT_FILE)
+    if not os.path.exists(processed_path):
+        raise HTTPException(status_code=404, detail="Preprocessed image not found")
+
+    cache = TiledRasterCache.open(processed_path, os.path.join(search_dir, CV_CACHE_FILE))
+    window = Window(col_off, row_off, width, height)
+    try:
+        mask = cache.threshold(threshold, window)
+    except WindowError:
+        raise HTTPException(status_code=400, detail="Window does not overlap the processed image")
+
+    _, png = cv2.imencode(".png", mask)
+    return Response(png.tobytes(), media_type="image/png")
+
+
+def load_threshold_index(job_id: str) -> ThresholdIndex:
+    """Loads the threshold index of a job, building it from the processed image if needed."""
+    data = load_data()
+    job = next((j for j in data["jobs"] if j["id"] == job_id), None)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    search_dir = os.path.join(LOCATIONS_DIR, job["location_id"], job["id"], "search")
+    index_path = os.path.join(search_dir, CV_THRESHOLD_INDEX_FILE)
+    if os.path.exists(index_path):
+        return ThresholdIndex.load(index_path)
+
+    processed_path = os.path.join(search_dir, CV_OUTPUT_FILE)
+    if not os.path.exists(processed_path):
+        raise HTTPException(status_code=404, detail="Preprocessed image not found")
+
+    index = ThresholdIndex.build(TiledRasterCache.open(processed_path, os.path.join(search_dir, CV_CACHE_FILE)))
+    index.save(index_path)
+    return index
+
+
+@router.get("/threshold_stats/{job_id}")
+def threshold_stats(job_id: str, threshold: Optional[float] = None):
+    """
+    Mask coverage and (roughly) how many targets a threshold would produce, from the stored histogram.
+    Without a threshold, returns the curves over every threshold k/255.
+    The target estimate is the mask's Euler number, so it undercounts targets containing holes.
+    """
+    index = load_threshold_index(job_id)
+    if threshold is None:
+        return index.curve()
+    return index.stats(threshold)
+
+
+@router.get("/threshold_suggestions/{job_id}")
+def threshold_suggestions(job_id: str, classes: int = 3):
+    """Otsu and multi-Otsu threshold suggestions computed from the stored histogram."""
+    if classes < 2:
+        raise HTTPException(status_code=400, detail="At least 2 classes are required")
+    return load_threshold_index(job_id).suggest_thresholds(classes)
+
+
+@router.get("/cache_stats/{job_id}")
+def cache_stats(job_id: str):
+    """Hit/miss counters, compute time saved and disk use of the job's CV artifact cache."""
+    data = load_data()
+    job = next((j for j in data["jobs"] if j["id"] == job_id), None)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job_artifact_cache(os.path.join(LOCATIONS_DIR, job["location_id"], job["id"])).stats()
+
+
 @router.post("/generate_targets/{job_id}")
 async def generate_targets(job_id: str):
     """Converts binary mask into a GeoJSON of detected targets."""
@@ -149,26 +508,55 @@ async def generate_targets(job_id: str):
 
     targets_path = os.path.join(job_dir, "map", SEARCH_TARGETS_FILE)
 
-    # 3) Load in original image and binary mask
-    image, transform, bounds, image_crs = load_image(ortho_path)
-    binary_mask = cv2.imread(str(binary_mask_path), cv2.IMREAD_GRAYSCALE)
-
-    # 4) Perform search for targets
-    targets_gdf = identify_targets(binary_mask, transform)
-    labeled_targets_gdf = assign_target_metadata(targets_gdf, job["name"], job["id"])
-    # targets_geojson = labeled_targets_gdf.to_json() # Convert from GDF to geoJSON string
-
-    # # 5) Save GeoJSON
-    # filename = SEARCH_TARGETS_FILE
-    # if filename.endswith(".geojson"):  # Only load GeoJSON files
-    #     filename = filename.replace(".geojson", "")  # Strip file extension
-
-    # success = save_geojson_file(job["location_id"], job["id"], filename, targets_geojson)
-    # if not success:
-    #     raise ValueError(f"Unable to save generated targets.")
+    # 3) Reuse targets found earlier in the same mask and search area (and previous job's targets)
+    region = job_region(job_dir, binary_mask_path)
+    inputs = [binary_mask_path, ortho_path] + job_region_paths(job_dir)
+    changed_path = os.path.join(job_dir, "search", CV_CHANGED_CELLS_FILE)
+    previous_targets_path = None
+    if job.get("previous_job_id") and os.path.exists(changed_path):
+        previous_job = next((j for j in data["jobs"] if j["id"] == job["previous_job_id"]), None)
+        if previous_job:
+            previous_targets_path = os.path.join(
+                LOCATIONS_DIR, previous_job["location_id"], previous_job["id"], "map", SEARCH_TARGETS_FILE
+            )
+            inputs.append(previous_targets_path)
+    artifacts = job_artifact_cache(job_dir)
+    cache_key = artifacts.key("generate_targets", inputs, {
+        "region_name": job["name"], "region_version": job["id"], "canopy_attributes": True, "target_ids": "job_index"
+    })
+    if artifacts.fetch(cache_key, "generate_targets", {SEARCH_TARGETS_FILE: targets_path}):
+        labeled_targets_path = targets_path
+    else:
+        start = time.perf_counter()
+
+        # 4) Georeferencing of the mask, which may be coarser than the orthophoto.
+        #    Masks from before outputs were georeferenced use the orthophoto's.
+        mask = RasterSource(binary_mask_path)
+        transform, image_crs = mask.transform, mask.crs
+        if transform.is_identity:
+            ortho = RasterSource(ortho_path)
+            transform, image_crs = ortho.transform, ortho.crs
+
+        # 5) Perform search for targets inside the region, labeling the binary mask tile by tile
+        #    and reducing each target's canopy attributes (area, extent, mean ExG) along the way
+        targets_gdf = identify_targets_tiled(
+            mask, transform, image_crs, region=region, exg_source=RasterSource(ortho_path)
+        )
+
+        # 6) Repeat flight: only changed cells were searched; keep the previous targets elsewhere
+        if previous_targets_path is not None:
+            contour_path = os.path.join(job_dir, "map", REGION_FILE)
+            contour_paths = [contour_path] if os.path.exists(contour_path) else []
+            targets_gdf = carry_over_targets(targets_gdf, previous_targets_path, changed_path, contour_paths)
+        labeled_targets_gdf = assign_target_metadata(targets_gdf, job["name"], job["id"])
+
+        labeled_targets_path = write_targets_geojson(labeled_targets_gdf.to_crs(DISPLAY_CRS), targets_path)
+        artifacts.store(
+            cache_key, "generate_targets", {SEARCH_TARGETS_FILE: labeled_targets_path},
+            time.perf_counter() - start
+        )
 
     # Finally, reset values of 'approved_targets' and 'removed_targets'
-    labeled_targets_path = ensure_crs(labeled_targets_gdf, targets_path)
     with open(labeled_targets_path, "r", encoding="utf-8") as f:
         targets_geojson = json.load(f)
 
@@ -2,16 +2,19 @@ from fastapi import APIRouter, Query, HTTPException, Request
 from fastapi.responses import JSONResponse, StreamingResponse, Response
 from pathlib import Path
 import os
-from io import BytesIO
-from PIL import Image
-from rio_tiler.io import Reader
+import json
 from rio_tiler.errors import TileOutsideBounds
 from backend.config import ( 
     LOCATIONS_DIR, DATA_FILE, load_data, save_data, 
-    REGION_FILE, REGION_ORTHOPHOTO, REGION_COG
+    REGION_FILE, REGION_ORTHOPHOTO, REGION_COG, REGION_TILE_ARCHIVE, TILE_CACHE_MAX_AGE
 )
 
 from backend.services.cogeo import convert_to_cog_rio
+from backend.services.reader_pool import reader_pool
+from backend.services.tile_cache import TileKey, tile_cache, cog_fingerprint, etag_matches
+from backend.services.tile_coverage import coverage_indexes, transparent_tile
+from backend.services.tile_runtime import run_in_tile_executor
+from backend.services.tile_archive import seed_archive, tile_archives
 
 # TODO: pull loging into config for app-wide access
 import logging
@@ -23,6 +26,7 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 TILE_DIR = Path("./tiles")
+MAX_SEED_ZOOM = 24 # Beyond any drone orthophoto's resolution
 
 # Helper function to locate the correct image based on job_id
 def get_image_path(job_id: str) -> Path:
@@ -65,13 +69,25 @@ async def generate_tiles_stream_api(
     tile_size: int = Query(256, description="Tile size in pixels"),
     min_zoom: int = Query(15, description="Minimum zoom level"),
     max_zoom: int = Query(21, description="Maximum zoom level"),
+    seed: bool = Query(False, description="Pre-render the min_zoom-max_zoom pyramid into an MBTiles archive"),
 ):
-    """ API to upload an orthophoto and generate tiles while streaming progress """
+    """
+    API to upload an orthophoto and generate tiles while streaming progress.
+
+    Builds the job's COG. With `seed`, the tile pyramid is also rendered into
+    an MBTiles archive served by the tile endpoint without rendering, and the
+    response streams progress as NDJSON lines ({"stage": "cog" | "seed" |
+    "done" | "error", ...}) instead of a single JSON object.
+    """
     # [1] Find job for which we are generating tiles
     data = load_data()
     job = next((j for j in data["jobs"] if j["id"] == job_id), None)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
+    if seed and not 0 <= min_zoom <= max_zoom <= MAX_SEED_ZOOM:
+        raise HTTPException(status_code=400, detail=f"Seeded zoom levels must satisfy 0 <= min_zoom <= max_zoom <= {MAX_SEED_ZOOM}")
+    if seed and tile_size not in (256, 512):
+        raise HTTPException(status_code=400, detail="Seeded tiles must be 256 or 512 pixels")
 
     # [2] Init tile directory, get input image
     tile_dir = os.path.join(LOCATIONS_DIR, job["location_id"], job_id, "tiles")
@@ -80,62 +96,106 @@ async def generate_tiles_stream_api(
 
     image_path = get_image_path(job_id) # Get path for our image
     output_path = os.path.join(tile_dir, REGION_COG)
+    archive_path = os.path.join(tile_dir, REGION_TILE_ARCHIVE)
 
     # [3] Generate region COG (Cloud-Optomized GeoTiff)
     try:
         # convert_to_cog(image_path, output_path)
         convert_to_cog_rio(image_path, output_path)
+        reader_pool.invalidate(output_path)
+        tile_cache.invalidate(tile_cache.cache_dir(tile_dir)) # Tiles of the previous COG
+        # Index the new COG now rather than on its first tile request, off the event loop
+        await run_in_tile_executor(coverage_indexes.get, output_path)
+        tile_archives.invalidate(archive_path) # Seeded from the previous COG
     except Exception as e:
         logger.error(f"Failed to create COG: {e}")
         raise HTTPException(status_code=400, detail="COG generation failed!")
 
-    # [3] Return streaming response for progress updates
-    return {"message": "COG created successfully", "cog_path": str(output_path)}
+    if not seed:
+        return {"message": "COG created successfully", "cog_path": str(output_path)}
+
+    # [4] Seed the tile archive, streaming progress updates
+    def seed_progress():
+        yield json.dumps({"stage": "cog", "message": "COG created successfully", "cog_path": str(output_path)}) + "\n"
+        try:
+            for progress in seed_archive(output_path, archive_path, min_zoom, max_zoom, tile_size):
+                stage = "done" if "archive_path" in progress else "seed"
+                yield json.dumps({"stage": stage, **progress}) + "\n"
+        except Exception as e:
+            logger.error(f"Failed to seed tiles: {e}")
+            yield json.dumps({"stage": "error", "detail": "Tile seeding failed!"}) + "\n"
+
+    return StreamingResponse(seed_progress(), media_type="application/x-ndjson")
+
+
+# Renders a tile, or finds it cached; blocking, so it runs on the tile executor
+def render_tile(cog_path: str, tiles_dir: str, key: TileKey) -> bytes:
+    """
+    PNG bytes of a tile: from the job's seeded archive when it covers the
+    tile, a shared transparent tile when the COG's coverage index knows it is
+    empty, else the cached or freshly rendered tile.
+    """
+    archive = tile_archives.get(os.path.join(tiles_dir, REGION_TILE_ARCHIVE))
+    if archive is not None and archive.covers(key.fingerprint, key.z, key.tile_size):
+        return archive.tile(key.z, key.x, key.y) or transparent_tile(key.tile_size)
+
+    # Outside the bounds or the flight footprint: nothing to render or cache
+    if coverage_indexes.get(cog_path, key.fingerprint).is_empty(key.x, key.y, key.z):
+        return transparent_tile(key.tile_size)
+
+    cache_dir = tile_cache.cache_dir(tiles_dir)
+    content = tile_cache.get(cache_dir, key)
+    if content is not None:
+        return content
+
+    try:
+        # Pooled, already open reader of the COG (reopened if the file changed)
+        with reader_pool.reader(cog_path) as cog:
+            tile_image = cog.tile(key.x, key.y, key.z, tilesize=key.tile_size)
+            content = tile_image.render(img_format="PNG")
+
+    except TileOutsideBounds as oob:
+        # Out of bounds despite the coverage index (e.g. reprojection edge cases), return a blank tile
+        logger.debug("Out of bounds tile request!")
+        return transparent_tile(key.tile_size)
+
+    except Exception as e:
+        logger.error(f"Error fetching tile: {e}")  # Print the error for debugging
+        raise
+
+    tile_cache.put(cache_dir, key, content)
+    return content
 
 
 # [READ] Serve tiles from a given project
 @router.get("/tile/{location_id}/{job_id}/{z}/{x}/{y}.png")
-def get_cog_tile(
+async def get_cog_tile(
     location_id: str, 
     job_id: str, 
     z: int, x: int, y: int, 
+    request: Request,
     tile_size: int = 256
 ):
 # ) -> StreamingResponse | Response:
     """
-    Serves tiles dynamically from a COG
+    Serves tiles dynamically from a COG.
+    Rendered tiles are cached in memory and on disk; responses carry an ETag
+    and a matching If-None-Match is answered with 304 Not Modified.
+    Tiles the COG's coverage index knows to be empty get a shared transparent tile.
+    Rendering runs on the bounded tile executor, apart from the other API handlers.
     """
-    cog_path = os.path.join(LOCATIONS_DIR, location_id, job_id, "tiles", REGION_COG)
+    tiles_dir = os.path.join(LOCATIONS_DIR, location_id, job_id, "tiles")
+    cog_path = os.path.join(tiles_dir, REGION_COG)
 
     if not os.path.exists(cog_path):
         logger.warning(f"File not found: {cog_path}")
         return JSONResponse(content={"error": "COG not found. Have you already generated tiles?"}, status_code=404)
 
-    try:
-        with Reader(cog_path) as cog:
-            # tile_image  = cog.tile(x, y, z, tilesize=tile_size)
-            # image_blob = tile_image.render(img_format="PNG")
-            # buffer = BytesIO(image_blob)
-            # buffer.seek(0)
-            # return StreamingResponse(buffer, media_type="image/png")
-
-            tile_image = cog.tile(x, y, z, tilesize=tile_size)
-            content = tile_image.render(img_format="PNG")
-            return Response(content, media_type="image/png")
-        
-    except TileOutsideBounds as oob:
-        # Out of bounds, return a blank tile or a 404
-        logger.debug("Out of bounds tile request!")
-        blank_img = Image.new('RGBA', (256, 256), (0,0,0,0))
-        buffer = BytesIO()
-        blank_img.save(buffer, format="PNG")
-        buffer.seek(0)
-        return StreamingResponse(buffer, media_type='image/png')
-    
-    except HTTPException as e:
-        logger.warning("HTTP exception:", e)
-        return None
+    # Tiles are identified by the COG version, so regenerated COGs never serve stale tiles
+    key = TileKey(cog_fingerprint(cog_path), z, x, y, tile_size, "png")
+    headers = {"ETag": key.etag, "Cache-Control": f"public, max-age={TILE_CACHE_MAX_AGE}, must-revalidate"}
+    if etag_matches(request.headers.get("if-none-match"), key.etag):
+        return Response(status_code=304, headers=headers)
 
-    except Exception as e:
-        logger.error("Error fetching tile:", e)  # Print the error for debugging
-        raise
\ No newline at end of file
+    content = await run_in_tile_executor(render_tile, cog_path, tiles_dir, key)
+    return Response(content, media_type="image/png", headers=headers)
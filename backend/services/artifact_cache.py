@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+
+from backend.config import ARTIFACT_CACHE_QUOTA_BYTES, logger
+
+HASH_CHUNK_BYTES = 8 * 1024**2
+FINGERPRINTS_FILE = "fingerprints.json"
+STATS_FILE = "stats.json"
+ENTRY_META_FILE = "meta.json"
+
+# One lock for all caches: background tasks run in threads of one process
+_lock = threading.RLock()
+
+
+def _read_json(path, default):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def _write_json(path, data):
+    """Write JSON atomically, so readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def _same_file(a, b):
+    """Cheap check that `b` is an unmodified copy of `a` (copies keep size and mtime)."""
+    try:
+        sa, sb = os.stat(a), os.stat(b)
+    except OSError:
+        return False
+    return sa.st_size == sb.st_size and sa.st_mtime_ns == sb.st_mtime_ns
+
+
+class ArtifactCache:
+    """
+    Content-addressed cache of stage outputs, stored under a job directory.
+
+    An entry is keyed by the SHA-256 of the stage name, its parameters and the
+    contents of its input files. File hashes are memoized by path, size and
+    mtime, so a large orthophoto is only read once. Entries are evicted least
+    recently used first to keep the cache within `quota_bytes`. Hit and miss
+    counters, and the compute time hits saved, persist across sessions.
+    """
+
+    def __init__(self, cache_dir, quota_bytes=ARTIFACT_CACHE_QUOTA_BYTES):
+        self.cache_dir = cache_dir
+        self.quota_bytes = quota_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, *parts):
+        return os.path.join(self.cache_dir, *parts)
+
+    def fingerprint(self, path):
+        """SHA-256 of a file's contents, recomputed only when its size or mtime changes."""
+        stat = os.stat(path)
+        memo_key = os.path.abspath(path)
+        with _lock:
+            memo = _read_json(self._path(FINGERPRINTS_FILE), {})
+            known = memo.get(memo_key)
+            if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+                return known["sha256"]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+                digest.update(chunk)
+
+        with _lock:
+            memo = _read_json(self._path(FINGERPRINTS_FILE), {})
+            memo[memo_key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+            _write_json(self._path(FINGERPRINTS_FILE), memo)
+        return digest.hexdigest()
+
+    def key(self, stage, inputs, params=None):
+        """
+        Cache key of one stage run.
+
+        Parameters:
+        - stage: name of the stage, e.g. "process_cv".
+        - inputs: paths of the files the stage reads.
+        - params: JSON-serializable parameters that affect the outputs.
+
+        Returns:
+        - str: hex digest.
+        """
+        description = {
+            "stage": stage,
+            "inputs": [self.fingerprint(path) for path in inputs],
+            "params": params or {},
+        }
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+    def fetch(self, key, stage, outputs):
+        """
+        Restore a cached entry's files.
+
+        Parameters:
+        - key: from `key`.
+        - stage: name of the stage, for statistics.
+        - outputs: {name: destination path} of the files to restore.
+
+        Returns:
+        - bool: True on a hit (files restored), False on a miss.
+        """
+        entry_dir = self._path(key)
+        with _lock:
+            meta = _read_json(os.path.join(entry_dir, ENTRY_META_FILE), None)
+            hit = meta is not None and set(outputs) <= set(meta["files"])
+            if hit:
+                for name, dst_path in outputs.items():
+                    src_path = os.path.join(entry_dir, name)
+                    if not _same_file(src_path, dst_path):
+                        shutil.copy2(src_path, dst_path)
+                meta["last_used"] = time.time()
+                _write_json(os.path.join(entry_dir, ENTRY_META_FILE), meta)
+            self._count(stage, hit, meta["seconds"] if hit else 0.0)
+        return hit
+
+    def store(self, key, stage, outputs, seconds=0.0):
+        """
+        Add a stage's output files to the cache, then evict down to the quota.
+
+        Parameters:
+        - key: from `key`.
+        - stage: name of the stage, for statistics.
+        - outputs: {name: path} of the files the stage wrote.
+        - seconds: time the stage took, credited to later hits.
+        """
+        # Copy into a temporary directory first, so a partial entry is never visible
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-")
+        try:
+            for name, src_path in outputs.items():
+                shutil.copy2(src_path, os.path.join(tmp_dir, name))
+            meta = {
+                "stage": stage,
+                "files": sorted(outputs),
+                "bytes": sum(os.path.getsize(os.path.join(tmp_dir, name)) for name in outputs),
+                "seconds": seconds,
+                "created": time.time(),
+                "last_used": time.time(),
+            }
+            _write_json(os.path.join(tmp_dir, ENTRY_META_FILE), meta)
+
+            with _lock:
+                shutil.rmtree(self._path(key), ignore_errors=True)
+                os.replace(tmp_dir, self._path(key))
+                self.evict()
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def entries(self):
+        """{key: meta} of every complete entry."""
+        entries = {}
+        for name in os.listdir(self.cache_dir):
+            meta = _read_json(self._path(name, ENTRY_META_FILE), None)
+            if meta is not None:
+                entries[name] = meta
+        return entries
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits the quota."""
+        with _lock:
+            entries = sorted(self.entries().items(), key=lambda item: item[1]["last_used"])
+            total = sum(meta["bytes"] for _, meta in entries)
+            while entries and total > self.quota_bytes:
+                key, meta = entries.pop(0)
+                logger.info(f"Evicting cached {meta['stage']} artifacts {key[:12]} ({meta['bytes']} bytes)")
+                shutil.rmtree(self._path(key), ignore_errors=True)
+                total -= meta["bytes"]
+
+    def _read_stats(self):
+        return _read_json(self._path(STATS_FILE), {"hits": 0, "misses": 0, "seconds_saved": 0.0, "stages": {}})
+
+    def _count(self, stage, hit, seconds):
+        stats = self._read_stats()
+        counter = "hits" if hit else "misses"
+        stage_stats = stats["stages"].setdefault(stage, {"hits": 0, "misses": 0, "seconds_saved": 0.0})
+        for counts in (stats, stage_stats):
+            counts[counter] += 1
+            counts["seconds_saved"] += seconds
+        _write_json(self._path(STATS_FILE), stats)
+
+    def stats(self):
+        """Hit/miss counters, compute time saved, and current size of the cache."""
+        with _lock:
+            stats = self._read_stats()
+            entries = self.entries()
+        stats.update({
+            "entries": len(entries),
+            "bytes": sum(meta["bytes"] for meta in entries.values()),
+            "quota_bytes": self.quota_bytes,
+        })
+        return stats
@@ -0,0 +1,157 @@
+import math
+import numpy as np
+import shapely
+import pandas as pd
+import geopandas as gpd
+import rasterio
+from affine import Affine
+from rasterio.enums import ColorInterp, Resampling
+from rasterio.features import shapes
+from rasterio.vrt import WarpedVRT
+from shapely.geometry import shape
+
+from .vegetation_indices import calculate_exg_int
+
+CHANGE_CELL_SIZE = 10.0 # Edge of the cells compared between flights, in CRS units (metres for UTM)
+HASH_COLS, HASH_ROWS = 9, 8 # Samples per cell; adjacent columns give a 64-bit difference hash
+HASH_TOLERANCE = 10 # Differing hash bits (of 64) above which a cell has changed
+EXG_TOLERANCE = 0.05 # Mean ExG difference above which a cell has changed
+TARGET_SPACING = 1.0 # Closest distinct targets, in CRS units; nearer ones are the same bush
+
+
+def change_grid(bounds, cell_size=CHANGE_CELL_SIZE):
+    """
+    Cells covering `bounds`, aligned to multiples of `cell_size` in map
+    coordinates, so flights with different pixel grids share them.
+
+    Returns:
+    - transform: affine transform of the cell grid, one pixel per cell.
+    - rows, cols: cells in the grid.
+    """
+    left = math.floor(bounds[0] / cell_size) * cell_size
+    top = math.ceil(bounds[3] / cell_size) * cell_size
+    cols = max(1, math.ceil((bounds[2] - left) / cell_size))
+    rows = max(1, math.ceil((top - bounds[1]) / cell_size))
+    return Affine(cell_size, 0, left, 0, -cell_size, top), rows, cols
+
+
+def cell_fingerprints(src_path, crs, grid_transform, rows, cols):
+    """
+    Content fingerprints of an orthophoto over the cells of a change grid.
+
+    Each cell is sampled HASH_ROWS x HASH_COLS times with an averaging warp
+    onto the grid (served from overviews when the raster has them), in the
+    grid's CRS. The fingerprint is a difference hash of the samples'
+    brightness, which tolerates exposure changes between flights, and their
+    mean ExG.
+
+    Parameters:
+    - src_path: RGB(A) raster, ideally a COG with overviews.
+    - crs, grid_transform, rows, cols: the cell grid (see `change_grid`).
+
+    Returns:
+    - dict of (rows, cols) arrays: "hash" (8 bytes per cell), "exg" (mean ExG)
+      and "valid" (the raster has data for the whole cell).
+    """
+    sample_transform = grid_transform * Affine.scale(1 / HASH_COLS, 1 / HASH_ROWS)
+    height, width = rows * HASH_ROWS, cols * HASH_COLS
+    with rasterio.open(src_path) as src:
+        add_alpha = src.nodata is None and ColorInterp.alpha not in src.colorinterp
+        with WarpedVRT(src, crs=crs, transform=sample_transform, width=width, height=height,
+                       resampling=Resampling.average, add_alpha=add_alpha) as vrt:
+            rgb = np.moveaxis(vrt.read([1, 2, 3]), 0, -1)
+            valid = vrt.dataset_mask() > 0
+
+    def per_cell(samples):
+        return samples.reshape(rows, HASH_ROWS, cols, -1).swapaxes(1, 2)
+
+    brightness = per_cell(rgb.sum(axis=-1, dtype=np.uint16))
+    bits = brightness[..., 1:] > brightness[..., :-1]
+    return {
+        "hash": np.packbits(bits.reshape(rows, cols, -1), axis=-1),
+        "exg": per_cell(calculate_exg_int(rgb)).mean(axis=(2, 3)) / 255,
+        "valid": per_cell(valid).all(axis=(2, 3)),
+    }
+
+
+def changed_cells(src_path, previous_path, cell_size=CHANGE_CELL_SIZE,
+                  hash_tolerance=HASH_TOLERANCE, exg_tolerance=EXG_TOLERANCE):
+    """
+    Area where an orthophoto differs from a previous flight of the same location.
+
+    A cell has changed when its difference hashes differ by more than
+    `hash_tolerance` bits, its mean ExG by more than `exg_tolerance`, or
+    either flight lacks data for it.
+
+    Parameters:
+    - src_path: RGB(A) raster of the new flight.
+    - previous_path: RGB(A) raster of the previous flight, in any CRS.
+    - cell_size: edge of the compared cells, in the new raster's CRS units.
+    - hash_tolerance, exg_tolerance: see above.
+
+    Returns:
+    - GeoDataFrame with a single (possibly empty) geometry of the changed cells, in the new raster's CRS.
+    - dict: "cells" and "changed" cell counts.
+    """
+    with rasterio.open(src_path) as src:
+        crs, bounds = src.crs, src.bounds
+    grid_transform, rows, cols = change_grid(bounds, cell_size)
+
+    current = cell_fingerprints(src_path, crs, grid_transform, rows, cols)
+    previous = cell_fingerprints(previous_path, crs, grid_transform, rows, cols)
+
+    hash_distance = np.unpackbits(current["hash"] ^ previous["hash"], axis=-1).sum(axis=-1)
+    changed = (
+        ~current["valid"] | ~previous["valid"]
+        | (hash_distance > hash_tolerance)
+        | (np.abs(current["exg"] - previous["exg"]) > exg_tolerance)
+    ).astype(np.uint8)
+
+    polygons = [
+        shape(geometry) for geometry, _ in shapes(changed, mask=changed.astype(bool), transform=grid_transform)
+    ]
+    geometry = shapely.union_all(polygons) if polygons else shapely.Polygon()
+    counts = {"cells": int(changed.size), "changed": int(changed.sum())}
+    return gpd.GeoDataFrame(geometry=[geometry], crs=crs), counts
+
+
+def carry_over_targets(targets_gdf, previous_targets_path, changed_path, region_paths=(),
+                       min_spacing=TARGET_SPACING):
+    """
+    Merge newly detected targets with a previous flight's targets in the cells that did not change.
+
+    A bush across the edge of the changed cells is detected again, with its
+    centroid inside them, while its previous target lies just outside. Previous
+    targets within `min_spacing` of a new one are such duplicates and dropped,
+    so the new detection stands for the bush.
+
+    Parameters:
+    - targets_gdf: GeoDataFrame of targets detected in the changed cells.
+    - previous_targets_path: targets GeoJSON of the previous job.
+    - changed_path: changed cells written from `changed_cells`.
+    - region_paths: vector files of the search region; previous targets outside it are dropped.
+    - min_spacing: distance (in `targets_gdf`'s CRS units) under which two targets are the same bush.
+
+    Returns:
+    - GeoDataFrame of both, in `targets_gdf`'s CRS, with a boolean "carried_over" column.
+      Previous target IDs and region metadata are dropped to be assigned again.
+    """
+    previous = gpd.read_file(previous_targets_path).to_crs(targets_gdf.crs)
+    previous = previous.drop(columns=["target_id", "region_outline_version", "region_name"], errors="ignore")
+
+    def area(path):
+        return gpd.read_file(path).to_crs(targets_gdf.crs).union_all()
+
+    keep = ~shapely.contains(area(changed_path), previous.geometry.values)
+    for region_path in region_paths:
+        keep &= shapely.contains(area(region_path), previous.geometry.values)
+
+    # New targets all lie in the changed cells, so only previous ones along their edge can match
+    duplicates = shapely.STRtree(targets_gdf.geometry.values).query(
+        previous.geometry.values, predicate="dwithin", distance=min_spacing
+    )[0]
+    keep[duplicates] = False
+
+    targets_gdf = targets_gdf.assign(carried_over=False)
+    carried = previous[keep].assign(carried_over=True)
+    return gpd.GeoDataFrame(pd.concat([targets_gdf, carried], ignore_index=True), crs=targets_gdf.crs)
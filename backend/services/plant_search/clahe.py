@@ -0,0 +1,191 @@
+import math
+import numpy as np
+from skimage.util import img_as_uint
+from skimage.exposure import rescale_intensity
+# Same clipping and mapping routines as equalize_adapthist, so maps match exactly
+from skimage.exposure._adapthist import NR_OF_GRAY, clip_histogram, map_histogram
+
+
+def reflect_index(index, size):
+    """Source index of `index` in an array of `size` padded with numpy's 'reflect' mode."""
+    if size == 1:
+        return np.zeros_like(index)
+    period = 2 * (size - 1)
+    index = np.mod(index, period)
+    return np.where(index < size, index, period - index)
+
+
+class StreamingCLAHE:
+    """
+    `skimage.exposure.equalize_adapthist` for uint8 rasters processed in windows.
+
+    The image is split into the same contextual regions as the whole-image
+    call (including its reflected padding at the bottom/right edges). Usage:
+
+    1. `add(values, window)` for windows covering the raster once, in any
+       order, accumulating per-region histograms of the uint8 values.
+    2. `finalize()` turns them into clipped, equalized lookup tables.
+    3. `apply(values, window)` equalizes any window on its own by bilinear
+       interpolation between the tables of the four nearest regions.
+
+    `apply` returns CLAHE levels before the final intensity stretch;
+    `to_unit(levels, *level_range)` with the global range of all levels
+    gives exactly the float output of `equalize_adapthist`, and
+    `uint8_lut(*level_range)[levels]` that output truncated to uint8.
+    """
+
+    def __init__(self, shape, kernel_size=None, clip_limit=0.01, nbins=256):
+        self.shape = tuple(shape)
+        if kernel_size is None:
+            kernel_size = tuple(max(s // 8, 1) for s in self.shape)
+        self.kernel_size = tuple(int(k) for k in kernel_size)
+        self.clip_limit = clip_limit
+        self.nbins = nbins
+
+        # Original pixel index of every row/column inside each histogram region
+        self.n_regions = tuple(-(-s // k) for s, k in zip(self.shape, self.kernel_size))
+        self.region_index = [
+            reflect_index(np.arange(n * k), s)
+            for s, k, n in zip(self.shape, self.kernel_size, self.n_regions)
+        ]
+        self.counts = np.zeros(self.n_regions + (256,), dtype=np.int64)
+        self.maps = None
+
+    def add(self, values, window):
+        """
+        Accumulate the region histograms of one window.
+
+        Parameters:
+        - values: uint8 pixels of `window`.
+        - window: rasterio Window of `values` within the raster.
+        """
+        self.counts += self.region_histograms(values, window)
+
+    def region_histograms(self, values, window):
+        """Histograms of `values` (uint8 pixels of `window`) per contextual region."""
+        selections = []
+        for offset, size, index, k in zip(
+            (window.row_off, window.col_off), values.shape, self.region_index, self.kernel_size
+        ):
+            inside = (index >= offset) & (index < offset + size)
+            selections.append((index[inside] - offset, np.nonzero(inside)[0] // k))
+
+        (rows, row_regions), (cols, col_regions) = selections
+        region_ids = row_regions[:, None] * self.n_regions[1] + col_regions[None, :]
+        return np.bincount(
+            (region_ids * 256 + values[rows][:, cols]).ravel(),
+            minlength=math.prod(self.n_regions) * 256
+        ).reshape(self.n_regions + (256,))
+
+    def constant_histograms(self, value, window):
+        """Region histograms of a window where every pixel has `value`, without materializing it."""
+        region_counts = []
+        for offset, size, index, k, n in zip(
+            (window.row_off, window.col_off), (window.height, window.width),
+            self.region_index, self.kernel_size, self.n_regions
+        ):
+            inside = (index >= offset) & (index < offset + size)
+            region_counts.append(np.bincount(np.nonzero(inside)[0] // k, minlength=n))
+
+        counts = np.zeros(self.n_regions + (256,), dtype=np.int64)
+        counts[..., value] = np.outer(*region_counts)
+        return counts
+
+    def finalize(self):
+        """Build the equalized lookup tables from the accumulated histograms."""
+        # Input range, as img_as_uint + rescale_intensity see it on the whole image
+        present = np.nonzero(self.counts.sum(axis=(0, 1)))[0]
+        levels = img_as_uint(np.arange(256) / 255.0)
+        levels = np.round(rescale_intensity(
+            levels, in_range=(levels[present[0]], levels[present[-1]]), out_range=(0, NR_OF_GRAY - 1)
+        )).astype(np.min_scalar_type(NR_OF_GRAY))
+        self.bins = levels // (1 + NR_OF_GRAY // self.nbins)
+
+        # Re-bin each region's uint8 histogram into CLAHE gray bins
+        hist = np.zeros(self.n_regions + (self.nbins,), dtype=np.int64)
+        for value in present:
+            hist[..., self.bins[value]] += self.counts[..., value]
+
+        kernel_elements = math.prod(self.kernel_size)
+        if self.clip_limit > 0.0:
+            clim = int(np.clip(self.clip_limit * kernel_elements, 1, None))
+        else:
+            clim = kernel_elements
+        hist = np.apply_along_axis(clip_histogram, -1, hist, clip_limit=clim)
+        maps = map_histogram(hist, 0, NR_OF_GRAY - 1, kernel_elements)
+
+        # Duplicate the outer regions, like the whole-image interpolation does
+        self.maps = np.pad(maps, [[1, 1], [1, 1], [0, 0]], mode="edge")
+        return self
+
+    def apply(self, values, window):
+        """
+        Equalize one window.
+
+        Parameters:
+        - values: uint8 pixels of `window`.
+        - window: rasterio Window of `values` within the raster.
+
+        Returns:
+        - uint16 CLAHE levels of the window.
+        """
+        if self.maps is None:
+            raise RuntimeError("StreamingCLAHE.finalize() must be called before apply()")
+
+        blocks, weights = [], []
+        for offset, size, k in zip((window.row_off, window.col_off), values.shape, self.kernel_size):
+            padded = np.arange(offset, offset + size) + k // 2
+            coeffs = (np.arange(k) / k)[padded % k]
+            blocks.append(padded // k)
+            weights.append((1 - coeffs, coeffs))
+
+        bins = self.bins[values]
+        n_cols = self.maps.shape[1]
+        flat_maps = self.maps.reshape(-1)
+        result = np.zeros(values.shape, dtype=np.float32)
+        # Same accumulation order and precision as equalize_adapthist
+        for edge_row, edge_col in np.ndindex(2, 2):
+            region = (blocks[0] + edge_row)[:, None] * n_cols + (blocks[1] + edge_col)[None, :]
+            mapped = flat_maps[region * self.nbins + bins]
+            coeffs = weights[1][edge_col][None, :] * weights[0][edge_row][:, None]
+            result += (mapped * coeffs).astype(np.float32)
+
+        return result.astype(np.min_scalar_type(NR_OF_GRAY))
+
+    def level_bounds(self, value_min, value_max, window):
+        """
+        Bounds of the levels `apply` returns for a window whose values lie in [value_min, value_max].
+
+        Each level interpolates the tables of the four nearest regions, which
+        are non-decreasing in the value, so it lies between the smallest table
+        entry for `value_min` and the largest for `value_max` among the
+        regions around the window. Lets windows that can't hold the extreme
+        levels of the raster be left out of its level range.
+
+        Returns:
+        - (lower, upper) bounds, inclusive.
+        """
+        if self.maps is None:
+            raise RuntimeError("StreamingCLAHE.finalize() must be called before level_bounds()")
+
+        blocks = [
+            slice((offset + k // 2) // k, (offset + size - 1 + k // 2) // k + 2)
+            for offset, size, k in zip((window.row_off, window.col_off), (window.height, window.width), self.kernel_size)
+        ]
+        maps = self.maps[tuple(blocks)]
+        # The float32 interpolation is truncated, so it can fall one level short of the lowest table
+        return int(maps[..., self.bins[value_min]].min()) - 1, int(maps[..., self.bins[value_max]].max())
+
+    @staticmethod
+    def to_unit(levels, level_min, level_max):
+        """Final intensity stretch of `equalize_adapthist`, given the global level range."""
+        return rescale_intensity(levels.astype(np.float64), in_range=(level_min, level_max))
+
+    @staticmethod
+    def uint8_lut(level_min, level_max):
+        """
+        Lookup table from CLAHE levels to `to_unit` output truncated to uint8
+        (`(x * 255).astype(np.uint8)`), so levels map straight to the uint8
+        filter input without a float copy of the image.
+        """
+        return (StreamingCLAHE.to_unit(np.arange(level_max + 1), level_min, level_max) * 255).astype(np.uint8)
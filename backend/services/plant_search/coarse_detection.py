@@ -0,0 +1,107 @@
+import math
+from typing import Optional
+import numpy as np
+import cv2
+import shapely
+import geopandas as gpd
+from rasterio.features import shapes
+from shapely.geometry import shape
+from skimage.filters import threshold_otsu
+from skimage.morphology import disk
+
+from .vegetation_indices import calculate_exg_int
+from .preview import read_reduced
+from .raster_source import RasterSource
+from .region_coverage import REGION_BLOCK_SIZE
+
+COARSE_MAX_SIZE = 1024 # Longest side of the overview read for candidate scoring
+COARSE_DILATION = 1.0 # Margin kept around candidates, in CRS units (metres for UTM)
+COARSE_MIN_BLOCK_SIZE = 128 # Smaller region blocks cost more filter halo than they skip
+
+
+def candidate_mask(src_path, threshold: Optional[float] = None,
+                   overview_level: Optional[int] = None, max_size: int = COARSE_MAX_SIZE):
+    """
+    Flag likely vegetation on a low-resolution read of the orthophoto.
+
+    Parameters:
+    - src_path: RGB(A) raster, ideally the job's COG with overviews.
+    - threshold: ExG value (2g - r - b on [0, 1] bands) above which a pixel is a
+      candidate; Otsu's threshold of the overview ExG when None.
+    - overview_level, max_size: see `read_reduced`.
+
+    Returns:
+    - mask: uint8 (H, W) candidate mask (1 = candidate) at overview resolution.
+    - transform: affine transform of the mask.
+    - crs: CRS of the raster.
+    """
+    image, transform, crs, _ = read_reduced(src_path, overview_level, max_size)
+    exg = calculate_exg_int(image)
+
+    if threshold is None:
+        cutoff = threshold_otsu(exg) if exg.min() < exg.max() else exg.max()
+    else:
+        cutoff = threshold * 255 # calculate_exg_int is 255 * ExG
+    return (exg > cutoff).astype(np.uint8), transform, crs
+
+
+def candidate_regions(src_path, threshold: Optional[float] = None, dilation: float = COARSE_DILATION,
+                      overview_level: Optional[int] = None, max_size: int = COARSE_MAX_SIZE):
+    """
+    Polygons around the coarse vegetation candidates, grown by `dilation`.
+
+    Used as a region for the full-resolution chain, so only windows near
+    candidates are filtered and labeled.
+
+    Parameters:
+    - src_path, threshold, overview_level, max_size: see `candidate_mask`.
+    - dilation: margin around candidates, in CRS units.
+
+    Returns:
+    - GeoDataFrame with a single (possibly empty) candidate geometry.
+    """
+    mask, transform, crs = candidate_mask(src_path, threshold, overview_level, max_size)
+
+    pixel_size = min(abs(transform.a), abs(transform.e))
+    radius = math.ceil(dilation / pixel_size)
+    if radius > 0:
+        mask = cv2.dilate(mask, disk(radius).astype(np.uint8))
+
+    polygons = [shape(geometry) for geometry, _ in shapes(mask, mask=mask.astype(bool), transform=transform)]
+    geometry = shapely.union_all(polygons) if polygons else shapely.Polygon()
+    # Drop the pixel staircase; the dilation margin absorbs the difference
+    geometry = shapely.simplify(geometry, pixel_size / 2)
+    return gpd.GeoDataFrame(geometry=[geometry], crs=crs)
+
+
+def candidate_block_size(candidates_path, raster_path, max_block_size=REGION_BLOCK_SIZE):
+    """
+    Region block size matched to the scale of the candidates, so blocks
+    between nearby candidates can be skipped.
+
+    The largest power of two no wider than the median candidate (square root
+    of the area of each part), between COARSE_MIN_BLOCK_SIZE and `max_block_size`.
+
+    Parameters:
+    - candidates_path: vector file written from `candidate_regions`.
+    - raster_path: raster (path or RasterSource) the region is indexed against.
+    - max_block_size: block size for candidates as large as it, or larger.
+
+    Returns:
+    - int: block edge length in pixels.
+    """
+    source = RasterSource.of(raster_path)
+    candidates = gpd.read_file(candidates_path)
+    if source.crs is not None and candidates.crs is not None:
+        candidates = candidates.to_crs(source.crs)
+
+    parts = shapely.get_parts(candidates.geometry.values)
+    parts = parts[~shapely.is_empty(parts)]
+    if not len(parts):
+        return max_block_size
+    width = np.median(np.sqrt(shapely.area(parts))) / min(source.res)
+
+    block_size = max_block_size
+    while block_size > COARSE_MIN_BLOCK_SIZE and block_size > width:
+        block_size //= 2
+    return block_size
@@ -0,0 +1,246 @@
+import numpy as np
+import cv2
+from rasterio.windows import Window, bounds as window_bounds, from_bounds
+
+from .image_preprocess import TARGET_CLOSING_RADIUS, close_mask, targets_from_centroids, target_attributes
+from .tiled_processing import pad_window, read_rgb
+from .region_coverage import OUTSIDE, PARTIAL
+from .raster_source import RasterSource
+from .vegetation_indices import calculate_exg_int
+
+LABEL_TILE_SIZE = 4096
+LABEL_HALO = 2 * TARGET_CLOSING_RADIUS # Closing = dilation then erosion
+
+
+class ComponentTable:
+    """
+    Connected components of a mask labeled tile by tile.
+
+    Every tile-local component gets a global id and accumulates its pixel
+    count, coordinate and ExG sums and bounding box. Components touching
+    across a tile seam are merged with a union-find over those ids.
+    """
+
+    # Per-component values, and how merged components combine them
+    SUMS = ("area", "row_sums", "col_sums", "exg_sums")
+    MINIMA = ("top", "left")
+    MAXIMA = ("bottom", "right")
+
+    def __init__(self):
+        self.parent = np.zeros(0, dtype=np.int64)
+        self.values = {name: [] for name in self.SUMS + self.MINIMA + self.MAXIMA}
+
+    def add_tile(self, stats, centroids, row_off, col_off, exg_sums=None):
+        """
+        Record the components of one labeled tile.
+
+        Parameters:
+        - stats, centroids: per-label stats and (col, row) centroids from
+          `cv2.connectedComponentsWithStats`, background label included.
+        - row_off, col_off: position of the tile in the raster.
+        - exg_sums: optional per-label sums of integer ExG, background included.
+
+        Returns:
+        - int64 array mapping each local label to its global id (-1 for background).
+        """
+        start = len(self.parent)
+        n = len(stats) - 1
+        stats = stats[1:]
+        area = stats[:, cv2.CC_STAT_AREA].astype(np.float64)
+
+        # Back to exact integer coordinate sums, so centroids of merged
+        # components match labeling the whole mask at once
+        self.values["area"].append(area)
+        self.values["row_sums"].append(np.rint(centroids[1:, 1] * area) + row_off * area)
+        self.values["col_sums"].append(np.rint(centroids[1:, 0] * area) + col_off * area)
+        self.values["exg_sums"].append(np.full(n, np.nan) if exg_sums is None else exg_sums[1:])
+
+        # Bounding boxes in raster pixels, bottom/right exclusive
+        self.values["top"].append(stats[:, cv2.CC_STAT_TOP] + row_off)
+        self.values["left"].append(stats[:, cv2.CC_STAT_LEFT] + col_off)
+        self.values["bottom"].append(self.values["top"][-1] + stats[:, cv2.CC_STAT_HEIGHT])
+        self.values["right"].append(self.values["left"][-1] + stats[:, cv2.CC_STAT_WIDTH])
+
+        self.parent = np.concatenate([self.parent, np.arange(start, start + n)])
+        return np.concatenate([[-1], np.arange(start, start + n)])
+
+    def _find(self, i):
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root: # Path compression
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, a, b):
+        """Merge the components of each pair (a[i], b[i]) of global ids."""
+        for i, j in set(zip(a.tolist(), b.tolist())):
+            root_i, root_j = self._find(i), self._find(j)
+            if root_i != root_j:
+                self.parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    def components(self):
+        """
+        Merged components, in O(components).
+
+        Returns:
+        - dict of arrays: "rows"/"cols" pixel centroids, "pixel_count", "exg_sum",
+          and "top", "left", "bottom", "right" pixel bounding boxes.
+        """
+        if not len(self.parent):
+            empty = np.zeros(0)
+            return dict(rows=empty, cols=empty, pixel_count=empty, exg_sum=empty,
+                        top=empty, left=empty, bottom=empty, right=empty)
+
+        # Resolve every id to its root by pointer jumping
+        roots = self.parent
+        while True:
+            jumped = roots[roots]
+            if np.array_equal(jumped, roots):
+                break
+            roots = jumped
+
+        unique_roots, index = np.unique(roots, return_inverse=True)
+        n = len(unique_roots)
+        merged = {
+            name: np.bincount(index, weights=np.concatenate(self.values[name]), minlength=n)
+            for name in self.SUMS
+        }
+        for names, reduce, initial in ((self.MINIMA, np.minimum, np.inf), (self.MAXIMA, np.maximum, -np.inf)):
+            for name in names:
+                merged[name] = np.full(n, initial)
+                reduce.at(merged[name], index, np.concatenate(self.values[name]))
+
+        area = merged["area"]
+        return dict(
+            rows=merged["row_sums"] / area, cols=merged["col_sums"] / area, pixel_count=area,
+            exg_sum=merged["exg_sums"], top=merged["top"], left=merged["left"],
+            bottom=merged["bottom"], right=merged["right"],
+        )
+
+    def centroids(self):
+        """Pixel centroids (rows, cols) of the merged components."""
+        components = self.components()
+        return components["rows"], components["cols"]
+
+
+def seam_pairs(current, neighbour):
+    """
+    8-connected pairs between two parallel lines of global ids across a seam.
+
+    Parameters:
+    - current: ids along the first row/column of the new tile.
+    - neighbour: ids along the adjacent row/column of already labeled tiles,
+      aligned with `current` and one pixel longer on each end (-1 padded).
+
+    Returns:
+    - (a, b) arrays of ids to merge.
+    """
+    pairs_a, pairs_b = [], []
+    for shift in (0, 1, 2): # neighbour offset -1, 0, +1
+        other = neighbour[shift:shift + len(current)]
+        touching = (current >= 0) & (other >= 0)
+        pairs_a.append(current[touching])
+        pairs_b.append(other[touching])
+    return np.concatenate(pairs_a), np.concatenate(pairs_b)
+
+
+def read_exg_int(exg_source, window, transform):
+    """
+    Integer ExG of an RGB raster over `window` of the mask grid given by `transform`.
+
+    The window is read directly when the raster shares the mask's grid, and
+    resampled onto it otherwise (e.g. a mask computed at a coarser GSD).
+    """
+    if exg_source.transform == transform:
+        return calculate_exg_int(read_rgb(exg_source, window))
+    source_window = from_bounds(*window_bounds(window, transform), exg_source.transform)
+    rgb = exg_source.read(source_window, [1, 2, 3], out_shape=(window.height, window.width))
+    return calculate_exg_int(rgb)
+
+
+def identify_targets_tiled(mask_path, transform=None, region_crs=None, tile_size=LABEL_TILE_SIZE,
+                           region=None, exg_source=None):
+    """
+    Streaming equivalent of `identify_targets` for masks too large to label in memory.
+
+    Each tile is closed with a halo, labeled on its own, and its border labels
+    are kept. Components that touch across tile seams (8-connectivity) are
+    merged with a union-find, so every physical object yields one centroid
+    and the result matches `identify_targets` on the whole mask.
+
+    With a `region`, tiles outside it are not read, mask pixels outside it are
+    dropped after closing, and targets whose centroid falls outside it are removed.
+
+    Canopy attributes (`target_attributes`) are reduced per tile label and
+    merged along with the components, so they cost one pass over the pixels.
+
+    Parameters:
+    - mask_path: single band binary mask raster, as a path or RasterSource.
+    - transform: pixel to map transform; defaults to the mask's own.
+    - region_crs: CRS of the targets; defaults to the mask's own.
+    - tile_size: edge length of the tiles labeled at once.
+    - region: optional RegionCoverage of the mask's pixel grid.
+    - exg_source: optional RGB raster (path or RasterSource) covering the mask,
+      for the targets' "mean_exg".
+
+    Returns:
+    - GeoDataFrame of target centroids and `target_attributes`, ordered by centroid row then column.
+    """
+    table = ComponentTable()
+    exg_source = RasterSource.of(exg_source) if exg_source is not None else None
+
+    with RasterSource.of(mask_path) as src:
+        width, height = src.width, src.height
+        transform = transform or src.transform
+        region_crs = region_crs or src.crs
+
+        above = np.full(width + 2, -1, dtype=np.int64) # Bottom row ids of the previous tile row
+        for row_off in range(0, height, tile_size):
+            rows = min(tile_size, height - row_off)
+            next_above = np.full(width + 2, -1, dtype=np.int64)
+            left = None # Right column ids of the previous tile in this row
+
+            for col_off in range(0, width, tile_size):
+                window = Window(col_off, row_off, min(tile_size, width - col_off), rows)
+                state = region.window_state(window) if region is not None else None
+                if state == OUTSIDE:
+                    left = np.full(rows, -1, dtype=np.int64) # Nothing to stitch with
+                    continue
+
+                halo_window, core = pad_window(window, LABEL_HALO, width, height)
+                cleaned = close_mask(src.read(halo_window, 1))[core]
+                if state == PARTIAL:
+                    cleaned[~region.mask(window)] = 0
+
+                n, labels, stats, centroids = cv2.connectedComponentsWithStats(cleaned, connectivity=8)
+                exg_sums = None
+                if exg_source is not None:
+                    exg = read_exg_int(exg_source, window, transform)
+                    exg_sums = np.bincount(labels.ravel(), weights=exg.ravel(), minlength=n)
+                ids = table.add_tile(stats, centroids, row_off, col_off, exg_sums)
+
+                # Seam with the tile row above (full width, so diagonals reach neighbouring tiles)
+                cols = slice(col_off, col_off + window.width + 2)
+                table.union(*seam_pairs(ids[labels[0]], above[cols]))
+
+                # Seam with the tile to the left
+                if left is not None:
+                    table.union(*seam_pairs(ids[labels[:, 0]], np.concatenate([[-1], left, [-1]])))
+
+                left = ids[labels[:, -1]]
+                next_above[col_off + 1:col_off + 1 + window.width] = ids[labels[-1]]
+            above = next_above
+
+    if exg_source is not None:
+        exg_source.close()
+
+    components = table.components()
+    if region is not None:
+        inside = region.contains(components["rows"], components["cols"])
+        components = {name: values[inside] for name, values in components.items()}
+    attributes = target_attributes(
+        components["pixel_count"], components["top"], components["left"],
+        components["bottom"], components["right"], components["exg_sum"], transform,
+    )
+    return targets_from_centroids(components["rows"], components["cols"], transform, region_crs, attributes)
@@ -0,0 +1,104 @@
+from typing import Callable, NamedTuple
+import numpy as np
+import cv2
+from skimage.morphology import opening, closing, disk
+
+# Downsampling factor of the `fast_bilateral` backend
+FAST_BILATERAL_FACTOR = 2
+
+
+def bilateral_reference(image, d, sigma_color, sigma_spatial):
+    """Full-resolution OpenCV bilateral filter on a uint8 image."""
+    return cv2.bilateralFilter(image, d=d, sigmaColor=sigma_color, sigmaSpace=sigma_spatial)
+
+
+def bilateral_downsampled(image, d, sigma_color, sigma_spatial, factor=FAST_BILATERAL_FACTOR):
+    """
+    Bilateral filter run at 1/`factor` resolution, then upsampled back.
+
+    The spatial kernel shrinks with the image so it covers the same pixels
+    of the full-resolution image, at roughly 1/factor^2 of the cost.
+    """
+    height, width = image.shape
+    small = cv2.resize(
+        image, (max(1, width // factor), max(1, height // factor)), interpolation=cv2.INTER_AREA
+    )
+    small = cv2.bilateralFilter(
+        small, d=max(1, d // factor), sigmaColor=sigma_color,
+        sigmaSpace=max(1e-3, sigma_spatial / factor)
+    )
+    return cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+
+
+def to_uint8(image):
+    """[0, 1] float image to uint8, truncating like the reference chain; uint8 input is returned as is."""
+    if image.dtype == np.uint8:
+        return image
+    return (image * 255).astype(np.uint8)
+
+
+def open_close_reference(image, radius):
+    """
+    skimage opening then closing with a disk, on the CLAHE output as [0, 1]
+    floats or already truncated to uint8 (same result, see `open_close_opencv`).
+    """
+    selem = disk(radius)
+    if image.dtype == np.uint8:
+        # skimage's grey morphology is slower on uint8 than on floats, which hold these values exactly
+        return closing(opening(image.astype(np.float32), selem), selem).astype(np.uint8)
+    return to_uint8(closing(opening(image, selem), selem))
+
+
+def open_close_opencv(image, radius):
+    """
+    OpenCV opening then closing with the same disk, on uint8.
+
+    Flat morphology commutes with the monotone float -> uint8 conversion and
+    BORDER_REFLECT matches skimage's default padding, so this gives exactly
+    the reference output.
+    """
+    selem = disk(radius).astype(np.uint8)
+    opened = cv2.morphologyEx(to_uint8(image), cv2.MORPH_OPEN, selem, borderType=cv2.BORDER_REFLECT)
+    return cv2.morphologyEx(opened, cv2.MORPH_CLOSE, selem, borderType=cv2.BORDER_REFLECT)
+
+
+def _morph_sequence(image, operation, sequence):
+    for selem, repeats in sequence:
+        image = operation(image, selem.astype(np.uint8), iterations=repeats, borderType=cv2.BORDER_REFLECT)
+    return image
+
+
+def open_close_decomposed(image, radius):
+    """
+    Opening then closing with skimage's decomposed disk, a sequence of small
+    footprints whose combined shape approximates the disk, on uint8.
+    """
+    sequence = disk(radius, decomposition="sequence") if radius > 0 else ((disk(0), 1),)
+    image = to_uint8(image)
+    image = _morph_sequence(_morph_sequence(image, cv2.erode, sequence), cv2.dilate, sequence)
+    return _morph_sequence(_morph_sequence(image, cv2.dilate, sequence), cv2.erode, sequence)
+
+
+class FilterBackend(NamedTuple):
+    """Implementations of the bilateral and morphology steps of `filter_exg`."""
+    bilateral: Callable
+    open_close: Callable
+    exact: bool # Output identical to the reference chain
+
+
+FILTER_BACKENDS = {
+    "reference":      FilterBackend(bilateral_reference, open_close_reference, True),
+    "opencv":         FilterBackend(bilateral_reference, open_close_opencv, True),
+    "decomposed":     FilterBackend(bilateral_reference, open_close_decomposed, False),
+    "fast_bilateral": FilterBackend(bilateral_downsampled, open_close_opencv, False),
+}
+
+
+def get_filter_backend(name: str) -> FilterBackend:
+    """Look up a filter backend by name, raising ValueError for unknown names."""
+    try:
+        return FILTER_BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown filter backend '{name}', expected one of {sorted(FILTER_BACKENDS)}"
+        ) from None
@@ -1,59 +1,183 @@
-from .vegetation_indices import calculate_exg, normalize_rgb
-from skimage.exposure import equalize_adapthist
-from skimage.morphology import opening, closing, disk
+from backend.config import CV_MAX_MEMORY_BYTES
+from .vegetation_indices import CHUNK_ROWS, calculate_exg_int
+from .filter_backends import get_filter_backend
+from .clahe import StreamingCLAHE
+from .memory_policy import StageMemory, chunk_rows_for_budget
+from rasterio.windows import Window
+from skimage.morphology import disk
 from skimage.filters import threshold_otsu
-from skimage.measure import label, regionprops
+import json
 import cv2
 import numpy as np
 import geopandas as gpd
-from shapely.geometry import Point, Polygon
+import shapely
 
 
-def preprocess_image(image):
+# Filter chain parameters, shared by the whole-image and windowed paths
+BILATERAL_D = 9
+BILATERAL_SIGMA_COLOR = 50
+BILATERAL_SIGMA_SPATIAL = 15 # Lower number is faster
+CLAHE_CLIP_LIMIT = 0.008
+MORPH_RADIUS = 7
+
+# Pixels of context a window needs so its core matches the whole-image result:
+# bilateral radius + opening (erode, dilate) + closing (dilate, erode)
+FILTER_HALO = BILATERAL_D // 2 + 4 * MORPH_RADIUS
+
+
+def preprocess_image(image, scale: float = 1.0, filter_backend: str = "reference",
+                     max_memory_bytes: int = CV_MAX_MEMORY_BYTES, memory: StageMemory = None):
     """
-    Input: NP array representing an image
+    Input: 
+    - image: NP array representing an image
+    - scale: resolution of `image` relative to the full orthophoto (e.g. 0.25 for an overview)
+    - filter_backend: implementation of the filter chain (see `filter_backends`)
+    - max_memory_bytes: memory budget, sets how many rows are processed at once
+    - memory: optional StageMemory recording each stage's high-water mark
     Output: 1-D image NP array ready for thresholding
     """
+    memory = memory or StageMemory(enabled=False)
+    chunk_rows = chunk_rows_for_budget(image.shape[1], max_memory_bytes)
 
     # Normalize ExG to the range [0, 255] for OpenCV compatibility
-    exg = calculate_exg(*normalize_rgb(image))
-    exg_normalized = (exg - np.min(exg)) / (np.max(exg) - np.min(exg))  # Normalize to [0, 1]
-    exg_uint8 = (exg_normalized * 255).astype(np.uint8)
+    with memory.stage("exg"):
+        exg = calculate_exg_int(image, chunk_rows=chunk_rows)
+        exg_uint8 = normalize_exg(exg, exg.min(), exg.max(), chunk_rows=chunk_rows)
+        del exg
+
+    return filter_exg(
+        exg_uint8, backend=filter_backend, max_memory_bytes=max_memory_bytes, memory=memory,
+        **filter_params(scale)
+    )
 
 
-    # Step 1: Bilateral Filtering using OpenCV
-    bl_sigma_color = 50
-    bl_sigma_spatial = 15 # Lower number is faster
+def filter_params(scale: float = 1.0):
+    """
+    Spatial kernel sizes of the filter chain for an image at `scale` times full resolution,
+    so a reduced-resolution run smooths over the same ground distance as a full one.
+
+    Returns:
+    - dict of keyword arguments for `filter_exg`.
+    """
+    return {
+        "bilateral_d": max(1, round(BILATERAL_D * scale)),
+        "bilateral_sigma_spatial": max(1e-3, BILATERAL_SIGMA_SPATIAL * scale),
+        "morph_radius": max(0, round(MORPH_RADIUS * scale)),
+    }
 
-    bilateral_smoothed_exg = cv2.bilateralFilter(
-        exg_uint8 , d=9, 
-        sigmaColor=bl_sigma_color, 
-        sigmaSpace=bl_sigma_spatial
-    )
-    bilateral_smoothed_exg = bilateral_smoothed_exg / 255.0  # Scale back to [0, 1]
 
-    # Step 2: Contrast Enhancement with CLAHE
-    clahe_exg = equalize_adapthist(bilateral_smoothed_exg, clip_limit=0.008)
+def filter_halos(params):
+    """
+    Context pixels (bilateral, morphology) a window needs around it for the
+    `filter_params` kernels: bilateral radius, and opening + closing reach.
+    """
+    return params["bilateral_d"] // 2, 4 * params["morph_radius"]
+
+
+def normalize_exg(exg, exg_min, exg_max, out=None, chunk_rows=CHUNK_ROWS):
+    """
+    Scale an ExG array to uint8 using the given (global) value range.
 
-    # Step 3: Morphological Operations (Opening → Closing)
-    selem = disk(7)  # Structuring element
-    morph_exg = closing(opening(clahe_exg, selem), selem)
+    Integer input (from `calculate_exg_int`) is scaled with exact integer
+    arithmetic, a chunk of rows at a time, without any float copy: values
+    are floor(255 * (exg - min) / (max - min)). The float formula on
+    `calculate_exg` output gives the same, except that float rounding can
+    leave it one lower where that quotient is a whole number.
 
-    processed_image = (morph_exg * 255).astype(np.uint8)
-    return processed_image
+    Parameters:
+    - exg: ExG index array, from `calculate_exg_int` or `calculate_exg`.
+    - exg_min, exg_max: range to stretch over [0, 255].
+    - out: optional preallocated uint8 array of the same shape (integer input only).
+    - chunk_rows: rows scaled at once (integer input only).
+
+    Returns:
+    - uint8 ExG image.
+    """
+    if not np.issubdtype(exg.dtype, np.integer):
+        exg_normalized = (exg - exg_min) / (exg_max - exg_min)  # Normalize to [0, 1]
+        return (exg_normalized * 255).astype(np.uint8)
+
+    if out is None:
+        out = np.empty(exg.shape, dtype=np.uint8)
+    exg_min, span = int(exg_min), max(int(exg_max) - int(exg_min), 1)
+    for row in range(0, exg.shape[0], chunk_rows):
+        chunk = exg[row:row + chunk_rows].astype(np.int32) - exg_min
+        chunk *= 255
+        chunk //= span
+        out[row:row + chunk_rows] = chunk
+    return out
+
+
+def filter_exg(exg_uint8, clahe_kernel_size=None, bilateral_d=BILATERAL_D,
+               bilateral_sigma_spatial=BILATERAL_SIGMA_SPATIAL, morph_radius=MORPH_RADIUS,
+               backend: str = "reference", max_memory_bytes: int = CV_MAX_MEMORY_BYTES,
+               memory: StageMemory = None):
+    """
+    Bilateral filter -> CLAHE -> opening/closing chain on a uint8 ExG image.
+
+    Gives exactly `equalize_adapthist` on the smoothed image / 255 followed
+    by the backend's opening/closing, but only holds uint8 and uint16 images:
+    CLAHE runs a chunk of rows at a time (see `StreamingCLAHE`) and its
+    float output is mapped straight to uint8 by a lookup table.
+
+    Parameters:
+    - exg_uint8: uint8 ExG image from `normalize_exg`.
+    - clahe_kernel_size: CLAHE contextual region size, defaults to 1/8 of the image.
+    - bilateral_d, bilateral_sigma_spatial, morph_radius: spatial kernel sizes (see `filter_params`).
+    - backend: name of the bilateral/morphology implementation (see `filter_backends`).
+    - max_memory_bytes: memory budget, sets how many CLAHE rows are processed at once.
+    - memory: optional StageMemory recording each stage's high-water mark.
+
+    Returns:
+    - uint8 image ready for thresholding.
+    """
+    filters = get_filter_backend(backend)
+    memory = memory or StageMemory(enabled=False)
+    height, width = exg_uint8.shape
+
+    # Step 1: Bilateral Filtering
+    with memory.stage("bilateral"):
+        smoothed = filters.bilateral(exg_uint8, bilateral_d, BILATERAL_SIGMA_COLOR, bilateral_sigma_spatial)
+
+    # Step 2: Contrast Enhancement with CLAHE, into uint16 levels, then back into the smoothed buffer
+    with memory.stage("clahe"):
+        chunk_rows = chunk_rows_for_budget(width, max_memory_bytes)
+        chunks = [Window(0, row, width, min(chunk_rows, height - row)) for row in range(0, height, chunk_rows)]
+
+        clahe = StreamingCLAHE((height, width), kernel_size=clahe_kernel_size, clip_limit=CLAHE_CLIP_LIMIT)
+        for chunk in chunks:
+            clahe.add(smoothed[chunk.toslices()], chunk)
+        clahe.finalize()
+
+        levels = np.empty((height, width), dtype=np.uint16)
+        for chunk in chunks:
+            levels[chunk.toslices()] = clahe.apply(smoothed[chunk.toslices()], chunk)
+        np.take(StreamingCLAHE.uint8_lut(levels.min(), levels.max()), levels, out=smoothed)
+        del levels
+
+    # Step 3: Morphological Operations (Opening → Closing) on uint8
+    with memory.stage("morphology"):
+        return filters.open_close(smoothed, morph_radius)
+
+
+def threshold_cutoff(threshold: float) -> int:
+    """
+    Integer form of a [0, 1] threshold for uint8 images:
+    `value / 255.0 > threshold` exactly when `value > threshold_cutoff(threshold)`.
+    """
+    return int(np.count_nonzero(np.arange(256) / 255.0 <= threshold)) - 1
 
 
 def threshold_image(image, threshold: float = 0.5):
     """
     Input: 
-    - image: 1D image as np array
+    - image: 1D uint8 image as np array
     - threshold: float between 0.0 and 1.0
     Output: Binary mask
     """
 
-    scale_image = image / 255.0 # Scale to [0,1] range
-    binary_mask = scale_image > threshold
-    mask_image = ((binary_mask).astype(np.uint8) * 255) # Convert fromi boolean to inmage
+    # Compare on the uint8 values directly, no float copy of the image
+    _, mask_image = cv2.threshold(image, threshold_cutoff(threshold), 255, cv2.THRESH_BINARY)
     return mask_image
 
 
@@ -84,76 +208,159 @@ def correct_binary_mask(binary_mask, original_shape):
         The binary mask scaled back to the original resolution.
     """
     # Upscale the binary mask to match the original dimensions
-    upscaled_mask = cv2.resize(binary_mask.astype(np.uint8), 
+    upscaled_mask = cv2.resize(binary_mask.astype(np.uint8, copy=False), 
                                (original_shape[1], original_shape[0]),  # width, height
                                interpolation=cv2.INTER_NEAREST)
 
-    # Threshold to ensure binary values (0 or 1)
-    corrected_mask = (upscaled_mask > 0).astype(np.uint8)
+    # Threshold to ensure binary values (0 or 1), in place
+    np.minimum(upscaled_mask, 1, out=upscaled_mask)
 
-    return corrected_mask
+    return upscaled_mask
+
+TARGET_CLOSING_RADIUS = 3 # Gap filling applied to the mask before labeling
+
+
+def close_mask(binary_mask):
+    """Fill small gaps in a binary mask, returning a 0/1 uint8 mask."""
+    selem = disk(TARGET_CLOSING_RADIUS).astype(np.uint8)  # Structuring element
+    return cv2.morphologyEx(
+        (binary_mask > 0).astype(np.uint8), cv2.MORPH_CLOSE, selem, borderType=cv2.BORDER_REFLECT
+    )
 
-def identify_targets(binary_mask, transform, region_crs="EPSG:32613"):
+
+def target_attributes(pixel_count, top, left, bottom, right, exg_sum, transform):
+    """
+    Canopy attributes of targets from their per-component pixel statistics.
+
+    Parameters:
+    - pixel_count: pixels per component.
+    - top, left, bottom, right: pixel bounding boxes, bottom/right exclusive.
+    - exg_sum: per-component sums of integer ExG (`calculate_exg_int`), NaN if unknown.
+    - transform: affine transform from pixel to map coordinates (metres).
+
+    Returns:
+    - dict of arrays: "pixel_count", "area_m2", "equivalent_diameter_m",
+      "bbox_width_m", "bbox_height_m" and "mean_exg" (ExG in [-2, 2]).
+    """
+    pixel_count = np.asarray(pixel_count, dtype=np.float64)
+    area = pixel_count * abs(transform.determinant)
+    return {
+        "pixel_count": pixel_count.astype(np.int64),
+        "area_m2": area,
+        "equivalent_diameter_m": 2 * np.sqrt(area / np.pi),
+        "bbox_width_m": (np.asarray(right) - left) * np.hypot(transform.a, transform.d),
+        "bbox_height_m": (np.asarray(bottom) - top) * np.hypot(transform.b, transform.e),
+        "mean_exg": np.asarray(exg_sum, dtype=np.float64) / np.maximum(pixel_count, 1) / 255,
+    }
+
+
+def targets_from_centroids(centroid_rows, centroid_cols, transform, region_crs="EPSG:32613",
+                           attributes=None):
+    """
+    Build the targets GeoDataFrame from pixel centroids.
+
+    Parameters:
+    - centroid_rows, centroid_cols: arrays of centroid pixel coordinates.
+    - transform: affine transform from pixel to map coordinates.
+    - region_crs: CRS of `transform`.
+    - attributes: optional dict of per-target arrays (see `target_attributes`),
+      in the same order as the centroids.
+
+    Returns:
+    - GeoDataFrame of target points, ordered by centroid row then column.
+    """
+    # Label order depends on how the mask was scanned; use centroid raster order instead
+    order = np.lexsort((centroid_cols, centroid_rows))
+    centroid_cols, centroid_rows = centroid_cols[order], centroid_rows[order]
+
+    # Convert every centroid to geographic coordinates at once
+    centroid_x, centroid_y = transform * (centroid_cols, centroid_rows)
+
+    data = {name: np.asarray(values)[order] for name, values in (attributes or {}).items()}
+    return gpd.GeoDataFrame(data, geometry=shapely.points(centroid_x, centroid_y), crs=region_crs)
+
+
+def identify_targets(binary_mask, transform, region_crs="EPSG:32613", exg=None):
+    """
+    Find one target per connected blob of a binary mask, with its canopy attributes.
+
+    Parameters:
+    - binary_mask: uint8 mask (nonzero = vegetation).
+    - transform: affine transform from pixel to map coordinates.
+    - region_crs: CRS of `transform`.
+    - exg: optional integer ExG (`calculate_exg_int`) of the same shape, for "mean_exg".
+
+    Returns:
+    - GeoDataFrame of target centroids and `target_attributes`, ordered by centroid row then column.
+    """
     # Step 1: Preprocess the binary mask
-    selem = disk(3)  # Structuring element
-    cleaned_mask = closing(binary_mask, selem)  # Fill small gaps
-
-    # Step 2: Label connected components
-    labeled_mask = label(cleaned_mask)
-    regions = regionprops(labeled_mask)
-
-    # Step 3: Extract centroids and bounding boxes
-    features = []
-
-    for region in regions:
-        # Centroid (convert pixel coordinates to geographic coordinates)
-        centroid_row, centroid_col = region.centroid  # (row, col in pixel space)
-        centroid_x, centroid_y = transform * (centroid_col, centroid_row)  # Apply affine transform
-        centroid_point = Point(centroid_x, centroid_y)  # Geographic centroid as Point
-
-        # Bounding box
-        min_row, min_col, max_row, max_col = region.bbox
-        min_x, min_y = transform * (min_col, min_row)  # Top-left corner
-        max_x, max_y = transform * (max_col, max_row)  # Bottom-right corner
-        bounding_box = Polygon([
-            (min_x, min_y),
-            (max_x, min_y),
-            (max_x, max_y),
-            (min_x, max_y),
-            (min_x, min_y)  # Close the polygon
-        ])
-
-        # Add to feature list
-
-        # NOTE: "bounding_box" is of type Polygon, so is not JSON serializable
-        # features.append({"geometry": centroid_point, "bounding_box": bounding_box})
-        features.append({"geometry": centroid_point})
-
-    # Step 4: Create GeoDataFrame
-    targets_gdf = gpd.GeoDataFrame(features, crs=region_crs)
+    cleaned_mask = close_mask(binary_mask)
 
-    return targets_gdf
+    # Step 2: Label connected components, with per-label stats as arrays
+    n, labels, stats, centroids = cv2.connectedComponentsWithStats(cleaned_mask, connectivity=8)
 
+    # Step 3: Per-label reductions in one pass over the pixels
+    exg_sum = (
+        np.bincount(labels.ravel(), weights=exg.ravel(), minlength=n)[1:]
+        if exg is not None else np.full(n - 1, np.nan)
+    )
+    stats = stats[1:]
+    attributes = target_attributes(
+        stats[:, cv2.CC_STAT_AREA], stats[:, cv2.CC_STAT_TOP], stats[:, cv2.CC_STAT_LEFT],
+        stats[:, cv2.CC_STAT_TOP] + stats[:, cv2.CC_STAT_HEIGHT],
+        stats[:, cv2.CC_STAT_LEFT] + stats[:, cv2.CC_STAT_WIDTH],
+        exg_sum, transform,
+    )
+
+    # Step 4: Create GeoDataFrame, skipping the background label
+    return targets_from_centroids(centroids[1:, 1], centroids[1:, 0], transform, region_crs, attributes)
 
-import uuid
+
+# Collection-level metadata member of targets GeoJSON files
+TARGETS_METADATA = "metadata"
 
 def assign_target_metadata(targets_gdf, region_name, region_version):
     """
-    Assigns a globally unique ID to each target in `targets_gdf` and associates an outline version.
+    Assigns a job-scoped integer ID to each target in `targets_gdf` and associates an outline version.
+
+    IDs are the targets' positions in the job's detections (0, 1, ...), so they
+    double as integer indexes. The region name and outline version are the same
+    for every target; they are kept once, in `targets_gdf.attrs[TARGETS_METADATA]`,
+    and written at the collection level by `write_targets_geojson`.
 
     Parameters:
     - targets_gdf (GeoDataFrame): The GeoDataFrame containing target points.
     - region_name (str): Name of region for which we have an outline.
-    - region_version (str): The outline version to associate with each target.
+    - region_version (str): The outline version to associate with the targets.
 
     Returns:
-    - GeoDataFrame: Updated `targets_gdf` with unique IDs and version.
+    - GeoDataFrame: Updated `targets_gdf` with integer IDs and metadata.
     """
-    # Assign a globally unique ID to each target
-    targets_gdf["target_id"] = [str(uuid.uuid4()) for _ in range(len(targets_gdf))]
+    targets_gdf["target_id"] = np.arange(len(targets_gdf), dtype=np.int64)
+    targets_gdf.attrs[TARGETS_METADATA] = {
+        "region_name": region_name,
+        "region_outline_version": region_version,
+        "target_id_scheme": "job_index",
+    }
+    return targets_gdf
 
-    # Associate each target with the given outline version
-    targets_gdf["region_outline_version"] = region_version
-    targets_gdf["region_name"] = region_name
 
-    return targets_gdf
+def write_targets_geojson(targets_gdf, geojson_path, metadata=None):
+    """
+    Write targets as a compact GeoJSON FeatureCollection, with job metadata as a
+    collection-level "metadata" member instead of per-feature properties.
+
+    Parameters:
+    - targets_gdf (GeoDataFrame): targets, already in the output CRS.
+    - geojson_path: file to write.
+    - metadata: dict stored once for the collection; defaults to the one set by `assign_target_metadata`.
+
+    Returns:
+    - str: `geojson_path`
+    """
+    collection = targets_gdf.to_geo_dict(na="null", drop_id=True)
+    collection[TARGETS_METADATA] = metadata if metadata is not None else targets_gdf.attrs.get(TARGETS_METADATA, {})
+    with open(geojson_path, "w", encoding="utf-8") as f:
+        json.dump(collection, f, separators=(",", ":"))
+    return geojson_path
+
@@ -1,26 +1,39 @@
 import matplotlib.pyplot as plt
-import rasterio
 import cv2
 import os
 
+from .raster_source import RasterSource
+
 # Load an image (GeoTIFF or standard formats)
 def load_image(file_path):
-    try:
-        if not os.path.exists(file_path):
-            print(f"File not found: {file_path}")
-        if file_path.endswith('.tif'):
-            # Use rasterio for GeoTIFFs
-            with rasterio.open(file_path) as src:
-                print(f"Image CRS - {src.crs}")
-                image = src.read([b for b in range(1, src.count + 1)]).transpose(1, 2, 0) # RGB(A)
-                return image, src.transform, src.bounds, src.crs
-        else:
-            # Use OpenCV or PIL for standard formats
-            image = cv2.cvtColor(cv2.imread(file_path), cv2.COLOR_BGR2RGB)
-            return image, None, None, None
-    except Exception as e:
-        print(f"Error loading image: {e}")
-        return None, None, None, None
+    """
+    Read a whole image into memory. Stages that don't need every pixel should
+    use a RasterSource and windowed reads instead.
+
+    Parameters:
+    - file_path: GeoTIFF (read through RasterSource, memory-mapped when possible) or standard image.
+
+    Returns:
+    - image: (H, W, bands) array, RGB(A) band order.
+    - transform, bounds, crs: georeferencing, None for standard formats.
+
+    Raises:
+    - FileNotFoundError if the file doesn't exist, ValueError if it can't be decoded.
+    """
+    file_path = str(file_path)
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+
+    if file_path.endswith('.tif'):
+        # Use RasterSource for GeoTIFFs
+        with RasterSource(file_path) as src:
+            return src.read(), src.transform, src.bounds, src.crs
+
+    # Use OpenCV for standard formats
+    image = cv2.imread(file_path)
+    if image is None:
+        raise ValueError(f"Unable to decode image: {file_path}")
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB), None, None, None
 
 # Visualize the image
 def plot_image(image, title="Image"):
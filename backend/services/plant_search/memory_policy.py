@@ -0,0 +1,131 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError: # Not available on Windows; stages then report traced memory only
+    resource = None
+
+from backend.config import CV_TRACE_MEMORY
+
+# Share of the memory budget given to the transient buffers of one chunk of
+# rows; the rest holds the full-size uint8/uint16 buffers shared by the stages.
+CHUNK_BUDGET_FRACTION = 1 / 16
+
+# Transient bytes per pixel of the chunked steps: ExG in int16/int32, and the
+# CLAHE histogram indices and interpolation terms (int64/float64)
+CHUNK_BYTES_PER_PIXEL = 48
+
+
+def chunk_rows_for_budget(width, max_memory_bytes, bytes_per_pixel=CHUNK_BYTES_PER_PIXEL):
+    """
+    Rows of a `width` pixel wide image processed at once, so one chunk's
+    transient buffers fit in `CHUNK_BUDGET_FRACTION` of the budget.
+
+    Returns:
+    - int: at least 1.
+    """
+    return max(1, int(max_memory_bytes * CHUNK_BUDGET_FRACTION) // (max(1, width) * bytes_per_pixel))
+
+
+def max_rss_bytes():
+    """High-water resident set size of this process, None where unavailable."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 # Linux reports KiB
+
+
+def run_traced(trace, task, *args):
+    """
+    Run `task(*args)`, also measuring its memory high-water mark when `trace` is set.
+
+    Module-level so it can be sent to worker processes along with the task.
+
+    Returns:
+    - (result, (traced_peak_bytes, max_rss_bytes)), or (result, None) without `trace`.
+    """
+    if not trace:
+        return task(*args), None
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    try:
+        result = task(*args)
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        if started:
+            tracemalloc.stop()
+    return result, (peak, max_rss_bytes())
+
+
+class StageMemory:
+    """
+    Per-stage memory high-water marks of a pipeline run.
+
+    Traced peaks come from tracemalloc, which sees numpy (and OpenCV output)
+    arrays but not GDAL's or OpenCV's internal buffers; the process RSS
+    high-water mark is recorded alongside as an upper bound. Tiled stages
+    report the largest peak of any single tile, i.e. per worker process.
+
+    Tracing slows allocation down, so it is off unless `enabled`
+    (`CV_TRACE_MEMORY=1`); stages are then only timed.
+    """
+
+    def __init__(self, enabled=CV_TRACE_MEMORY):
+        self.enabled = enabled
+        self.stages = {}
+
+    def record(self, name, peak_bytes=None, rss_bytes=None, seconds=0.0):
+        """Merge one measurement into stage `name`, keeping the maxima and summing time."""
+        stage = self.stages.setdefault(name, {"peak_bytes": 0, "max_rss_bytes": None, "seconds": 0.0})
+        stage["seconds"] += seconds
+        if peak_bytes is not None:
+            stage["peak_bytes"] = max(stage["peak_bytes"], peak_bytes)
+        if rss_bytes is not None:
+            stage["max_rss_bytes"] = max(stage["max_rss_bytes"] or 0, rss_bytes)
+
+    @contextmanager
+    def stage(self, name):
+        """Measure the code run inside the block as stage `name` (stages don't nest)."""
+        start = time.perf_counter()
+        if not self.enabled:
+            yield
+            self.record(name, seconds=time.perf_counter() - start)
+            return
+
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            if started:
+                tracemalloc.stop()
+            self.record(name, peak, max_rss_bytes(), time.perf_counter() - start)
+
+    def map(self, name, tile_map, task, *iterables):
+        """
+        `tile_map(task, *iterables)` (serial `map` or a pool's), recording every
+        task's high-water mark under stage `name`.
+
+        Yields:
+        - the task results, in order; consume them all for the stage to be recorded.
+        """
+        start = time.perf_counter()
+        iterables = [list(iterable) for iterable in iterables]
+        n = len(iterables[0]) if iterables else 0
+        for result, measured in tile_map(run_traced, [self.enabled] * n, [task] * n, *iterables):
+            if measured is not None:
+                self.record(name, *measured)
+            yield result
+        self.record(name, seconds=time.perf_counter() - start)
+
+    def report(self):
+        """{stage name: {"peak_bytes", "max_rss_bytes", "seconds"}} in the order stages ran."""
+        return {name: dict(stage) for name, stage in self.stages.items()}
@@ -0,0 +1,174 @@
+import queue
+import threading
+from contextlib import closing, nullcontext
+import numpy as np
+import rasterio
+
+from backend.config import (
+    logger, CV_DETECTOR_THREADS, CV_DETECTOR_BATCH_SIZE, CV_DETECTOR_TILE_SIZE, CV_DETECTOR_OVERLAP
+)
+from .tiled_processing import plan_windows, pad_window, read_rgb, output_profile, region_mask, outside_region
+from .raster_source import RasterSource
+
+try:
+    import onnxruntime
+except ModuleNotFoundError:
+    onnxruntime = None
+
+PREFETCH_BATCHES = 2 # Batches read and decoded ahead of inference
+
+
+def detector_available():
+    """Whether onnxruntime is installed, so the "onnx" search engine can run."""
+    return onnxruntime is not None
+
+
+class OnnxDetector:
+    """
+    A segmentation model run with onnxruntime on the CPU.
+
+    The model takes a fixed-size float32 batch of RGB tiles, (batch, 3, tile, tile)
+    with values in [0, 1], and outputs per-pixel target probabilities as
+    (batch, 1, tile, tile) or (batch, tile, tile).
+    """
+
+    def __init__(self, model_path, threads=CV_DETECTOR_THREADS, batch_size=CV_DETECTOR_BATCH_SIZE,
+                 tile_size=CV_DETECTOR_TILE_SIZE, overlap=CV_DETECTOR_OVERLAP):
+        """
+        Parameters:
+        - model_path: ONNX model file.
+        - threads: intra-op threads of the inference session.
+        - batch_size: tiles per inference call; partial batches are zero-padded.
+        - tile_size: edge length of the model's input tiles.
+        - overlap: pixels of context on each side of a tile whose predictions are discarded.
+        """
+        if onnxruntime is None:
+            raise RuntimeError("onnxruntime is not installed; the ONNX detector is unavailable")
+        if tile_size <= 2 * overlap:
+            raise ValueError("Detector tiles must be larger than twice their overlap")
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1 # One graph at a time; parallelism is within operators
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            str(model_path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        self.batch_size, self.tile_size, self.overlap = batch_size, tile_size, overlap
+
+    def predict(self, batch):
+        """(batch, tile, tile) target probabilities of a (batch, 3, tile, tile) float32 batch."""
+        output = self.session.run(None, {self.input_name: batch})[0]
+        return output.reshape(len(batch), self.tile_size, self.tile_size)
+
+
+def _decoded_batches(source, windows, detector, region=None):
+    """
+    Read and decode the tiles of `windows` into fixed-size model batches.
+
+    Yields:
+    - (batch, windows, cores): float32 (batch_size, 3, tile, tile) array, the
+      windows in it and where each window's pixels sit inside its tile.
+    """
+    size, overlap = detector.tile_size, detector.overlap
+    windows = [window for window in windows if not outside_region(region, window)]
+
+    for start in range(0, len(windows), detector.batch_size):
+        batch_windows = windows[start:start + detector.batch_size]
+        batch = np.zeros((detector.batch_size, 3, size, size), dtype=np.float32)
+        cores = []
+        for i, window in enumerate(batch_windows):
+            halo, _ = pad_window(window, overlap, source.width, source.height)
+            # Tiles cut by the raster edge are zero-padded where the halo would be
+            top = overlap - (window.row_off - halo.row_off)
+            left = overlap - (window.col_off - halo.col_off)
+            rgb = read_rgb(source, halo)
+            batch[i, :, top:top + halo.height, left:left + halo.width] = np.moveaxis(rgb, -1, 0) / np.float32(255)
+            cores.append((slice(overlap, overlap + window.height), slice(overlap, overlap + window.width)))
+        yield batch, batch_windows, cores
+
+
+def _prefetch(iterator, depth=PREFETCH_BATCHES):
+    """
+    Run `iterator` on a background thread, `depth` items ahead of the consumer.
+
+    Raster reads and onnxruntime both release the GIL, so decoding the next
+    batches overlaps with inference on the current one.
+    """
+    items = queue.Queue(maxsize=depth)
+    done = object()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterator:
+                if stop.is_set():
+                    return
+                items.put(item)
+        except BaseException as e: # Re-raised in the consumer
+            items.put(e)
+            return
+        items.put(done)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        while thread.is_alive(): # Unblock a producer waiting on a full queue
+            try:
+                items.get_nowait()
+            except queue.Empty:
+                pass
+            thread.join(timeout=0.05)
+
+
+def detect_raster(src_path, dst_path, detector, region=None, memory=None):
+    """
+    Score every pixel of an RGB raster with a segmentation model.
+
+    The raster is cut into windows of `tile_size - 2 * overlap` pixels, each
+    read with `overlap` pixels of context into a fixed-size tile; tiles are batched, scored, and
+    the window's part of each prediction is written back. The output has the
+    same form as `preprocess_raster`'s (uint8, 255 = most likely target), so
+    thresholding, binary masks and target detection work unchanged.
+
+    Parameters:
+    - src_path: RGB(A) raster, as a path or RasterSource.
+    - dst_path: single band GeoTIFF to write.
+    - detector: an `OnnxDetector`, or any object with its `predict`,
+      `batch_size`, `tile_size` and `overlap`.
+    - region: optional RegionCoverage; windows outside it are not read and
+      pixels outside it are written as 0.
+    - memory: optional StageMemory recording the "detect" stage.
+
+    Returns:
+    - str: `dst_path`
+    """
+    with RasterSource.of(src_path) as src, rasterio.open(dst_path, "w", **output_profile(src)) as dst:
+        # Every tile's core is scored, so windows step by exactly that, not by source blocks
+        step = detector.tile_size - 2 * detector.overlap
+        windows = plan_windows(src.width, src.height, step, (step, step))
+        batches = _prefetch(_decoded_batches(src, windows, detector, region))
+
+        with closing(batches), memory.stage("detect") if memory is not None else nullcontext():
+            for batch, batch_windows, cores in batches:
+                probabilities = detector.predict(batch)
+                for probability, window, core in zip(probabilities, batch_windows, cores):
+                    scores = np.rint(np.clip(probability[core], 0, 1) * 255).astype(np.uint8)
+                    inside = region_mask(region, window)
+                    if inside is not None:
+                        scores[~inside] = 0
+                    dst.write(scores, 1, window=window)
+
+    logger.info(f"Detector scored {len(windows)} windows in batches of {detector.batch_size}")
+    return dst_path
@@ -0,0 +1,82 @@
+import rasterio
+import numpy as np
+import cv2
+from typing import Optional
+from rasterio.enums import Resampling
+
+from .image_preprocess import preprocess_image
+
+
+def read_reduced(src_path, overview_level: Optional[int] = None, max_size: int = 2048):
+    """
+    Read the RGB bands of a raster at reduced resolution.
+
+    With `overview_level`, that internal overview of the (COG) raster is read
+    directly. Otherwise the raster is decimated so its longest side is at most
+    `max_size`, which GDAL serves from the closest overview when one exists.
+
+    Parameters:
+    - src_path: path to the RGB(A) raster, ideally a COG with overviews.
+    - overview_level: index into the raster's overviews (0 = largest overview).
+    - max_size: longest side of the decimated read, used without `overview_level`.
+
+    Returns:
+    - image: (H, W, 3) uint8 array.
+    - transform: affine transform of the reduced image.
+    - crs: CRS of the raster.
+    - scale: reduced resolution relative to full resolution.
+    """
+    with rasterio.open(src_path) as full:
+        full_width = full.width
+
+    if overview_level is not None:
+        with rasterio.open(src_path, overview_level=overview_level) as src:
+            image = src.read([1, 2, 3])
+            transform, crs = src.transform, src.crs
+    else:
+        with rasterio.open(src_path) as src:
+            scale = min(1.0, max_size / max(src.width, src.height))
+            out_shape = (3, max(1, round(src.height * scale)), max(1, round(src.width * scale)))
+            image = src.read([1, 2, 3], out_shape=out_shape, resampling=Resampling.average)
+            transform = src.transform * src.transform.scale(
+                src.width / out_shape[2], src.height / out_shape[1]
+            )
+            crs = src.crs
+
+    return np.moveaxis(image, 0, -1), transform, crs, image.shape[2] / full_width
+
+
+def preprocess_preview(src_path, dst_path, png_path=None,
+                       overview_level: Optional[int] = None, max_size: int = 2048,
+                       filter_backend: str = "reference"):
+    """
+    Run `preprocess_image` on a reduced-resolution read of the orthophoto.
+
+    Filter kernels are scaled to the reduced resolution (see `filter_params`),
+    so the preview approximates the full-resolution output at a fraction of the cost.
+
+    Parameters:
+    - src_path: path to the RGB(A) raster, ideally the job's COG.
+    - dst_path: path of the georeferenced preview GeoTIFF to write.
+    - png_path: optional PNG copy of the preview.
+    - overview_level, max_size: see `read_reduced`.
+    - filter_backend: implementation of the filter chain (see `filter_backends`).
+
+    Returns:
+    - float: scale of the preview relative to full resolution.
+    """
+    image, transform, crs, scale = read_reduced(src_path, overview_level, max_size)
+    processed = preprocess_image(image, scale=scale, filter_backend=filter_backend)
+
+    profile = dict(
+        driver="GTiff", dtype="uint8", count=1,
+        width=processed.shape[1], height=processed.shape[0],
+        crs=crs, transform=transform,
+    )
+    with rasterio.open(dst_path, "w", **profile) as dst:
+        dst.write(processed, 1)
+
+    if png_path:
+        cv2.imwrite(str(png_path), processed)
+
+    return scale
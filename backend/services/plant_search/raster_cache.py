@@ -0,0 +1,121 @@
+import os
+import json
+import rasterio
+import numpy as np
+from rasterio.windows import Window
+
+from .image_preprocess import threshold_image
+
+CACHE_TILE_SIZE = 256
+
+
+class TiledRasterCache:
+    """
+    Memory-mapped, tile-major copy of a single band uint8 raster.
+
+    Pixels are stored as a (tile_rows, tile_cols, T, T) `.npy` array, so any
+    window touches only the pages of the tiles it overlaps. A JSON sidecar
+    records the raster shape and the source file it was built from.
+    """
+
+    def __init__(self, cache_path):
+        with open(cache_path + ".json", "r") as f:
+            self.meta = json.load(f)
+        self.height = self.meta["height"]
+        self.width = self.meta["width"]
+        self.tile_size = self.meta["tile_size"]
+        self.tiles = np.load(cache_path, mmap_mode="r")
+
+    @classmethod
+    def build(cls, src_path, cache_path, tile_size=CACHE_TILE_SIZE):
+        """
+        Copy band 1 of `src_path` into a new cache, one row of tiles at a time.
+
+        Parameters:
+        - src_path: single band uint8 raster (e.g. the processed region).
+        - cache_path: `.npy` file to write.
+        - tile_size: edge length of cached tiles.
+
+        Returns:
+        - TiledRasterCache opened on the new file.
+        """
+        with rasterio.open(src_path) as src:
+            height, width = src.height, src.width
+            n_rows, n_cols = -(-height // tile_size), -(-width // tile_size)
+            tiles = np.lib.format.open_memmap(
+                cache_path, mode="w+", dtype=np.uint8, shape=(n_rows, n_cols, tile_size, tile_size)
+            )
+
+            for tile_row in range(n_rows):
+                row_off = tile_row * tile_size
+                rows = min(tile_size, height - row_off)
+                strip = src.read(1, window=Window(0, row_off, width, rows))
+
+                # Pad to whole tiles, then split the strip into (cols, T, T)
+                padded = np.zeros((tile_size, n_cols * tile_size), dtype=np.uint8)
+                padded[:rows, :width] = strip
+                tiles[tile_row] = padded.reshape(tile_size, n_cols, tile_size).swapaxes(0, 1)
+            tiles.flush()
+            del tiles
+
+        meta = {
+            "height": height,
+            "width": width,
+            "tile_size": tile_size,
+            "source_path": os.path.abspath(src_path),
+            "source_mtime": os.path.getmtime(src_path),
+        }
+        with open(cache_path + ".json", "w") as f:
+            json.dump(meta, f, indent=4)
+
+        return cls(cache_path)
+
+    @classmethod
+    def open(cls, src_path, cache_path, tile_size=CACHE_TILE_SIZE):
+        """Open the cache for `src_path`, (re)building it if missing or older than the source."""
+        try:
+            cache = cls(cache_path)
+            if cache.meta["source_mtime"] == os.path.getmtime(src_path):
+                return cache
+        except (OSError, ValueError, KeyError):
+            pass
+        return cls.build(src_path, cache_path, tile_size)
+
+    def read(self, window=None):
+        """
+        Read a window of the cached raster.
+
+        Parameters:
+        - window: rasterio Window, clipped to the raster; the whole raster if None.
+
+        Returns:
+        - (H, W) uint8 array.
+        """
+        if window is None:
+            window = Window(0, 0, self.width, self.height)
+        window = window.intersection(Window(0, 0, self.width, self.height))
+        row0, col0 = int(window.row_off), int(window.col_off)
+        row1, col1 = row0 + int(window.height), col0 + int(window.width)
+
+        t = self.tile_size
+        out = np.empty((row1 - row0, col1 - col0), dtype=np.uint8)
+        for tile_row in range(row0 // t, -(-row1 // t)):
+            r0, r1 = max(row0, tile_row * t), min(row1, (tile_row + 1) * t)
+            for tile_col in range(col0 // t, -(-col1 // t)):
+                c0, c1 = max(col0, tile_col * t), min(col1, (tile_col + 1) * t)
+                out[r0 - row0:r1 - row0, c0 - col0:c1 - col0] = self.tiles[
+                    tile_row, tile_col, r0 - tile_row * t:r1 - tile_row * t, c0 - tile_col * t:c1 - tile_col * t
+                ]
+        return out
+
+    def threshold(self, threshold: float, window=None):
+        """Binary mask (0/255 uint8) of a window, computed on demand from the cached values."""
+        return threshold_image(self.read(window), threshold)
+
+    def windows(self, rows_per_strip=None):
+        """Full-width strips covering the raster, aligned to cache tiles."""
+        rows = rows_per_strip or self.tile_size
+        return [
+            Window(0, row, self.width, min(rows, self.height - row))
+            for row in range(0, self.height, rows)
+        ]
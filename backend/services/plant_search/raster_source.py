@@ -0,0 +1,160 @@
+import os
+import numpy as np
+import rasterio
+from rasterio.enums import Interleaving, Resampling
+from rasterio.windows import Window
+
+
+class RasterSource:
+    """
+    Lazy, windowed access to a raster file.
+
+    Only metadata is read up front (transform, CRS, shape, block layout).
+    Pixels are read on demand with `read`, one window at a time. Uncompressed,
+    striped GeoTIFFs are memory-mapped, so full-resolution reads of them are
+    zero-copy views of the file; anything else goes through rasterio.
+
+    The dataset is opened on first read and reopened after `close`, so a source
+    can be shared between stages (and pickled to worker processes) freely.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters:
+        - path: raster file path.
+        """
+        self.path = str(path)
+        self._dataset = None
+        self._memmap = None
+
+        with rasterio.open(self.path) as src:
+            self.transform = src.transform
+            self.crs = src.crs
+            self.width, self.height, self.count = src.width, src.height, src.count
+            self.dtype = np.dtype(src.dtypes[0])
+            self.res = src.res
+            self.bounds = src.bounds
+            self.block_shape = src.block_shapes[0]
+            self._memmap_layout = self._find_memmap_layout(src)
+
+    @classmethod
+    def of(cls, source):
+        """`source` itself if it is a RasterSource, else a RasterSource on the path."""
+        return source if isinstance(source, cls) else cls(source)
+
+    @property
+    def shape(self):
+        """(rows, cols) of the raster."""
+        return (self.height, self.width)
+
+    @property
+    def dataset(self):
+        """The open rasterio dataset, (re)opened on demand."""
+        if self._dataset is None or self._dataset.closed:
+            self._dataset = rasterio.open(self.path)
+        return self._dataset
+
+    @property
+    def memory_mapped(self):
+        """Whether full-resolution reads are served from a memory map of the file."""
+        return self._memmap_layout is not None
+
+    def close(self):
+        """Release the dataset and memory map; later reads reopen them."""
+        if self._dataset is not None:
+            self._dataset.close()
+        self._dataset = None
+        self._memmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getstate__(self):
+        # Worker processes reopen the file from its path
+        state = self.__dict__.copy()
+        state["_dataset"] = None
+        state["_memmap"] = None
+        return state
+
+    def _find_memmap_layout(self, src):
+        """
+        File offset and array layout of the pixels when they are stored uncompressed
+        in contiguous strips, None otherwise.
+        """
+        striped = self.block_shape[1] == self.width
+        if src.driver != "GTiff" or src.compression is not None or not striped or len(set(src.dtypes)) != 1:
+            return None
+        with open(self.path, "rb") as f:
+            if f.read(2) != b"II": # Big-endian TIFF
+                return None
+
+        pixel = src.interleaving == Interleaving.pixel
+        if not pixel and src.interleaving != Interleaving.band and src.count > 1:
+            return None
+        shape = (self.height, self.width, self.count) if pixel else (self.count, self.height, self.width)
+
+        # Every strip, of every band, must follow the previous one in the file
+        strip_bytes = self.block_shape[0] * self.width * self.dtype.itemsize * (self.count if pixel else 1)
+        n_strips = -(-self.height // self.block_shape[0])
+        bands = [1] if pixel else range(1, self.count + 1)
+        expected = None
+        for band in bands:
+            for strip in range(n_strips):
+                offset = src.get_tag_item(f"BLOCK_OFFSET_0_{strip}", "TIFF", bidx=band)
+                if offset is None or (expected is not None and int(offset) != expected):
+                    return None
+                if expected is None:
+                    start = int(offset)
+                expected = int(offset) + (
+                    strip_bytes if strip < n_strips - 1
+                    else strip_bytes // self.block_shape[0] * (self.height - strip * self.block_shape[0])
+                )
+
+        if start + int(np.prod(shape)) * self.dtype.itemsize > os.path.getsize(self.path):
+            return None
+        return start, shape, pixel
+
+    def _mapped(self):
+        if self._memmap is None:
+            offset, shape, pixel = self._memmap_layout
+            data = np.memmap(self.path, dtype=self.dtype, mode="r", offset=offset, shape=shape)
+            self._memmap = data if pixel else np.moveaxis(data, 0, -1)
+        return self._memmap
+
+    def read(self, window=None, bands=None, out_shape=None, resampling=Resampling.average):
+        """
+        Read pixels of a window.
+
+        Parameters:
+        - window: rasterio Window, the whole raster if None.
+        - bands: band index (1-based) for a 2-D result, or list of indexes; all bands if None.
+        - out_shape: (rows, cols) to resample the window to, e.g. for a decimated
+          read served from overviews; the window's own shape if None.
+        - resampling: rasterio resampling method used with `out_shape`.
+
+        Returns:
+        - (rows, cols) array for a single band, else a (rows, cols, bands) array.
+          Memory-mapped reads are read-only views of the file.
+        """
+        window = window or Window(0, 0, self.width, self.height)
+        single = isinstance(bands, (int, np.integer))
+        indexes = [bands] if single else list(bands or range(1, self.count + 1))
+        full_resolution = out_shape is None or tuple(out_shape) == (window.height, window.width)
+
+        if self.memory_mapped and full_resolution:
+            rows, cols = window.toslices()
+            data = self._mapped()[rows, cols]
+            if indexes == list(range(indexes[0], indexes[-1] + 1)):
+                data = data[..., indexes[0] - 1:indexes[-1]] # Consecutive bands stay a view
+            else:
+                data = data[..., [index - 1 for index in indexes]]
+        else:
+            kwargs = {} if full_resolution else dict(
+                out_shape=(len(indexes),) + tuple(out_shape), resampling=resampling
+            )
+            data = np.moveaxis(self.dataset.read(indexes, window=window, **kwargs), 0, -1)
+
+        return data[..., 0] if single else data
@@ -0,0 +1,153 @@
+import os
+import numpy as np
+import shapely
+import geopandas as gpd
+from affine import Affine
+from rasterio.features import geometry_mask
+
+from .raster_source import RasterSource
+
+# Block states
+OUTSIDE, PARTIAL, FULL = 0, 1, 2
+
+REGION_BLOCK_SIZE = 256 # Same as the internal tiling of processed rasters
+
+PIXEL_NUDGE = 1e-3 # Pixels
+
+
+class RegionCoverage:
+    """
+    Block-level index of how a region polygon covers a raster.
+
+    Every `block_size` block of the raster is OUTSIDE the region, FULL (all
+    pixel centers inside) or PARTIAL. Windows made only of OUTSIDE blocks can
+    be skipped without reading them; PARTIAL ones are masked with `mask`.
+    """
+
+    def __init__(self, geometry, transform, shape, block_size=REGION_BLOCK_SIZE, blocks=None):
+        """
+        Parameters:
+        - geometry: shapely region geometry in the raster's CRS.
+        - transform: affine transform of the raster.
+        - shape: (rows, cols) of the raster.
+        - block_size: edge length of indexed blocks.
+        - blocks: precomputed block states (see `open`), classified from `geometry` if None.
+        """
+        self.geometry = geometry
+        self.transform = transform
+        self.shape = tuple(shape)
+        self.block_size = block_size
+
+        # Region in pixel coordinates (col, row), so blocks are axis-aligned boxes.
+        # Nudged by a thousandth of a pixel, so edges of grid-aligned regions don't
+        # run exactly through pixel centers, where rasterization ties are broken
+        # differently depending on how the region is clipped.
+        inverse = Affine.translation(PIXEL_NUDGE, PIXEL_NUDGE) * ~transform
+        self.pixel_geometry = shapely.transform(
+            geometry, lambda xy: np.column_stack(inverse * (xy[:, 0], xy[:, 1]))
+        )
+        shapely.prepare(self.pixel_geometry)
+        self.blocks = self._classify() if blocks is None else blocks
+
+    @staticmethod
+    def _read_region(region_paths, raster_path):
+        """
+        Intersection of the regions in `region_paths`, reprojected to the CRS of
+        the raster (path or RasterSource), with the raster's transform and shape.
+        """
+        source = RasterSource.of(raster_path)
+        transform, crs, shape = source.transform, source.crs, source.shape
+
+        geometries = []
+        for region_path in region_paths:
+            region = gpd.read_file(region_path)
+            if crs is not None and region.crs is not None:
+                region = region.to_crs(crs)
+            geometries.append(region.geometry.union_all())
+        return shapely.intersection_all(geometries), transform, shape
+
+    @classmethod
+    def from_file(cls, region_paths, raster_path, block_size=REGION_BLOCK_SIZE):
+        """
+        Index region file(s) (any CRS, e.g. the job's region_contour.geojson) against a raster.
+
+        Parameters:
+        - region_paths: vector file of the region polygon(s), or a list of files to intersect.
+        - raster_path: raster whose pixel grid is indexed.
+        - block_size: edge length of indexed blocks.
+
+        Returns:
+        - RegionCoverage
+        """
+        if isinstance(region_paths, (str, os.PathLike)):
+            region_paths = [region_paths]
+        return cls(*cls._read_region(region_paths, raster_path), block_size)
+
+    @classmethod
+    def open(cls, region_paths, raster_path, index_path, block_size=REGION_BLOCK_SIZE):
+        """Load the index saved at `index_path`, rebuilding it if the region file(s) or raster grid changed."""
+        if isinstance(region_paths, (str, os.PathLike)):
+            region_paths = [region_paths]
+        region_mtimes = [os.path.getmtime(path) for path in region_paths]
+
+        geometry, transform, shape = cls._read_region(region_paths, raster_path)
+        try:
+            with np.load(index_path) as data:
+                if (
+                    data["region_mtimes"].tolist() == region_mtimes
+                    and tuple(data["shape"]) == shape
+                    and int(data["block_size"]) == block_size
+                ):
+                    return cls(geometry, transform, shape, block_size, data["blocks"])
+        except (OSError, KeyError, ValueError):
+            pass
+
+        coverage = cls(geometry, transform, shape, block_size)
+        np.savez(index_path, blocks=coverage.blocks, shape=shape,
+                 block_size=block_size, region_mtimes=region_mtimes)
+        return coverage
+
+    def _classify(self):
+        rows, cols = self.shape
+        b = self.block_size
+        row0, col0 = np.meshgrid(np.arange(0, rows, b), np.arange(0, cols, b), indexing="ij")
+        boxes = shapely.box(col0, row0, np.minimum(col0 + b, cols), np.minimum(row0 + b, rows))
+
+        blocks = np.full(boxes.shape, OUTSIDE, dtype=np.uint8)
+        blocks[shapely.intersects(self.pixel_geometry, boxes)] = PARTIAL
+        blocks[shapely.covers(self.pixel_geometry, boxes)] = FULL
+        return blocks
+
+    def window_state(self, window):
+        """OUTSIDE, PARTIAL or FULL for a window, from the blocks it overlaps."""
+        b = self.block_size
+        rows, cols = window.toslices()
+        states = self.blocks[rows.start // b:-(-rows.stop // b), cols.start // b:-(-cols.stop // b)]
+        if not states.size or (states == OUTSIDE).all():
+            return OUTSIDE
+        if (states == FULL).all():
+            return FULL
+        return PARTIAL
+
+    def mask(self, window):
+        """Boolean array of the window's pixels whose centers lie inside the region."""
+        rows, cols = int(window.height), int(window.width)
+        state = self.window_state(window)
+        if state != PARTIAL:
+            return np.full((rows, cols), state == FULL)
+        # Only the part of the region inside the window needs rasterizing
+        clipped = shapely.clip_by_rect(
+            self.pixel_geometry, window.col_off, window.row_off, window.col_off + cols, window.row_off + rows
+        )
+        return geometry_mask(
+            [clipped], out_shape=(rows, cols),
+            transform=Affine.translation(window.col_off, window.row_off), invert=True
+        )
+
+    def contains(self, rows, cols):
+        """Whether pixel positions (row, col index arrays) lie inside the region."""
+        return shapely.contains_xy(self.pixel_geometry, np.asarray(cols) + 0.5, np.asarray(rows) + 0.5)
+
+    def coverage_fraction(self):
+        """Fraction of blocks that are not OUTSIDE the region."""
+        return float(np.mean(self.blocks != OUTSIDE)) if self.blocks.size else 0.0
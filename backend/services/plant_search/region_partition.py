@@ -1,10 +1,12 @@
-import rasterio
 import numpy as np
+from rasterio.transform import xy
 import cv2
 from shapely.geometry import Polygon, MultiPoint, Point
 from shapely.ops import voronoi_diagram
 import geopandas as gpd
 
+from .raster_source import RasterSource
+
 
 def extract_region_contour(geotiff_path):
     """
@@ -12,23 +14,23 @@ def extract_region_contour(geotiff_path):
     Then simplify polygon by reducing its vertices.
 
     Parameters:
-        geotiff_path (str): Path to the GeoTIFF file.
-        tolerance (float): Tolerance for simplification. Higher values result in greater simplification.
+        geotiff_path (str | RasterSource): The GeoTIFF file.
 
     Returns:
         GeoDataFrame: (Simplified) Contour as a polygon.
     """
-    with rasterio.open(geotiff_path) as src:
-        data = src.read(1) # Read the first band
+    with RasterSource.of(geotiff_path) as src:
+        data = src.read(bands=1) # Only the first band, memory-mapped when possible
 
         # Create a binary mask for valid data
         mask = (data != 0).astype(np.uint8)  # Convert to uint8 for OpenCV
         contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         largest_contour = max(contours, key=cv2.contourArea) # Assume largest contour is primary region
 
-        # Convert contour points to spatial coordinates
-        contour_coords = [src.xy(int(pt[0][1]), int(pt[0][0])) for pt in largest_contour]
-        contour_polygon = Polygon(contour_coords)
+        # Convert contour points (col, row) to spatial coordinates of the pixel centers
+        points = largest_contour[:, 0, :]
+        contour_x, contour_y = xy(src.transform, points[:, 1], points[:, 0])
+        contour_polygon = Polygon(np.column_stack([contour_x, contour_y]))
 
     # Convert to GeoDataFrame
     return gpd.GeoDataFrame({"geometry": [contour_polygon]}, crs=src.crs)
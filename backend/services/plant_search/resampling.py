@@ -0,0 +1,88 @@
+from typing import Optional
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.windows import Window
+
+from .raster_source import RasterSource
+
+# Pixels across the smallest target at the analysis resolution
+TARGET_DIAMETER_PIXELS = 10
+
+RESAMPLE_STRIP_ROWS = 256 # Output rows read and written at once, one block row of the output
+
+
+def analysis_scale(native_gsd: float, target_gsd: Optional[float] = None,
+                   min_target_diameter: Optional[float] = None) -> float:
+    """
+    Resolution to analyze an orthophoto at, relative to its native resolution.
+
+    Parameters:
+    - native_gsd: ground sample distance of the orthophoto, in CRS units per pixel.
+    - target_gsd: requested analysis GSD, in the same units.
+    - min_target_diameter: smallest target to detect, in the same units; it
+      should still span `TARGET_DIAMETER_PIXELS` pixels after resampling.
+
+    Returns:
+    - float: scale in (0, 1]; 1 when no coarser GSD is requested. Never upsamples.
+    """
+    gsds = [native_gsd]
+    if target_gsd is not None:
+        gsds.append(target_gsd)
+    if min_target_diameter is not None:
+        gsds.append(min_target_diameter / TARGET_DIAMETER_PIXELS)
+    if min(gsds) <= 0:
+        raise ValueError("GSD and target diameter must be positive")
+    return min(1.0, native_gsd / max(gsds))
+
+
+def resampled_grid(width, height, transform, scale):
+    """
+    Pixel grid of a raster resampled by `scale`, covering the same bounds.
+
+    Returns:
+    - width, height: resampled dimensions.
+    - transform: affine transform of the resampled grid.
+    """
+    out_width, out_height = max(1, round(width * scale)), max(1, round(height * scale))
+    return out_width, out_height, transform * transform.scale(width / out_width, height / out_height)
+
+
+def resample_raster(src_path, dst_path, scale: float, resampling=Resampling.average):
+    """
+    Write the RGB bands of a raster resampled by `scale` to a tiled GeoTIFF.
+
+    The raster is read a strip of output rows at a time with decimated
+    `out_shape` reads, which GDAL serves from the closest overview when the
+    source (e.g. the job's COG) has them. The output covers the same bounds
+    with an adjusted transform, so pixel positions in it map to full-precision
+    map coordinates.
+
+    Parameters:
+    - src_path: RGB(A) raster to resample, as a path or RasterSource.
+    - dst_path: path of the GeoTIFF to write.
+    - scale: output resolution relative to the source (<= 1).
+    - resampling: rasterio resampling method.
+
+    Returns:
+    - str: `dst_path`
+    """
+    with RasterSource.of(src_path) as src:
+        width, height, transform = resampled_grid(src.width, src.height, src.transform, scale)
+        profile = dict(
+            driver="GTiff", dtype="uint8", count=3, width=width, height=height,
+            crs=src.crs, transform=transform, tiled=True,
+            blockxsize=RESAMPLE_STRIP_ROWS, blockysize=RESAMPLE_STRIP_ROWS,
+            compress="deflate", BIGTIFF="IF_SAFER",
+        )
+        rows_per_pixel = src.height / height
+
+        with rasterio.open(dst_path, "w", **profile) as dst:
+            for row in range(0, height, RESAMPLE_STRIP_ROWS):
+                rows = min(RESAMPLE_STRIP_ROWS, height - row)
+                # Source rows of the strip, fractional where the scale doesn't divide them evenly
+                source = Window(0, row * rows_per_pixel, src.width, rows * rows_per_pixel)
+                strip = src.read(source, [1, 2, 3], out_shape=(rows, width), resampling=resampling)
+                dst.write(np.moveaxis(strip, -1, 0), window=Window(0, row, width, rows))
+
+    return dst_path
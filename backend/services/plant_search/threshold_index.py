@@ -0,0 +1,168 @@
+import numpy as np
+from rasterio.windows import Window
+from skimage.filters import threshold_otsu, threshold_multiotsu
+
+from .image_preprocess import threshold_cutoff
+
+# Quads are scanned in blocks of this many cache tiles per side
+BLOCK_TILES = 4
+
+
+def euler_deltas(block, last_row, last_col):
+    """
+    Bit-quad contributions of one block to the Euler number curve.
+
+    For every 2x2 quad the foreground pattern at cutoff `c` (pixels > c)
+    only changes at the quad's four values, so its contribution to
+    4 * Euler number (8-connectivity: n1 - n3 - 2 * n_diagonal) is a step
+    function of `c`. Those steps are accumulated as a difference array.
+
+    Parameters:
+    - block: int16 pixel values with one leading row and column of context
+      (-1 where that context lies outside the raster).
+    - last_row, last_col: whether the block touches the bottom/right raster edge,
+      in which case quads straddling that edge are included too.
+
+    Returns:
+    - (258,) int64 difference array indexed by cutoff + 1.
+    """
+    if last_row:
+        block = np.pad(block, ((0, 1), (0, 0)), constant_values=-1)
+    if last_col:
+        block = np.pad(block, ((0, 0), (0, 1)), constant_values=-1)
+
+    a, b = block[:-1, :-1].ravel(), block[:-1, 1:].ravel() # top-left, top-right
+    c, d = block[1:, :-1].ravel(), block[1:, 1:].ravel()   # bottom-left, bottom-right
+
+    # Sorting network for the four corner values
+    lo1, hi1 = np.minimum(a, b), np.maximum(a, b)
+    lo2, hi2 = np.minimum(c, d), np.maximum(c, d)
+    s0, s3 = np.minimum(lo1, lo2), np.maximum(hi1, hi2)
+    s1, s2 = np.maximum(lo1, lo2), np.minimum(hi1, hi2)
+    s1, s2 = np.minimum(s1, s2), np.maximum(s1, s2)
+
+    n = 258
+    delta = (
+        np.bincount(s1 + 1, minlength=n) - np.bincount(s0 + 1, minlength=n)  # 3 set: -1
+        + np.bincount(s2 + 1, minlength=n) - np.bincount(s3 + 1, minlength=n)  # 1 set: +1
+    )
+
+    # Exactly the diagonal pair set: -2 while cutoff is between the pairs
+    for (p, q), (r, s) in (((a, d), (b, c)), ((b, c), (a, d))):
+        low, high = np.maximum(r, s), np.minimum(p, q)
+        diagonal = high > low
+        delta -= 2 * np.bincount(low[diagonal] + 1, minlength=n)
+        delta += 2 * np.bincount(high[diagonal] + 1, minlength=n)
+
+    return delta
+
+
+class ThresholdIndex:
+    """
+    Per-threshold statistics of a processed uint8 raster, built in one pass.
+
+    - counts: 256-bin histogram of the whole raster.
+    - tile_counts: (tile_rows, tile_cols, 256) histograms per cache tile.
+    - euler: Euler number (objects minus holes, 8-connectivity) of the mask
+      `value > cutoff` for each cutoff -1..255, a cheap stand-in for the
+      number of detected targets.
+    """
+
+    def __init__(self, counts, tile_counts, euler, tile_size):
+        self.counts = counts
+        self.tile_counts = tile_counts
+        self.euler = euler
+        self.tile_size = tile_size
+
+    @classmethod
+    def build(cls, cache):
+        """
+        Scan a `TiledRasterCache` block by block.
+
+        Parameters:
+        - cache: TiledRasterCache of the processed image.
+
+        Returns:
+        - ThresholdIndex
+        """
+        t = cache.tile_size
+        n_rows, n_cols = cache.tiles.shape[:2]
+        tile_counts = np.zeros((n_rows, n_cols, 256), dtype=np.int64)
+        delta = np.zeros(258, dtype=np.int64)
+
+        step = BLOCK_TILES * t
+        for row0 in range(0, cache.height, step):
+            for col0 in range(0, cache.width, step):
+                rows = min(step, cache.height - row0)
+                cols = min(step, cache.width - col0)
+
+                # One row/column of context above and left of the block
+                block = np.full((rows + 1, cols + 1), -1, dtype=np.int16)
+                ctx_row, ctx_col = max(0, row0 - 1), max(0, col0 - 1)
+                block[ctx_row - row0 + 1:, ctx_col - col0 + 1:] = cache.read(
+                    Window(ctx_col, ctx_row, col0 + cols - ctx_col, row0 + rows - ctx_row)
+                )
+                delta += euler_deltas(
+                    block, row0 + rows == cache.height, col0 + cols == cache.width
+                )
+
+                # Histograms of each cache tile in the block
+                values = block[1:, 1:]
+                tile_ids = (
+                    (np.arange(rows) // t)[:, None] * BLOCK_TILES + (np.arange(cols) // t)[None, :]
+                )
+                hist = np.bincount(
+                    (tile_ids * 256 + values).ravel(), minlength=BLOCK_TILES**2 * 256
+                ).reshape(BLOCK_TILES, BLOCK_TILES, 256)
+                tr, tc = row0 // t, col0 // t
+                tile_counts[tr:tr + BLOCK_TILES, tc:tc + BLOCK_TILES] = \
+                    hist[:min(BLOCK_TILES, n_rows - tr), :min(BLOCK_TILES, n_cols - tc)]
+
+        euler = np.cumsum(delta)[:257] // 4
+        return cls(tile_counts.sum(axis=(0, 1)), tile_counts, euler, t)
+
+    def save(self, path):
+        np.savez(path, counts=self.counts, tile_counts=self.tile_counts,
+                 euler=self.euler, tile_size=self.tile_size)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["counts"], data["tile_counts"], data["euler"], int(data["tile_size"]))
+
+    def foreground(self, threshold: float, tile=None):
+        """Number of pixels in the mask at `threshold`, for the raster or one (row, col) tile."""
+        counts = self.counts if tile is None else self.tile_counts[tile]
+        return int(counts[threshold_cutoff(threshold) + 1:].sum())
+
+    def stats(self, threshold: float):
+        """Mask size and estimated target count at a [0, 1] threshold."""
+        total = int(self.counts.sum())
+        foreground = self.foreground(threshold)
+        return {
+            "threshold": threshold,
+            "foreground_pixels": foreground,
+            "foreground_fraction": foreground / total if total else 0.0,
+            "estimated_targets": max(0, int(self.euler[threshold_cutoff(threshold) + 1])),
+        }
+
+    def curve(self):
+        """Foreground fraction and estimated targets at each threshold k / 255."""
+        total = max(1, int(self.counts.sum()))
+        foreground = np.cumsum(self.counts[::-1])[::-1] # pixels >= k
+        return {
+            "thresholds": (np.arange(256) / 255.0).tolist(),
+            "foreground_fraction": (np.append(foreground[1:], 0) / total).tolist(),
+            "estimated_targets": np.maximum(self.euler[1:], 0).tolist(),
+        }
+
+    def suggest_thresholds(self, classes: int = 3):
+        """
+        Otsu and multi-Otsu thresholds from the stored histogram, as [0, 1] thresholds.
+        """
+        hist = (self.counts, np.arange(256))
+        suggestions = {"otsu": float(threshold_otsu(hist=hist)) / 255.0}
+        if classes > 2:
+            multi = threshold_multiotsu(hist=hist, classes=classes)
+            suggestions["multi_otsu"] = [float(v) / 255.0 for v in multi]
+        return suggestions
@@ -0,0 +1,498 @@
+import os
+import math
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import rasterio
+import numpy as np
+import cv2
+from rasterio.enums import Resampling
+from rasterio.windows import Window
+
+from backend.config import CV_MAX_MEMORY_BYTES, CV_PNG_MAX_SIZE, CV_WORKERS, CV_FILTER_BACKEND, logger
+from .vegetation_indices import calculate_exg_int
+from .image_preprocess import (
+    FILTER_HALO, BILATERAL_SIGMA_COLOR, CLAHE_CLIP_LIMIT, filter_params, filter_halos, normalize_exg
+)
+from .clahe import StreamingCLAHE
+from .region_coverage import OUTSIDE, FULL
+from .filter_backends import get_filter_backend
+from .memory_policy import StageMemory
+from .raster_source import RasterSource
+
+# Rough peak bytes per pixel of `filter_exg` plus its inputs. Images are held
+# in uint8/uint16; the CLAHE interpolation of a chunk (int64 indices, float64
+# terms) dominates, so this is also an upper bound per tile.
+BYTES_PER_PIXEL = 64
+
+OUTPUT_BLOCK_SIZE = 256 # Internal tiling of written GeoTIFFs
+
+
+def estimate_working_set(width, height, bytes_per_pixel=BYTES_PER_PIXEL):
+    """
+    Estimate the peak memory needed to run the filter chain over a whole raster.
+
+    Parameters:
+    - width, height: raster dimensions in pixels.
+    - bytes_per_pixel: peak bytes held per pixel by the chain.
+
+    Returns:
+    - int: estimated bytes.
+    """
+    return width * height * bytes_per_pixel
+
+
+def tile_size_for_budget(max_memory_bytes, halo=FILTER_HALO,
+                         block_size=OUTPUT_BLOCK_SIZE, bytes_per_pixel=BYTES_PER_PIXEL):
+    """
+    Largest square tile (a multiple of `block_size`) whose haloed working set fits the budget.
+
+    Parameters:
+    - max_memory_bytes: memory budget for a single tile.
+    - halo: context pixels added on each side of a tile.
+    - block_size: tiles are rounded down to multiples of this.
+    - bytes_per_pixel: peak bytes held per pixel by the chain.
+
+    Returns:
+    - int: tile edge length in pixels (at least one block).
+    """
+    side = int(math.sqrt(max_memory_bytes / bytes_per_pixel)) - 2 * halo
+    return max(block_size, (side // block_size) * block_size)
+
+
+def plan_windows(width, height, tile_size, block_shape=(OUTPUT_BLOCK_SIZE, OUTPUT_BLOCK_SIZE)):
+    """
+    Split a raster into tile windows aligned to its internal block layout.
+
+    Parameters:
+    - width, height: raster dimensions in pixels.
+    - tile_size: requested tile edge length in pixels.
+    - block_shape: (rows, cols) of the source raster's blocks.
+
+    Returns:
+    - list[Window]: row-major windows covering the raster.
+    """
+    steps = []
+    for size, block in zip((tile_size, tile_size), block_shape):
+        # Striped rasters have full-width blocks; don't try to align to those
+        steps.append(max(block, (size // block) * block) if block < size else size)
+    step_rows, step_cols = steps
+
+    return [
+        Window(col, row, min(step_cols, width - col), min(step_rows, height - row))
+        for row in range(0, height, step_rows)
+        for col in range(0, width, step_cols)
+    ]
+
+
+def pad_window(window, halo, width, height):
+    """
+    Grow a window by `halo` pixels on each side, clipped to the raster.
+
+    Returns:
+    - Window: the haloed window to read.
+    - tuple[slice, slice]: location of the original window inside the haloed one.
+    """
+    col0 = max(0, window.col_off - halo)
+    row0 = max(0, window.row_off - halo)
+    col1 = min(width, window.col_off + window.width + halo)
+    row1 = min(height, window.row_off + window.height + halo)
+
+    core = (
+        slice(window.row_off - row0, window.row_off - row0 + window.height),
+        slice(window.col_off - col0, window.col_off - col0 + window.width),
+    )
+    return Window(col0, row0, col1 - col0, row1 - row0), core
+
+
+def read_rgb(src, window):
+    """Read the RGB bands of `window` of a RasterSource as an (H, W, 3) view."""
+    return src.read(window, [1, 2, 3])
+
+
+def output_profile(src, **overrides):
+    """Single band, tiled GeoTIFF profile georeferenced like `src`."""
+    profile = dict(
+        driver="GTiff",
+        dtype="uint8",
+        count=1,
+        width=src.width,
+        height=src.height,
+        crs=src.crs,
+        transform=src.transform,
+        tiled=True,
+        blockxsize=OUTPUT_BLOCK_SIZE,
+        blockysize=OUTPUT_BLOCK_SIZE,
+        compress="deflate",
+        BIGTIFF="IF_SAFER",
+    )
+    profile.update(overrides)
+    return profile
+
+
+class TileWorkspace:
+    """
+    Per-run state of the tile tasks: the source raster and the memory-mapped scratch rasters.
+
+    Passed to every task explicitly, so runs sharing a process never see each
+    other's files. Tiles travel between processes as windows only; pixels are
+    read from the source file and from/to the scratch rasters, which a pickled
+    workspace reopens on first use in the receiving process.
+    """
+
+    def __init__(self, source, scratch, shape):
+        """
+        Parameters:
+        - source: RasterSource the tasks read from.
+        - scratch: {name: (path, dtype)} raw files of `shape`.
+        - shape: (rows, cols) of the scratch rasters.
+        """
+        self.src = source
+        self.scratch = {name: (str(path), dtype) for name, (path, dtype) in scratch.items()}
+        self.shape = tuple(shape)
+        self._arrays = {}
+
+    def __getitem__(self, name):
+        """Scratch raster `name`, memory-mapped on first use."""
+        if name not in self._arrays:
+            path, dtype = self.scratch[name]
+            self._arrays[name] = np.memmap(path, dtype=dtype, mode="r+", shape=self.shape)
+        return self._arrays[name]
+
+    def close(self):
+        """Close the source and flush the scratch rasters; later use reopens them."""
+        self.src.close()
+        for array in self._arrays.values():
+            array.flush()
+        self._arrays = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_arrays"] = {}
+        return state
+
+
+def _init_worker():
+    cv2.setNumThreads(1) # Parallelism comes from the pool, avoid oversubscription
+
+
+@contextmanager
+def tile_executor(workers=CV_WORKERS):
+    """
+    Run tile tasks serially or in a process pool.
+
+    Tasks get their `TileWorkspace` as an argument, so nothing is shared
+    between runs through module state.
+
+    Parameters:
+    - workers: number of processes; 1 runs tasks in this process.
+
+    Yields:
+    - callable with the signature of `map`.
+    """
+    if workers <= 1:
+        yield map
+        return
+
+    # Spawn, not fork: forking a process with live GDAL/OpenCV threads is unsafe
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    )
+    try:
+        yield pool.map
+    finally:
+        pool.shutdown()
+
+
+def region_mask(region, window):
+    """
+    Pixels of a window inside a region.
+
+    Returns:
+    - bool array of the window's shape, or None when there is no region or it covers the whole window.
+    """
+    if region is None or region.window_state(window) == FULL:
+        return None
+    return region.mask(window)
+
+
+def outside_region(region, window):
+    """Whether a window lies wholly outside a region (RegionCoverage or None), so it can be skipped."""
+    return region is not None and region.window_state(window) == OUTSIDE
+
+
+def region_windows(region, width, height, max_width):
+    """
+    Windows along the blocks of a region: row runs of consecutive blocks all
+    inside or all outside it, at most `max_width` wide, so a haloed filter
+    pays its halo per run rather than per block.
+
+    Parameters:
+    - region: RegionCoverage of the raster.
+    - width, height: raster dimensions in pixels.
+    - max_width: longest run in pixels (at least one block).
+
+    Returns:
+    - list[Window]: row-major windows covering the raster.
+    """
+    b = region.block_size
+    outside = region.blocks == OUTSIDE
+    n_rows, n_cols = outside.shape
+    max_blocks = max(1, max_width // b)
+
+    windows = []
+    for block_row in range(n_rows):
+        row, start = block_row * b, 0
+        for block_col in range(1, n_cols + 1):
+            if (
+                block_col == n_cols or block_col - start == max_blocks
+                or outside[block_row, block_col] != outside[block_row, start]
+            ):
+                windows.append(Window(start * b, row, min(block_col * b, width) - start * b, min(b, height - row)))
+                start = block_col
+    return windows
+
+
+def _exg_range_task(workspace, window):
+    """Min/max of the ExG index over one window."""
+    exg = calculate_exg_int(read_rgb(workspace.src, window))
+    return int(exg.min()), int(exg.max())
+
+
+def _bilateral_task(workspace, window, exg_min, exg_max, clahe, filter_backend, params):
+    """Haloed ExG + bilateral filter for one window; returns its CLAHE region histograms."""
+    src = workspace.src
+    halo_window, core = pad_window(window, filter_halos(params)[0], src.width, src.height)
+    exg = calculate_exg_int(read_rgb(src, halo_window))
+    exg_uint8 = normalize_exg(exg, exg_min, exg_max)
+    del exg
+
+    smoothed = get_filter_backend(filter_backend).bilateral(
+        exg_uint8, params["bilateral_d"], BILATERAL_SIGMA_COLOR, params["bilateral_sigma_spatial"]
+    )[core]
+    workspace["out"][window.toslices()] = smoothed
+    return clahe.region_histograms(smoothed, window)
+
+
+def _clahe_task(workspace, window, clahe):
+    """Equalize one window of the smoothed raster; returns its min/max CLAHE level."""
+    levels = clahe.apply(workspace["out"][window.toslices()], window)
+    workspace["levels"][window.toslices()] = levels
+    return int(levels.min()), int(levels.max())
+
+
+def _level_range_task(workspace, window, clahe):
+    """Min/max CLAHE level of one window of the smoothed raster, without storing the levels."""
+    levels = clahe.apply(workspace["out"][window.toslices()], window)
+    return int(levels.min()), int(levels.max())
+
+
+def _morphology_task(workspace, window, level_min, level_max, filter_backend, params, region=None):
+    """Haloed opening/closing of one window of CLAHE levels, written to the output raster (0 outside the region)."""
+    if outside_region(region, window):
+        workspace["out"][window.toslices()] = 0
+        return
+
+    src = workspace.src
+    halo_window, core = pad_window(window, filter_halos(params)[1], src.width, src.height)
+    clahe_exg = StreamingCLAHE.uint8_lut(level_min, level_max)[workspace["levels"][halo_window.toslices()]]
+    processed = get_filter_backend(filter_backend).open_close(clahe_exg, params["morph_radius"])[core]
+
+    mask = region_mask(region, window)
+    if mask is not None:
+        processed[~mask] = 0
+    workspace["out"][window.toslices()] = processed
+
+
+def _complete_level_range(workspace, windows, clahe, level_min, level_max, tile_map, memory, workers):
+    """
+    Extend a level range to the whole raster, given the windows whose levels weren't computed.
+
+    Only windows whose `StreamingCLAHE.level_bounds` reach past the current
+    range can hold a new extreme; they are equalized most promising first,
+    `workers` at a time, until no window can. Typically a handful remain.
+
+    Returns:
+    - (level_min, level_max) of every level of the raster.
+    """
+    smoothed = workspace["out"]
+    pending = []
+    for window in windows:
+        values = smoothed[window.toslices()]
+        pending.append((window, clahe.level_bounds(int(values.min()), int(values.max()), window)))
+
+    while True:
+        pending = [(window, (lower, upper)) for window, (lower, upper) in pending
+                   if lower < level_min or upper > level_max]
+        if not pending:
+            return level_min, level_max
+        pending.sort(key=lambda item: min(item[1][0] - level_min, level_max - item[1][1]))
+        batch, pending = [window for window, _ in pending[:workers]], pending[workers:]
+        for low, high in memory.map(
+            "level_range", tile_map, _level_range_task, [workspace] * len(batch), batch, [clahe] * len(batch)
+        ):
+            level_min, level_max = min(level_min, low), max(level_max, high)
+
+
+def preprocess_raster(src_path, dst_path, max_memory_bytes=CV_MAX_MEMORY_BYTES, workers=CV_WORKERS,
+                      filter_backend=CV_FILTER_BACKEND, region=None, scale=1.0, memory=None):
+    """
+    Windowed equivalent of `preprocess_image` for rasters too large to hold in memory.
+
+    The raster is walked in block-aligned tiles by `workers` processes, in
+    four streaming passes over memory-mapped scratch rasters:
+
+    1. Global ExG range, so every tile shares one normalization.
+    2. ExG + bilateral filter, each tile read with a halo of its radius, while
+       accumulating the histograms of the whole-image CLAHE contextual regions.
+    3. CLAHE, each tile interpolated from the shared region lookup tables.
+    4. Opening/closing, each tile read with a halo of the morphology reach,
+       after the global CLAHE intensity stretch.
+
+    With an exact filter backend the result is identical to `preprocess_image`
+    on the whole raster. It is written to a tiled GeoTIFF with the source
+    georeferencing.
+
+    With a `region`, the output is that same result inside the region and 0
+    outside it. The ExG range and CLAHE tables still come from the whole
+    raster (passes 1 and 2 cover it all), but passes 3 and 4 walk the
+    region's blocks and skip those away from it. The
+    intensity stretch needs the global level range; of the skipped windows,
+    only those that can hold a new extreme are equalized (see
+    `_complete_level_range`). Morphology runs on `region_windows`.
+
+    Parameters:
+    - src_path: RGB(A) orthophoto, as a path or RasterSource.
+    - dst_path: path of the processed GeoTIFF to write.
+    - max_memory_bytes: budget for the working set of all workers together.
+    - workers: number of worker processes.
+    - filter_backend: implementation of the filter chain (see `filter_backends`).
+    - region: optional RegionCoverage of the raster.
+    - scale: resolution of the raster relative to the full orthophoto, scaling
+      the filter kernels (see `filter_params`).
+    - memory: optional StageMemory recording each pass's high-water mark per tile.
+
+    Returns:
+    - str: `dst_path`
+    """
+    get_filter_backend(filter_backend) # Fail before starting any work
+    memory = memory or StageMemory(enabled=False)
+    params = filter_params(scale)
+    workers = max(1, workers)
+    tile_size = tile_size_for_budget(max_memory_bytes // workers, halo=sum(filter_halos(params)))
+
+    source = RasterSource.of(src_path)
+    shape = source.shape
+    windows = plan_windows(source.width, source.height, tile_size, source.block_shape)
+    profile = output_profile(source)
+    workers = min(workers, len(windows))
+
+    # With a region, CLAHE levels are only needed for the blocks within the
+    # morphology halo of it, and morphology only for runs of blocks in it
+    level_windows = output_windows = windows
+    if region is not None:
+        blocks = plan_windows(source.width, source.height, region.block_size, (region.block_size,) * 2)
+        morph_halo = filter_halos(params)[1]
+        level_windows = [
+            block for block in blocks
+            if not outside_region(region, pad_window(block, morph_halo, source.width, source.height)[0])
+        ]
+        output_windows = region_windows(region, source.width, source.height, tile_size)
+    active = [window for window in output_windows if not outside_region(region, window)]
+    logger.info(
+        f"Processing {shape[1]}x{shape[0]} raster in {len(windows)} tiles of <= {tile_size}px "
+        f"with {workers} worker(s), morphology on {sum(w.width * w.height for w in active) / source.width / source.height:.0%} of it"
+    )
+
+    clahe = StreamingCLAHE(shape, clip_limit=CLAHE_CLIP_LIMIT)
+    scratch_dir = os.path.dirname(os.path.abspath(dst_path))
+    scratch = {}
+    workspace = None
+    try:
+        for name, dtype in (("out", np.uint8), ("levels", np.uint16)):
+            scratch_fd, scratch_path = tempfile.mkstemp(suffix=f".{name}", dir=scratch_dir)
+            os.close(scratch_fd)
+            scratch[name] = (scratch_path, dtype)
+            np.memmap(scratch_path, dtype=dtype, mode="w+", shape=shape).flush()
+
+        workspace = TileWorkspace(source, scratch, shape)
+        if not active:
+            logger.warning("The region covers no pixels of the raster, output is empty")
+        else:
+            with tile_executor(workers) as tile_map:
+                n = len(windows)
+                tiles = [workspace] * n
+
+                # Pass 1: global ExG range
+                ranges = list(memory.map("exg_range", tile_map, _exg_range_task, tiles, windows))
+                exg_min = min(r[0] for r in ranges)
+                exg_max = max(r[1] for r in ranges)
+
+                # Pass 2: bilateral filter, accumulating CLAHE region histograms
+                for counts in memory.map(
+                    "bilateral", tile_map, _bilateral_task, tiles, windows, [exg_min] * n, [exg_max] * n,
+                    [clahe] * n, [filter_backend] * n, [params] * n
+                ):
+                    clahe.counts += counts
+                clahe.finalize()
+
+                # Pass 3: CLAHE levels from the shared lookup tables, and their global range
+                n = len(level_windows)
+                ranges = list(memory.map(
+                    "clahe", tile_map, _clahe_task, [workspace] * n, level_windows, [clahe] * n
+                ))
+                level_min = min(r[0] for r in ranges)
+                level_max = max(r[1] for r in ranges)
+                if region is not None and len(level_windows) < len(blocks):
+                    equalized = {(w.row_off, w.col_off) for w in level_windows}
+                    level_min, level_max = _complete_level_range(
+                        workspace, [w for w in blocks if (w.row_off, w.col_off) not in equalized],
+                        clahe, level_min, level_max, tile_map, memory, workers
+                    )
+
+                # Pass 4: morphology, cores written over the smoothed raster
+                n = len(output_windows)
+                list(memory.map(
+                    "morphology", tile_map, _morphology_task, [workspace] * n, output_windows,
+                    [level_min] * n, [level_max] * n, [filter_backend] * n, [params] * n, [region] * n
+                ))
+
+        # Copy into the tiled GeoTIFF, one strip of blocks at a time
+        with memory.stage("write"):
+            output = np.memmap(scratch["out"][0], dtype=np.uint8, mode="r", shape=shape)
+            with rasterio.open(dst_path, "w", **profile) as dst:
+                for row in range(0, shape[0], OUTPUT_BLOCK_SIZE):
+                    strip = Window(0, row, shape[1], min(OUTPUT_BLOCK_SIZE, shape[0] - row))
+                    dst.write(output[strip.toslices()], 1, window=strip)
+            del output
+    finally:
+        if workspace is not None:
+            workspace.close()
+        for scratch_path, _ in scratch.values():
+            os.remove(scratch_path)
+
+    return dst_path
+
+
+def write_png_preview(tif_path, png_path, max_size=CV_PNG_MAX_SIZE):
+    """
+    Write a PNG copy of a single band raster, decimated so its longest side is at most `max_size`.
+
+    Parameters:
+    - tif_path: single band GeoTIFF to read.
+    - png_path: PNG to write.
+    - max_size: longest side of the PNG, in pixels.
+
+    Returns:
+    - str: `png_path`
+    """
+    with RasterSource(tif_path) as src:
+        scale = min(1.0, max_size / max(src.width, src.height))
+        out_shape = (max(1, round(src.height * scale)), max(1, round(src.width * scale)))
+        image = src.read(bands=1, out_shape=out_shape, resampling=Resampling.nearest)
+
+    cv2.imwrite(str(png_path), image)
+    return png_path
@@ -1,5 +1,9 @@
 import numpy as np
 
+# Rows processed at once by `calculate_exg_int`
+CHUNK_ROWS = 512
+
+
 def calculate_all_rgb_indices(image):
     """
     Calculate all vegetation indices for the given 3 band RGB image.
@@ -23,6 +27,36 @@ def calculate_all_rgb_indices(image):
     return indices
 
 
+def calculate_exg_int(image, out=None, chunk_rows=CHUNK_ROWS):
+    """
+    Excess Green of an 8-bit RGB image, exactly, in integers.
+
+    For 8-bit input 255 * ExG = 2g - r - b lies in [-510, 510], so it fits
+    int16 with no rounding; `calculate_exg` on normalized bands equals this
+    divided by 255.
+
+    Parameters:
+    - image: RGB(A) uint8 image (H, W, >=3).
+    - out: optional preallocated (H, W) int16 array.
+    - chunk_rows: rows per chunk.
+
+    Returns:
+    - int16 array of 2g - r - b.
+    """
+    height, width = image.shape[:2]
+    if out is None:
+        out = np.empty((height, width), dtype=np.int16)
+
+    for row in range(0, height, chunk_rows):
+        rows = slice(row, min(row + chunk_rows, height))
+        chunk = out[rows]
+        np.multiply(image[rows, :, 1], 2, out=chunk, dtype=np.int16)
+        np.subtract(chunk, image[rows, :, 0], out=chunk, dtype=np.int16)
+        np.subtract(chunk, image[rows, :, 2], out=chunk, dtype=np.int16)
+
+    return out
+
+
 # Helper to ensure values are in the correct range [-1,1]
 def normalize_rgb(image):
     """
@@ -0,0 +1,158 @@
+import os
+import time
+import threading
+import rasterio
+from collections import OrderedDict
+from contextlib import contextmanager
+from rio_tiler.io import Reader
+
+from backend.config import logger, READER_POOL_MAX_OPEN, READER_POOL_IDLE_SECONDS
+
+
+def file_signature(path):
+    """(inode, mtime, size) of a file; changes when the file is rewritten or replaced."""
+    stat = os.stat(path)
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def open_reader(path):
+    """
+    Open a rio_tiler Reader that any thread can close.
+
+    Opened outside a GDAL environment, rasterio binds one to the dataset in the
+    opening thread, and closing it from another thread fails with EnvError
+    (leaving the file open); an explicit environment avoids that.
+    """
+    with rasterio.Env():
+        return Reader(path)
+
+
+class ReaderPool:
+    """
+    Per-process pool of open rio_tiler Readers, keyed by COG path.
+
+    Opening a Reader parses the TIFF header and walks its IFDs, which costs
+    more than serving a cached tile; pooled Readers skip that on every
+    request after the first.
+
+    A GDAL dataset must not be read from two threads at once, so each Reader
+    is checked out by one thread at a time; concurrent requests for the same
+    COG open more Readers, up to `max_open` across all paths. Idle Readers
+    are evicted least recently used first, or after `idle_seconds`, and
+    Readers of a file whose inode, mtime or size changed are never reused.
+    """
+
+    def __init__(self, max_open=READER_POOL_MAX_OPEN, idle_seconds=READER_POOL_IDLE_SECONDS,
+                 opener=open_reader):
+        """
+        Parameters:
+        - max_open: budget of open Readers (file handles) across all paths.
+        - idle_seconds: Readers unused for longer are closed.
+        - opener: callable opening a Reader from a path.
+        """
+        self.max_open = max_open
+        self.idle_seconds = idle_seconds
+        self.opener = opener
+        self._lock = threading.Lock()
+        self._idle = OrderedDict() # token -> (path, signature, reader, last used); oldest first
+        self._open = 0 # Idle and checked out
+        self._tokens = 0
+        self.hits = self.misses = self.evictions = 0
+
+    @contextmanager
+    def reader(self, path):
+        """
+        Check out an open Reader of `path` for the duration of the block.
+
+        Raises:
+        - FileNotFoundError if `path` does not exist.
+        """
+        path = os.fspath(path)
+        signature = file_signature(path)
+        reader = self._checkout(path, signature)
+        try:
+            yield reader
+        finally:
+            self._checkin(path, signature, reader)
+
+    def _checkout(self, path, signature):
+        stale = []
+        with self._lock:
+            now = time.monotonic()
+            found = None
+            for token, (idle_path, idle_signature, _, _) in reversed(self._idle.items()):
+                if idle_path == path and idle_signature == signature:
+                    found = token
+                    break
+            # Drop readers idle for too long, and readers of an older version of this file
+            for token, (idle_path, idle_signature, _, last_used) in list(self._idle.items()):
+                expired = now - last_used > self.idle_seconds
+                if token != found and (expired or (idle_path == path and idle_signature != signature)):
+                    stale.append(self._idle.pop(token)[2])
+
+            if found is not None:
+                self.hits += 1
+                reader = self._idle.pop(found)[2]
+            else:
+                self.misses += 1
+                # Make room in the budget by closing least recently used idle readers
+                while self._idle and self._open - len(stale) >= self.max_open:
+                    stale.append(self._idle.popitem(last=False)[1][2])
+                    self.evictions += 1
+                reader = None
+            self._open -= len(stale)
+            if reader is None:
+                self._open += 1 # Reserved before opening, outside the lock
+
+        for idle_reader in stale:
+            idle_reader.close()
+        if reader is not None:
+            return reader
+
+        try:
+            return self.opener(path)
+        except BaseException:
+            with self._lock:
+                self._open -= 1
+            raise
+
+    def _checkin(self, path, signature, reader):
+        with self._lock:
+            if self._open <= self.max_open:
+                self._tokens += 1
+                self._idle[self._tokens] = (path, signature, reader, time.monotonic())
+                return
+            self._open -= 1
+        reader.close() # Opened past the budget while every pooled reader was checked out
+
+    def invalidate(self, path):
+        """Close the idle Readers of `path`, e.g. after the COG was regenerated."""
+        path = os.fspath(path)
+        with self._lock:
+            tokens = [token for token, entry in self._idle.items() if entry[0] == path]
+            readers = [self._idle.pop(token)[2] for token in tokens]
+            self._open -= len(readers)
+        for reader in readers:
+            reader.close()
+
+    def close(self):
+        """Close every idle Reader, e.g. at shutdown."""
+        with self._lock:
+            readers = [entry[2] for entry in self._idle.values()]
+            self._idle.clear()
+            self._open -= len(readers)
+        for reader in readers:
+            reader.close()
+        logger.info(f"Closed {len(readers)} pooled COG readers")
+
+    def stats(self):
+        """Pool counters: open and idle Readers, hits, misses and evictions."""
+        with self._lock:
+            return {
+                "open": self._open, "idle": len(self._idle),
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            }
+
+
+# Shared by the tile endpoints of this process
+reader_pool = ReaderPool()
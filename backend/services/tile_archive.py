@@ -0,0 +1,245 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from rio_tiler.io import Reader
+from rio_tiler.errors import TileOutsideBounds
+
+from backend.config import logger, TILE_SEED_WORKERS, TILE_SEED_CHUNK
+from backend.services.reader_pool import file_signature, open_reader
+from backend.services.tile_cache import cog_fingerprint
+from backend.services.tile_coverage import CoverageIndex
+
+SCHEMA = """
+CREATE TABLE metadata (name TEXT, value TEXT);
+CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB);
+CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row);
+"""
+
+
+def seed_plan(cog_path, min_zoom, max_zoom):
+    """
+    Web-mercator tiles of `cog_path` holding data, from `min_zoom` to `max_zoom`.
+
+    Returns:
+    - list of (z, x, y), tiles outside the COG's coverage index left out.
+    - (west, south, east, north) geographic bounds of the COG.
+    """
+    index = CoverageIndex(cog_path)
+    with Reader(cog_path) as cog:
+        bounds = cog.get_geographic_bounds(cog.tms.rasterio_geographic_crs)
+        tiles = [
+            (tile.z, tile.x, tile.y)
+            for tile in cog.tms.tiles(*bounds, zooms=list(range(min_zoom, max_zoom + 1)))
+            if not index.is_empty(tile.x, tile.y, tile.z)
+        ]
+    return tiles, bounds
+
+
+class TileRenderer:
+    """Renders chunks of tiles of one COG, with its own open Reader."""
+
+    def __init__(self, cog_path, tile_size):
+        self.cog = open_reader(cog_path)
+        self.tile_size = tile_size
+
+    def __call__(self, tiles):
+        """PNG bytes of a chunk of tiles, as (z, x, y, bytes); tiles without data are left out."""
+        rendered = []
+        for z, x, y in tiles:
+            try:
+                image = self.cog.tile(x, y, z, tilesize=self.tile_size)
+            except TileOutsideBounds:
+                continue
+            if image.mask.any():
+                rendered.append((z, x, y, image.render(img_format="PNG")))
+        return rendered
+
+    def close(self):
+        self.cog.close()
+
+
+# Renderer of a seeding worker process, which serves a single seed_archive call
+_worker_renderer = None
+
+
+def _init_worker(cog_path, tile_size):
+    global _worker_renderer
+    _worker_renderer = TileRenderer(cog_path, tile_size)
+
+
+def _render_task(tiles):
+    return _worker_renderer(tiles)
+
+
+def seed_archive(cog_path, archive_path, min_zoom, max_zoom, tile_size=256, workers=TILE_SEED_WORKERS,
+                 chunk_size=TILE_SEED_CHUNK):
+    """
+    Render the tile pyramid of a COG into an MBTiles archive.
+
+    Tiles with data are rendered in chunks by worker processes and written by
+    this one into a temporary SQLite file, which replaces `archive_path` once
+    complete, so a partial archive is never served. Empty tiles are not
+    stored; readers treat missing tiles as transparent.
+
+    Parameters:
+    - cog_path: RGB(A) COG of the job.
+    - archive_path: MBTiles file to write.
+    - min_zoom, max_zoom: zoom levels to render, inclusive.
+    - tile_size: edge length of the tiles in pixels.
+    - workers: number of processes; 1 renders in this process.
+    - chunk_size: tiles per worker task (and per progress update).
+
+    Yields:
+    - dict progress updates: "done" and "total" tiles rendered, then a last one
+      with "archive_path" and "stored" tiles once the archive is in place.
+    """
+    tiles, bounds = seed_plan(cog_path, min_zoom, max_zoom)
+    chunks = [tiles[start:start + chunk_size] for start in range(0, len(tiles), chunk_size)]
+    # Tied to the COG rendered, so tiles of an older COG are never served
+    metadata = {
+        "name": os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(cog_path)))),
+        "format": "png",
+        "type": "overlay",
+        "bounds": ",".join(str(value) for value in bounds),
+        "minzoom": str(min_zoom),
+        "maxzoom": str(max_zoom),
+        "tile_size": str(tile_size),
+        "source_fingerprint": cog_fingerprint(cog_path),
+    }
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(archive_path)), suffix=".mbtiles.tmp")
+    os.close(fd)
+    db = sqlite3.connect(tmp_path)
+    pool = renderer = None
+    try:
+        db.executescript(SCHEMA)
+        db.executemany("INSERT INTO metadata VALUES (?, ?)", metadata.items())
+
+        if workers <= 1:
+            # Its own Reader, so concurrent seeds in this process never share one
+            renderer = TileRenderer(cog_path, tile_size)
+            results = map(renderer, chunks)
+        else:
+            # Spawn, not fork: forking a process with live GDAL threads is unsafe
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(cog_path, tile_size),
+            )
+            results = pool.map(_render_task, chunks)
+
+        done = stored = 0
+        yield {"done": 0, "total": len(tiles)}
+        for chunk, rendered in zip(chunks, results):
+            # MBTiles rows count from the south (TMS), web-mercator ones from the north
+            db.executemany(
+                "INSERT INTO tiles VALUES (?, ?, ?, ?)",
+                [(z, x, (1 << z) - 1 - y, sqlite3.Binary(content)) for z, x, y, content in rendered],
+            )
+            done += len(chunk)
+            stored += len(rendered)
+            yield {"done": done, "total": len(tiles)}
+
+        db.commit()
+        db.close()
+        os.replace(tmp_path, archive_path)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if renderer is not None:
+            renderer.close()
+        db.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    logger.info(f"Seeded {stored} of {len(tiles)} tiles (z{min_zoom}-{max_zoom}) into {archive_path}")
+    yield {"done": done, "total": len(tiles), "stored": stored, "archive_path": str(archive_path)}
+
+
+class TileArchive:
+    """Read-only MBTiles archive written by `seed_archive`."""
+
+    def __init__(self, archive_path):
+        """
+        Parameters:
+        - archive_path: MBTiles file.
+        """
+        # Serialized SQLite connection, shared by the tile executor threads
+        self.db = sqlite3.connect(f"file:{archive_path}?mode=ro", uri=True, check_same_thread=False)
+        metadata = dict(self.db.execute("SELECT name, value FROM metadata"))
+        self.source_fingerprint = metadata.get("source_fingerprint")
+        self.min_zoom, self.max_zoom = int(metadata["minzoom"]), int(metadata["maxzoom"])
+        self.tile_size = int(metadata.get("tile_size", 256))
+
+    def covers(self, fingerprint, z, tile_size) -> bool:
+        """Whether the archive was seeded from the COG version `fingerprint` and holds zoom `z` at `tile_size`."""
+        return (
+            fingerprint == self.source_fingerprint and tile_size == self.tile_size
+            and self.min_zoom <= z <= self.max_zoom
+        )
+
+    def tile(self, z, x, y):
+        """PNG bytes of web-mercator tile z/x/y, None for an empty tile."""
+        row = self.db.execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (z, x, (1 << z) - 1 - y),
+        ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def close(self):
+        self.db.close()
+
+
+class TileArchives:
+    """
+    Per-process open MBTiles archives keyed by path, reopened when the file
+    is replaced, e.g. after seeding again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._archives = {} # path -> (signature, TileArchive)
+
+    def get(self, archive_path):
+        """Open archive at `archive_path`, None if there is none."""
+        try:
+            signature = file_signature(archive_path)
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            entry = self._archives.get(archive_path)
+            if entry is not None and entry[0] == signature:
+                return entry[1]
+            # A replaced archive is left to be closed once no request uses it
+            archive = TileArchive(archive_path)
+            self._archives[archive_path] = (signature, archive)
+        return archive
+
+    def invalidate(self, archive_path):
+        """
+        Drop the archive at `archive_path` and delete the file, e.g. once its COG was regenerated.
+
+        Like a replaced archive in `get`, its connection is left to be closed
+        once no request uses it; tiles being read from it meanwhile still are.
+        """
+        with self._lock:
+            self._archives.pop(archive_path, None)
+        if os.path.exists(archive_path):
+            os.remove(archive_path)
+
+    def close(self):
+        """Close every open archive, e.g. at shutdown."""
+        with self._lock:
+            archives = [archive for _, archive in self._archives.values()]
+            self._archives.clear()
+        for archive in archives:
+            archive.close()
+
+
+# Shared by the tile endpoints of this process
+tile_archives = TileArchives()
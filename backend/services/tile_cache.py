@@ -0,0 +1,141 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from backend.config import TILE_CACHE_MEMORY_BYTES, TILE_CACHE_DIR
+from backend.services.reader_pool import file_signature
+
+
+class TileKey(NamedTuple):
+    """Identity of a rendered tile; `fingerprint` changes whenever the COG does."""
+    fingerprint: str
+    z: int
+    x: int
+    y: int
+    tile_size: int
+    format: str
+
+    @property
+    def etag(self):
+        """Strong ETag: a key always renders to the same bytes."""
+        return f'"{self.fingerprint}-{self.z}-{self.x}-{self.y}-{self.tile_size}-{self.format}"'
+
+
+def cog_fingerprint(cog_path):
+    """Short hash of the COG's inode, mtime and size."""
+    return hashlib.sha1(repr(file_signature(cog_path)).encode()).hexdigest()[:16]
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value lists `etag` (or is "*")."""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    return "*" in candidates or etag in [candidate.removeprefix("W/") for candidate in candidates]
+
+
+class TileCache:
+    """
+    Two-level cache of rendered tiles: an in-process LRU bounded by bytes,
+    backed by files under each job's tiles/ directory.
+
+    Disk entries survive restarts and are shared between worker processes;
+    hot tiles are served from memory without touching the disk.
+    """
+
+    def __init__(self, memory_bytes=TILE_CACHE_MEMORY_BYTES):
+        """
+        Parameters:
+        - memory_bytes: budget of the in-process LRU.
+        """
+        self.memory_bytes = memory_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict() # (cache_dir, key) -> bytes; least recently used first
+        self._size = 0
+        self.memory_hits = self.disk_hits = self.misses = 0
+
+    @staticmethod
+    def cache_dir(tiles_dir):
+        """Disk cache directory of a job, inside its tiles/ directory."""
+        return os.path.join(tiles_dir, TILE_CACHE_DIR)
+
+    @staticmethod
+    def _path(cache_dir, key):
+        return os.path.join(
+            cache_dir, key.fingerprint, str(key.z), str(key.x), f"{key.y}@{key.tile_size}.{key.format}"
+        )
+
+    def get(self, cache_dir, key) -> Optional[bytes]:
+        """Cached tile bytes, from memory or else disk (then kept in memory), None on a miss."""
+        with self._lock:
+            content = self._memory.get((cache_dir, key))
+            if content is not None:
+                self._memory.move_to_end((cache_dir, key))
+                self.memory_hits += 1
+                return content
+
+        try:
+            with open(self._path(cache_dir, key), "rb") as f:
+                content = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+        self._remember(cache_dir, key, content)
+        return content
+
+    def put(self, cache_dir, key, content: bytes):
+        """Store a rendered tile in memory and on disk."""
+        self._remember(cache_dir, key, content)
+
+        path = self._path(cache_dir, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so concurrent readers never see a partial tile
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _remember(self, cache_dir, key, content):
+        if len(content) > self.memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop((cache_dir, key), None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._memory[(cache_dir, key)] = content
+            self._size += len(content)
+            while self._size > self.memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._size -= len(evicted)
+
+    def invalidate(self, cache_dir):
+        """Drop every cached tile of a job, e.g. after its COG was regenerated."""
+        with self._lock:
+            for entry in [entry for entry in self._memory if entry[0] == cache_dir]:
+                self._size -= len(self._memory.pop(entry))
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    def stats(self):
+        """Hit/miss counters and memory use."""
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                "memory_tiles": len(self._memory), "memory_bytes": self._size,
+            }
+
+
+# Shared by the tile endpoints of this process
+tile_cache = TileCache()
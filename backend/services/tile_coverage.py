@@ -0,0 +1,128 @@
+import math
+import threading
+from io import BytesIO
+from collections import OrderedDict
+from functools import lru_cache
+import rasterio
+from affine import Affine
+from PIL import Image
+from rasterio.enums import ColorInterp, Resampling
+from rasterio.vrt import WarpedVRT
+from rio_tiler.constants import WEB_MERCATOR_TMS
+from scipy.ndimage import binary_dilation
+
+from backend.config import TILE_COVERAGE_SIZE, READER_POOL_MAX_OPEN
+from backend.services.tile_cache import cog_fingerprint
+
+WEB_MERCATOR_CRS = "EPSG:3857"
+
+
+@lru_cache(maxsize=8)
+def transparent_tile(tile_size=256) -> bytes:
+    """PNG of a fully transparent tile, encoded once per size and shared by every empty tile."""
+    buffer = BytesIO()
+    Image.new("RGBA", (tile_size, tile_size), (0, 0, 0, 0)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class CoverageIndex:
+    """
+    Coarse web-mercator mask of where a COG has data.
+
+    Built once per COG from its footprint and internal mask (or alpha band),
+    averaged onto coarse cells from the coarsest overview still finer than
+    them, so building it reads a fraction of the COG. A tile is empty when it
+    misses the COG's bounds or every index cell under it is nodata; such
+    tiles need no GDAL reads at all.
+
+    The mask is dilated by one cell, so tiles at the edge of the footprint
+    are never wrongly reported empty.
+    """
+
+    def __init__(self, cog_path, size=TILE_COVERAGE_SIZE):
+        """
+        Parameters:
+        - cog_path: RGB(A) COG.
+        - size: cells along the longer side of the index.
+        """
+        with rasterio.open(cog_path) as src:
+            add_alpha = src.nodata is None and ColorInterp.alpha not in src.colorinterp
+            with WarpedVRT(src, crs=WEB_MERCATOR_CRS, add_alpha=add_alpha) as vrt:
+                left, bottom, right, top = vrt.bounds
+                # No finer than the COG itself
+                res = max(max(right - left, top - bottom) / size, vrt.res[0])
+                decimation = res / vrt.res[0]
+            factors = [factor for factor in src.overviews(1) if factor <= decimation]
+        # Index into the COG's overviews (0 = largest), None for the full resolution
+        self.overview_level = len(factors) - 1 if factors else None
+
+        cols, rows = max(1, math.ceil((right - left) / res)), max(1, math.ceil((top - bottom) / res))
+        transform = Affine(res, 0, left, 0, -res, top)
+        overview = {} if self.overview_level is None else {"overview_level": self.overview_level}
+        with rasterio.open(cog_path, **overview) as src:
+            with WarpedVRT(src, crs=WEB_MERCATOR_CRS, transform=transform, width=cols, height=rows,
+                           resampling=Resampling.average, add_alpha=add_alpha) as vrt:
+                valid = vrt.dataset_mask() > 0
+
+        self.bounds = (left, bottom, right, top)
+        self.res = res
+        self.valid = binary_dilation(valid, iterations=1)
+
+    def is_empty(self, x, y, z) -> bool:
+        """Whether web-mercator tile z/x/y has no data in the COG."""
+        tile_left, tile_bottom, tile_right, tile_top = WEB_MERCATOR_TMS.xy_bounds(x, y, z)
+        left, bottom, right, top = self.bounds
+        if tile_left >= right or tile_right <= left or tile_bottom >= top or tile_top <= bottom:
+            return True
+
+        rows, cols = self.valid.shape
+        col_start = max(0, math.floor((tile_left - left) / self.res))
+        col_stop = min(cols, math.ceil((tile_right - left) / self.res))
+        row_start = max(0, math.floor((top - tile_top) / self.res))
+        row_stop = min(rows, math.ceil((top - tile_bottom) / self.res))
+        return not self.valid[row_start:row_stop, col_start:col_stop].any()
+
+
+class CoverageIndexes:
+    """
+    Per-process coverage indexes keyed by COG path, rebuilt when the COG's
+    inode, mtime or size changes. Least recently used indexes are dropped
+    past `max_entries`.
+    """
+
+    def __init__(self, max_entries=READER_POOL_MAX_OPEN):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict() # path -> (fingerprint, CoverageIndex)
+
+    def get(self, cog_path, fingerprint=None) -> CoverageIndex:
+        """
+        Coverage index of `cog_path`, built on first use.
+
+        Parameters:
+        - fingerprint: `cog_fingerprint` of the COG, when the caller already has it.
+        """
+        fingerprint = fingerprint or cog_fingerprint(cog_path)
+        with self._lock:
+            entry = self._indexes.get(cog_path)
+            if entry is not None and entry[0] == fingerprint:
+                self._indexes.move_to_end(cog_path)
+                return entry[1]
+
+        # Built outside the lock; a concurrent build of the same COG is harmless
+        index = CoverageIndex(cog_path)
+        with self._lock:
+            self._indexes[cog_path] = (fingerprint, index)
+            self._indexes.move_to_end(cog_path)
+            while len(self._indexes) > self.max_entries:
+                self._indexes.popitem(last=False)
+        return index
+
+    def invalidate(self, cog_path):
+        """Drop the index of `cog_path`, e.g. after the COG was regenerated."""
+        with self._lock:
+            self._indexes.pop(cog_path, None)
+
+
+# Shared by the tile endpoints of this process
+coverage_indexes = CoverageIndexes()
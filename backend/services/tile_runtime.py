@@ -0,0 +1,85 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import rasterio
+from rasterio.env import set_gdal_config
+
+from backend.config import (
+    logger, TILE_RENDER_WORKERS, GDAL_CACHEMAX_MB, GDAL_NUM_THREADS, GDAL_VSI_CACHE_BYTES
+)
+
+
+def gdal_options():
+    """
+    Per-thread GDAL configuration of tile renders.
+
+    - GDAL_NUM_THREADS: blocks of a single read are decompressed in parallel.
+    - VSI_CACHE: reads of each file go through a read-ahead cache, so headers
+      and neighbouring blocks come from memory.
+    - GDAL_DISABLE_READDIR_ON_OPEN: COGs carry their overviews and masks, so
+      there are no sidecar files to look for; listing the tiles/ directory,
+      which holds the tile cache, would be the slowest part of an open.
+
+    The block cache size is process-wide instead, see `set_gdal_cache`.
+    """
+    options = dict(
+        GDAL_NUM_THREADS=GDAL_NUM_THREADS,
+        GDAL_DISABLE_READDIR_ON_OPEN="EMPTY_DIR",
+    )
+    if GDAL_VSI_CACHE_BYTES > 0:
+        options.update(VSI_CACHE=True, VSI_CACHE_SIZE=GDAL_VSI_CACHE_BYTES)
+    return options
+
+
+def gdal_env():
+    """rasterio Env applying `gdal_options` to the calling thread, entered around each tile render."""
+    return rasterio.Env(**gdal_options())
+
+
+def set_gdal_cache():
+    """
+    Size GDAL's block cache to GDAL_CACHEMAX_MB, once at startup.
+
+    The cache is shared by every dataset and thread of the process, so
+    decoded blocks of hot COGs outlive the reads that decoded them. It is
+    set outside any Env: each Env restores the size on exit, and
+    overlapping ones restore it out of order.
+    """
+    set_gdal_config("GDAL_CACHEMAX", GDAL_CACHEMAX_MB * 1024**2) # rasterio takes the size in bytes
+
+
+# Tile renders run here rather than in the threadpool serving the other API handlers,
+# so a burst of slow tiles queues behind TILE_RENDER_WORKERS threads and CRUD calls keep theirs.
+# Started by the app lifespan, or by the first tile render
+_tile_executor = None
+
+
+def start_tile_executor():
+    """Start the tile executor, e.g. at startup, unless it is running. Returns it."""
+    global _tile_executor
+    if _tile_executor is None:
+        _tile_executor = ThreadPoolExecutor(max_workers=TILE_RENDER_WORKERS, thread_name_prefix="tile-render")
+    return _tile_executor
+
+
+def _run_in_gdal_env(func, *args):
+    with gdal_env():
+        return func(*args)
+
+
+async def run_in_tile_executor(func, *args):
+    """
+    Run a blocking tile function on the tile executor without blocking the
+    event loop. The tile serving GDAL configuration applies to that call
+    only, not to other work of the process such as CV processing.
+    """
+    executor = start_tile_executor()
+    return await asyncio.get_running_loop().run_in_executor(executor, _run_in_gdal_env, func, *args)
+
+
+def shutdown_tile_executor():
+    """Stop the tile executor, dropping queued renders, e.g. at shutdown. A later render starts a new one."""
+    global _tile_executor
+    executor, _tile_executor = _tile_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+        logger.info("Tile render executor stopped")
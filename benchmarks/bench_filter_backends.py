@@ -0,0 +1,73 @@
+"""
+Accuracy and speed of each filter backend against the reference chain.
+
+    python -m benchmarks.bench_filter_backends --size 3000
+    python -m benchmarks.bench_filter_backends --image path/to/region_orthophoto.tif
+
+For each backend prints the wall time of `filter_exg`, the fraction of
+pixels identical to the reference output, the mean absolute difference,
+and agreement of the binary masks at a 0.5 threshold.
+"""
+import argparse
+import time
+import numpy as np
+import cv2
+import rasterio
+
+from backend.services.plant_search.vegetation_indices import calculate_exg_int
+from backend.services.plant_search.image_preprocess import normalize_exg, filter_exg, threshold_image
+from backend.services.plant_search.filter_backends import FILTER_BACKENDS
+
+
+def synthetic_rgb(size, n_plants, seed=0):
+    """Soil-coloured noisy image with `n_plants` green discs."""
+    rng = np.random.default_rng(seed)
+    image = np.empty((size, size, 3), dtype=np.uint8)
+    image[:] = (140, 120, 95)
+    for row, col, radius in zip(
+        rng.integers(0, size, n_plants), rng.integers(0, size, n_plants), rng.integers(3, 25, n_plants)
+    ):
+        cv2.circle(image, (int(col), int(row)), int(radius), (70, 150, 60), -1)
+    noise = rng.normal(0, 12, image.shape)
+    return np.clip(image + noise, 0, 255).astype(np.uint8)
+
+
+def read_rgb(path):
+    with rasterio.open(path) as src:
+        return np.moveaxis(src.read([1, 2, 3]), 0, -1)
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=2000)
+    parser.add_argument("--plants", type=int, default=2000)
+    parser.add_argument("--image", help="RGB raster to use instead of a synthetic image")
+    args = parser.parse_args()
+
+    image = read_rgb(args.image) if args.image else synthetic_rgb(args.size, args.plants)
+    exg = calculate_exg_int(image)
+    exg_uint8 = normalize_exg(exg, exg.min(), exg.max())
+    print(f"image: {image.shape[1]}x{image.shape[0]}")
+
+    reference, t_reference = timed(filter_exg, exg_uint8, backend="reference")
+    reference_mask = threshold_image(reference, 0.5)
+
+    print(f"{'backend':<16}{'time':>9}{'speedup':>9}{'identical':>11}{'mean |diff|':>13}{'mask agree':>12}")
+    for name in FILTER_BACKENDS:
+        if name == "reference":
+            output, elapsed = reference, t_reference
+        else:
+            output, elapsed = timed(filter_exg, exg_uint8, backend=name)
+        identical = np.mean(output == reference)
+        mean_diff = np.mean(np.abs(output.astype(np.int16) - reference))
+        mask_agree = np.mean(threshold_image(output, 0.5) == reference_mask)
+        print(
+            f"{name:<16}{elapsed:>8.2f}s{t_reference / elapsed:>8.1f}x"
+            f"{identical:>10.2%}{mean_diff:>13.3f}{mask_agree:>11.2%}"
+        )
@@ -0,0 +1,103 @@
+"""
+Tile latency of the COG tile endpoint under a map-pan load, opening a
+Reader per tile (as before) versus checking one out of the `ReaderPool`.
+
+A synthetic orthophoto is written as a COG, then a sequence of map pans
+(rows of neighbouring tiles at a few zoom levels) is requested from a
+thread pool, like the one FastAPI runs sync endpoints on.
+
+    python -m benchmarks.bench_tile_readers --size 8192 --threads 8
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import rasterio
+from affine import Affine
+from rio_cogeo.cogeo import cog_translate
+from rio_cogeo.profiles import cog_profiles
+from rio_tiler.io import Reader
+
+from backend.services.reader_pool import ReaderPool
+
+
+def synthetic_cog(directory, size):
+    """A `size` x `size` RGB COG at 2 cm in UTM, with overviews."""
+    src_path = os.path.join(directory, "ortho.tif")
+    rng = np.random.default_rng(0)
+    with rasterio.open(src_path, "w", driver="GTiff", width=size, height=size, count=3, dtype="uint8",
+                       crs="EPSG:32613", transform=Affine(0.02, 0, 500000, 0, -0.02, 4000000),
+                       tiled=True, blockxsize=512, blockysize=512) as dst:
+        for row in range(0, size, 512):
+            rows = min(512, size - row)
+            dst.write(rng.integers(0, 256, (3, rows, size), dtype=np.uint8),
+                      window=rasterio.windows.Window(0, row, size, rows))
+    cog_path = os.path.join(directory, "region_cog.tif")
+    cog_translate(src_path, cog_path, cog_profiles.get("deflate"), quiet=True)
+    return cog_path
+
+
+def pan_requests(cog_path, zooms, pans, pan_length):
+    """(x, y, z) of the tiles a map pan loads: rows of neighbouring tiles across the COG."""
+    rng = np.random.default_rng(1)
+    with Reader(cog_path) as cog:
+        bounds = cog.get_geographic_bounds(cog.tms.rasterio_geographic_crs)
+        requests = []
+        for z in zooms:
+            tiles = list(cog.tms.tiles(*bounds, zooms=[z]))
+            for _ in range(pans):
+                start = tiles[rng.integers(len(tiles))]
+                requests += [(start.x + i, start.y, z) for i in range(-(pan_length // 2), pan_length // 2)]
+    return requests
+
+
+def render(reader, x, y, z):
+    try:
+        return reader.tile(x, y, z, tilesize=256).render(img_format="PNG")
+    except Exception: # Out of bounds tiles are served blank by the endpoint
+        return None
+
+
+def run(requests, threads, serve):
+    latencies = []
+
+    def timed(request):
+        start = time.perf_counter()
+        serve(*request)
+        latencies.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(timed, requests))
+    return np.array(latencies) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=4096)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--pans", type=int, default=40)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cog_path = synthetic_cog(directory, args.size)
+        requests = pan_requests(cog_path, zooms=[18, 19, 20, 21], pans=args.pans, pan_length=8)
+
+        def reopen(x, y, z):
+            with Reader(cog_path) as cog:
+                return render(cog, x, y, z)
+
+        pool = ReaderPool(max_open=args.threads)
+
+        def pooled(x, y, z):
+            with pool.reader(cog_path) as cog:
+                return render(cog, x, y, z)
+
+        print(f"{len(requests)} tile requests on {args.threads} threads")
+        for name, serve in (("reader per tile", reopen), ("pooled readers", pooled)):
+            run(requests[:20], args.threads, serve) # Warm the OS page cache
+            latencies = run(requests, args.threads, serve)
+            p50, p99 = np.percentile(latencies, [50, 99])
+            print(f"{name:16s} p50 {p50:7.2f} ms   p99 {p99:7.2f} ms   mean {latencies.mean():7.2f} ms")
+        print(f"pool: {pool.stats()}")
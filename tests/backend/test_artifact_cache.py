@@ -0,0 +1,31 @@
+from backend.services.artifact_cache import ArtifactCache
+
+
+def write(path, content):
+    path.write_bytes(content)
+    return str(path)
+
+
+# ✅ Hits restore outputs, least recently used entries are evicted past the quota
+def test_hit_miss_and_lru_eviction(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"), quota_bytes=250)
+    source = write(tmp_path / "input.tif", b"pixels")
+    output = tmp_path / "output.bin"
+
+    keys = [cache.key("stage", [source], {"param": i}) for i in range(3)]
+    assert len(set(keys)) == 3
+    assert not cache.fetch(keys[0], "stage", {"out": str(output)})
+
+    for i, key in enumerate(keys[:2]):
+        cache.store(key, "stage", {"out": write(output, bytes([i]) * 100)})
+
+    output.unlink()
+    assert cache.fetch(keys[0], "stage", {"out": str(output)}) # keys[0] is now most recent
+    assert output.read_bytes() == bytes([0]) * 100
+
+    cache.store(keys[2], "stage", {"out": write(output, bytes([2]) * 100)})
+    assert set(cache.entries()) == {keys[0], keys[2]}
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert stats["bytes"] <= 250
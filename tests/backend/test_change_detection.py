@@ -0,0 +1,81 @@
+import pytest
+import numpy as np
+import cv2
+import shapely
+import geopandas as gpd
+import rasterio
+from affine import Affine
+
+from backend.services.plant_search.change_detection import changed_cells, carry_over_targets
+
+TRANSFORM = Affine(0.02, 0, 500000, 0, -0.02, 4000000)
+
+
+def write_rgb(path, rgb, transform=TRANSFORM):
+    with rasterio.open(path, "w", driver="GTiff", width=rgb.shape[2], height=rgb.shape[1], count=3,
+                       dtype="uint8", crs="EPSG:32613", transform=transform) as dst:
+        dst.write(rgb)
+    return path
+
+
+@pytest.fixture
+def flight(tmp_path):
+    """A 12 m x 8 m field of textured vegetation, a multiple of the 2 m test cells."""
+    rng = np.random.default_rng(0)
+    rgb = np.stack([cv2.GaussianBlur(rng.integers(0, 256, (400, 600)).astype(np.uint8), (0, 0), 8) for _ in range(3)])
+    return rgb, write_rgb(tmp_path / "previous.tif", rgb)
+
+
+# ✅ Only cells whose content changed are flagged, whatever the exposure or pixel grid
+def test_changed_cells(tmp_path, flight):
+    rgb, previous = flight
+
+    brighter = write_rgb(tmp_path / "brighter.tif", np.clip(rgb.astype(int) + 20, 0, 255).astype(np.uint8))
+    _, counts = changed_cells(brighter, previous, cell_size=2.0)
+    assert counts == {"cells": 24, "changed": 0}
+
+    # Same content on a pixel grid offset by a few pixels, cropped to 10 m across
+    shifted = write_rgb(tmp_path / "shifted.tif", rgb[:, 3:, 5:-100], TRANSFORM * Affine.translation(5, 3))
+    _, counts = changed_cells(shifted, previous, cell_size=2.0)
+    assert counts == {"cells": 20, "changed": 0}
+
+    grown = rgb.copy()
+    grown[1, 100:200, 300:400] = 255 # New growth in one 2 m cell
+    changed, counts = changed_cells(write_rgb(tmp_path / "grown.tif", grown), previous, cell_size=2.0)
+    assert counts["changed"] == 1
+    assert changed.geometry[0].equals(shapely.box(500006, 3999996, 500008, 3999998))
+
+
+# ✅ Previous targets are kept outside the changed cells and the region only, without duplicating new ones
+def test_carry_over_targets(tmp_path):
+    previous = gpd.GeoDataFrame(
+        {"target_id": ["a", "b", "c", "d"]},
+        geometry=shapely.points([(500001, 3999999), (500007, 3999997), (500030, 3999999), (500005.8, 3999997)]),
+        crs="EPSG:32613",
+    ).to_crs("EPSG:4326")
+    previous.to_file(tmp_path / "targets.geojson", driver="GeoJSON")
+    gpd.GeoDataFrame(geometry=[shapely.box(500006, 3999996, 500008, 3999998)], crs="EPSG:32613").to_file(
+        tmp_path / "changed.geojson", driver="GeoJSON"
+    )
+    gpd.GeoDataFrame(geometry=[shapely.box(500000, 3999990, 500020, 4000000)], crs="EPSG:32613").to_file(
+        tmp_path / "region.geojson", driver="GeoJSON"
+    )
+    # The second is bush "d" again, across the edge of the changed cell
+    detected = gpd.GeoDataFrame(
+        geometry=shapely.points([(500007.5, 3999996.5), (500006.2, 3999997.1)]), crs="EPSG:32613"
+    )
+
+    targets = carry_over_targets(
+        detected, tmp_path / "targets.geojson", tmp_path / "changed.geojson", [tmp_path / "region.geojson"]
+    )
+
+    assert targets["carried_over"].tolist() == [False, False, True]
+    assert "target_id" not in targets.columns
+    assert np.allclose([targets.geometry[2].x, targets.geometry[2].y], [500001, 3999999])
+
+    # Without the spacing, "d" is counted twice
+    targets = carry_over_targets(
+        detected, tmp_path / "targets.geojson", tmp_path / "changed.geojson", [tmp_path / "region.geojson"],
+        min_spacing=0
+    )
+    assert targets["carried_over"].tolist() == [False, False, True, True]
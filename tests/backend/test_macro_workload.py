@@ -0,0 +1,29 @@
+import pytest
+import numpy as np
+
+from backend.config import CANOPY_WORKLOAD_PER_M2
+from backend.macro_planning.macro_utils import calculate_intra_cell_workload
+from backend.services.plant_search import macro_planning
+
+# Cell A: four small bushes spread along 30 m. Cell B: four large bushes 2 m apart.
+SPREAD = np.array([[0, 0], [10, 0], [20, 0], [30, 0]], dtype=float)
+SPREAD_AREAS = np.full(4, 0.5)
+CLUSTERED = np.array([[0, 0], [2, 0], [0, 2], [2, 2]], dtype=float)
+CLUSTERED_AREAS = np.full(4, 6.0)
+
+
+# ✅ Canopy area reorders cells as configured, and both planning modules agree
+@pytest.mark.parametrize("workload", [calculate_intra_cell_workload, macro_planning.calculate_intra_cell_workload])
+def test_canopy_weight_changes_cell_ranking(workload):
+    # Walking distance alone: the spread cell is more work
+    assert workload(SPREAD) == 30 and workload(CLUSTERED) == 6
+    assert workload(SPREAD, SPREAD_AREAS, canopy_weight=0) == 30
+
+    # Each m² of canopy counts as `canopy_weight` metres of walking
+    assert workload(SPREAD, SPREAD_AREAS, canopy_weight=1) == 32
+    assert workload(CLUSTERED, CLUSTERED_AREAS, canopy_weight=1) == 30
+    assert workload(CLUSTERED, CLUSTERED_AREAS, canopy_weight=2) > workload(SPREAD, SPREAD_AREAS, canopy_weight=2)
+
+    # The configured weight is the default; a lone target is just its canopy
+    assert workload(CLUSTERED, CLUSTERED_AREAS) == 6 + 24 * CANOPY_WORKLOAD_PER_M2
+    assert workload(SPREAD[:1], SPREAD_AREAS[:1], canopy_weight=3) == 1.5
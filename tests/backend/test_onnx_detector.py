@@ -0,0 +1,48 @@
+import math
+import pytest
+import numpy as np
+import rasterio
+from affine import Affine
+from scipy.ndimage import uniform_filter
+
+from backend.services.plant_search.onnx_detector import detect_raster
+
+TRANSFORM = Affine(0.02, 0, 500000, 0, -0.02, 4000000)
+
+
+class GreenBlurModel:
+    """Stands in for a segmentation model: 3x3 mean of the green band, zero outside the tile."""
+
+    def __init__(self, batch_size, tile_size, overlap):
+        self.batch_size, self.tile_size, self.overlap = batch_size, tile_size, overlap
+        self.batches = 0
+
+    def predict(self, batch):
+        assert batch.shape == (self.batch_size, 3, self.tile_size, self.tile_size)
+        self.batches += 1
+        return uniform_filter(batch[:, 1], size=(1, 3, 3), mode="constant")
+
+
+# ✅ Batched, overlapping tiles reproduce the model applied to the whole image
+@pytest.mark.parametrize("batch_size, tile_size, overlap", [(4, 64, 8), (3, 40, 1)])
+@pytest.mark.parametrize("tiled", [False, True])
+def test_detector_tiles_match_whole_image(tmp_path, batch_size, tile_size, overlap, tiled):
+    rgb = np.random.default_rng(0).integers(0, 256, (3, 230, 170), dtype=np.uint8)
+    src_path = tmp_path / "ortho.tif"
+    blocks = dict(tiled=True, blockxsize=16, blockysize=16) if tiled else {}
+    with rasterio.open(src_path, "w", driver="GTiff", width=170, height=230, count=3,
+                       dtype="uint8", crs="EPSG:32613", transform=TRANSFORM, **blocks) as dst:
+        dst.write(rgb)
+
+    model = GreenBlurModel(batch_size, tile_size, overlap)
+    detect_raster(src_path, tmp_path / "scores.tif", model)
+
+    expected = np.rint(uniform_filter(rgb[1] / np.float32(255), size=3, mode="constant") * 255)
+    with rasterio.open(tmp_path / "scores.tif") as src:
+        scores = src.read(1)
+        assert src.transform == TRANSFORM
+    assert np.abs(scores.astype(int) - expected).max() <= 1 # float32 rounding
+    # Windows are whole tile cores, whatever the source's block layout
+    step = tile_size - 2 * overlap
+    windows = math.ceil(230 / step) * math.ceil(170 / step)
+    assert model.batches == math.ceil(windows / batch_size) > 1
@@ -0,0 +1,35 @@
+import pytest
+import numpy as np
+import rasterio
+from affine import Affine
+from rasterio.windows import Window
+
+from backend.services.plant_search.raster_source import RasterSource
+
+
+def write_raster(path, data, **options):
+    with rasterio.open(path, "w", driver="GTiff", width=data.shape[2], height=data.shape[1], count=data.shape[0],
+                       dtype=data.dtype, crs="EPSG:32613", transform=Affine(0.02, 0, 500000, 0, -0.02, 4000000),
+                       **options) as dst:
+        dst.write(data)
+    return path
+
+
+# ✅ Memory-mapped and rasterio reads give the same pixels for every layout
+@pytest.mark.parametrize("options, mapped", [
+    (dict(interleave="pixel"), True),
+    (dict(interleave="band"), True),
+    (dict(tiled=True, blockxsize=64, blockysize=64, compress="deflate"), False),
+])
+def test_read_matches_rasterio(tmp_path, options, mapped):
+    data = np.random.default_rng(0).integers(0, 255, (4, 150, 130), dtype=np.uint8)
+    source = RasterSource(write_raster(tmp_path / "image.tif", data, **options))
+    assert source.memory_mapped == mapped
+    assert source.shape == (150, 130)
+
+    window = Window(7, 11, 60, 90)
+    expected = np.moveaxis(data[:, 11:101, 7:67], 0, -1)
+    assert np.array_equal(source.read(window, [1, 2, 3]), expected[..., :3])
+    assert np.array_equal(source.read(window, [3, 1]), expected[..., [2, 0]])
+    assert np.array_equal(source.read(window, 2), expected[..., 1])
+    assert source.read(bands=1, out_shape=(75, 65)).shape == (75, 65)
@@ -0,0 +1,88 @@
+import os
+import threading
+import numpy as np
+import rasterio
+import pytest
+from affine import Affine
+
+from backend.services.reader_pool import ReaderPool
+
+
+@pytest.fixture
+def cog_path(tmp_path):
+    path = tmp_path / "region_cog.tif"
+    write_raster(path, value=0)
+    return str(path)
+
+
+def write_raster(path, value):
+    with rasterio.open(path, "w", driver="GTiff", width=512, height=512, count=3, dtype="uint8",
+                       crs="EPSG:32613", transform=Affine(0.02, 0, 500000, 0, -0.02, 4000000),
+                       tiled=True, blockxsize=256, blockysize=256) as dst:
+        dst.write(np.full((3, 512, 512), value, dtype=np.uint8))
+
+
+# ✅ Readers are reused, and reopened once the file is replaced
+def test_pool_reuses_and_invalidates(cog_path):
+    pool = ReaderPool(max_open=4)
+    with pool.reader(cog_path) as first:
+        pass
+    with pool.reader(cog_path) as second:
+        assert second is first
+        assert second.read().data.max() == 0
+
+    replacement = cog_path + ".new"
+    write_raster(replacement, value=200)
+    os.replace(replacement, cog_path)
+    with pool.reader(cog_path) as third:
+        assert third is not first
+        assert third.read().data.max() == 200
+    assert pool.stats() == {"open": 1, "idle": 1, "hits": 1, "misses": 2, "evictions": 0}
+
+
+# ✅ Concurrent checkouts get their own reader, within the open file budget
+def test_pool_concurrent_checkouts(tmp_path, cog_path):
+    pool = ReaderPool(max_open=3)
+    others = [str(tmp_path / f"other_{i}.tif") for i in range(3)]
+    for path in others:
+        write_raster(path, value=1)
+
+    held, release = [], threading.Event()
+
+    def hold(path):
+        with pool.reader(path) as reader:
+            held.append(reader)
+            release.wait()
+
+    threads = [threading.Thread(target=hold, args=(cog_path,)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    while len(held) < 3:
+        release.wait(0.01)
+    assert len({id(reader) for reader in held}) == 3
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    # Other files evict the least recently used idle readers to stay within budget
+    for path in others:
+        with pool.reader(path):
+            pass
+    stats = pool.stats()
+    assert stats["open"] == 3 and stats["evictions"] == 3
+
+
+# ✅ A Reader opened on one thread can be closed from another
+def test_pool_closes_readers_across_threads(cog_path):
+    pool = ReaderPool(max_open=4)
+    opened = []
+
+    def use():
+        with pool.reader(cog_path) as reader:
+            opened.append(reader)
+
+    thread = threading.Thread(target=use)
+    thread.start()
+    thread.join()
+    pool.close()
+    assert opened[0].dataset.closed
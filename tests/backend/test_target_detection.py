@@ -0,0 +1,107 @@
+import pytest
+import numpy as np
+import cv2
+import rasterio
+from affine import Affine
+from skimage.measure import label, regionprops
+from skimage.morphology import closing, disk
+
+import json
+import geopandas as gpd
+
+from backend.services.plant_search.image_preprocess import (
+    identify_targets, assign_target_metadata, write_targets_geojson
+)
+from backend.services.plant_search.component_stitching import identify_targets_tiled
+from backend.services.plant_search.vegetation_indices import calculate_exg_int
+
+TRANSFORM = Affine(0.02, 0, 500000, 0, -0.02, 4000000)
+
+
+@pytest.fixture
+def mask_path(tmp_path):
+    """Random blobs plus shapes that straddle tile seams."""
+    rng = np.random.default_rng(0)
+    mask = np.zeros((700, 900), dtype=np.uint8)
+    for row, col, radius in zip(rng.integers(0, 700, 800), rng.integers(0, 900, 800), rng.integers(1, 8, 800)):
+        cv2.circle(mask, (int(col), int(row)), int(radius), 255, -1)
+    mask[127, 127] = mask[128, 128] = 255 # Diagonal-only contact across a seam corner
+    mask[400, :] = 255 # Spans every tile in a row
+
+    path = tmp_path / "binary_mask.tif"
+    with rasterio.open(path, "w", driver="GTiff", width=900, height=700, count=1,
+                       dtype="uint8", crs="EPSG:32613", transform=TRANSFORM) as dst:
+        dst.write(mask, 1)
+    return path, mask
+
+
+# ✅ Tiled labeling gives exactly the in-memory targets
+@pytest.mark.parametrize("tile_size", [64, 128, 300])
+def test_tiled_targets_match_in_memory(mask_path, tile_size):
+    path, mask = mask_path
+    expected = identify_targets(mask, TRANSFORM)
+    targets = identify_targets_tiled(path, tile_size=tile_size)
+
+    assert list(targets.columns) == list(expected.columns)
+    assert len(targets) == len(expected)
+    assert np.array_equal(targets.geometry.x.values, expected.geometry.x.values)
+    assert np.array_equal(targets.geometry.y.values, expected.geometry.y.values)
+
+
+# ✅ Canopy attributes merged across tiles equal the in-memory reductions
+def test_tiled_attributes_match_in_memory(mask_path, tmp_path):
+    path, mask = mask_path
+    rgb = np.random.default_rng(1).integers(0, 256, (700, 900, 3), dtype=np.uint8)
+    rgb_path = tmp_path / "ortho.tif"
+    with rasterio.open(rgb_path, "w", driver="GTiff", width=900, height=700, count=3,
+                       dtype="uint8", crs="EPSG:32613", transform=TRANSFORM) as dst:
+        dst.write(np.moveaxis(rgb, -1, 0))
+
+    expected = identify_targets(mask, TRANSFORM, exg=calculate_exg_int(rgb))
+    targets = identify_targets_tiled(path, tile_size=128, exg_source=rgb_path)
+
+    attributes = ["pixel_count", "area_m2", "equivalent_diameter_m", "bbox_width_m", "bbox_height_m", "mean_exg"]
+    assert list(targets.columns) == list(expected.columns)
+    for name in attributes:
+        assert np.allclose(targets[name].values, expected[name].values, rtol=1e-12), name
+
+    # The seam-spanning row is one target as wide as the mask
+    assert np.isclose(targets["bbox_width_m"].max(), 900 * 0.02)
+    assert np.isclose(targets["area_m2"].sum(), (targets["pixel_count"] * 0.02 ** 2).sum())
+
+
+# ✅ Targets get compact integer IDs, with job metadata stored once per collection
+def test_targets_geojson_metadata(mask_path, tmp_path):
+    _, mask = mask_path
+    targets = assign_target_metadata(identify_targets(mask, TRANSFORM), "North field", "job-1")
+    path = write_targets_geojson(targets.to_crs("EPSG:4326"), tmp_path / "targets.geojson")
+
+    with open(path, encoding="utf-8") as f:
+        collection = json.load(f)
+    assert collection["metadata"] == {
+        "region_name": "North field", "region_outline_version": "job-1", "target_id_scheme": "job_index"
+    }
+    assert "region_name" not in collection["features"][0]["properties"]
+
+    written = gpd.read_file(path)
+    assert written["target_id"].tolist() == list(range(len(targets)))
+
+
+# ✅ Vectorized labeling gives the targets of the skimage closing/label/regionprops chain
+def test_targets_match_regionprops(mask_path):
+    _, mask = mask_path
+    exg = np.random.default_rng(2).integers(-255, 256, mask.shape)
+    targets = identify_targets(mask, TRANSFORM, exg=exg)
+
+    labels = label(closing(mask, disk(3)))
+    regions = sorted(regionprops(labels, intensity_image=exg), key=lambda region: region.centroid)
+    assert len(targets) == len(regions)
+
+    rows, cols = np.array([region.centroid for region in regions]).T
+    xs, ys = TRANSFORM * (cols, rows)
+    assert np.allclose(targets.geometry.x.values, xs, rtol=0, atol=1e-9)
+    assert np.allclose(targets.geometry.y.values, ys, rtol=0, atol=1e-9)
+    assert np.array_equal(targets["pixel_count"].values, [region.area for region in regions])
+    widths = [(region.bbox[3] - region.bbox[1]) * 0.02 for region in regions]
+    assert np.allclose(targets["bbox_width_m"].values, widths)
+    assert np.allclose(targets["mean_exg"].values, [region.intensity_mean / 255 for region in regions])
@@ -0,0 +1,78 @@
+import os
+import pytest
+import numpy as np
+import cv2
+import rasterio
+from affine import Affine
+from rasterio.windows import Window
+from skimage.filters import threshold_otsu, threshold_multiotsu
+from skimage.measure import euler_number
+
+from backend.services.plant_search.image_preprocess import threshold_image
+from backend.services.plant_search.raster_cache import TiledRasterCache
+from backend.services.plant_search.threshold_index import ThresholdIndex
+
+TRANSFORM = Affine(0.02, 0, 500000, 0, -0.02, 4000000)
+
+
+@pytest.fixture
+def processed_path(tmp_path):
+    """Smooth uint8 raster with bright blobs, like a processed ExG image."""
+    rng = np.random.default_rng(0)
+    image = cv2.GaussianBlur(rng.integers(0, 256, (530, 610)).astype(np.uint8), (0, 0), 4)
+    for row, col, radius in zip(rng.integers(0, 530, 60), rng.integers(0, 610, 60), rng.integers(2, 15, 60)):
+        cv2.circle(image, (int(col), int(row)), int(radius), int(rng.integers(150, 256)), -1)
+
+    path = tmp_path / "processed.tif"
+    with rasterio.open(path, "w", driver="GTiff", width=610, height=530, count=1,
+                       dtype="uint8", crs="EPSG:32613", transform=TRANSFORM) as dst:
+        dst.write(image, 1)
+    return path, image
+
+
+# ✅ Cached windows and thresholds equal direct reads of the raster
+def test_raster_cache_reads_match_raster(processed_path, tmp_path):
+    path, image = processed_path
+    cache_path = str(tmp_path / "processed.npy")
+    cache = TiledRasterCache.build(path, cache_path, tile_size=128)
+
+    assert np.array_equal(cache.read(), image)
+    for window in (Window(100, 50, 300, 200), Window(500, 400, 200, 200), Window(127, 127, 2, 2)):
+        with rasterio.open(path) as src:
+            expected = src.read(1, window=window.intersection(Window(0, 0, 610, 530)))
+        assert np.array_equal(cache.read(window), expected)
+        assert np.array_equal(cache.threshold(0.6, window), threshold_image(expected, 0.6))
+
+    strips = cache.windows()
+    assert np.array_equal(np.concatenate([cache.read(window) for window in strips]), image)
+
+    # Reopened while the source is unchanged, rebuilt once it is rewritten
+    assert TiledRasterCache.open(path, cache_path).meta == cache.meta
+    with rasterio.open(path, "r+") as dst:
+        dst.write(255 - image, 1)
+    os.utime(path, (cache.meta["source_mtime"] + 1,) * 2)
+    assert np.array_equal(TiledRasterCache.open(path, cache_path).read(), 255 - image)
+
+
+# ✅ Index statistics equal direct counts, Euler numbers and Otsu thresholds of the raster
+def test_threshold_index_matches_direct_statistics(processed_path, tmp_path):
+    path, image = processed_path
+    cache = TiledRasterCache.build(path, str(tmp_path / "processed.npy"), tile_size=64)
+    index = ThresholdIndex.build(cache)
+    index.save(tmp_path / "index.npz")
+    loaded = ThresholdIndex.load(tmp_path / "index.npz")
+
+    for threshold in (0.0, 0.3, 0.5, 0.62, 0.9, 1.0):
+        mask = threshold_image(image, threshold) > 0
+        stats = loaded.stats(threshold)
+        assert stats["foreground_pixels"] == mask.sum()
+        assert stats["foreground_fraction"] == mask.mean()
+        assert stats["estimated_targets"] == max(0, euler_number(mask, connectivity=2))
+        assert loaded.foreground(threshold, (2, 3)) == mask[128:192, 192:256].sum()
+
+    curve = loaded.curve()
+    assert curve["foreground_fraction"][100] == (image > 100).mean()
+    assert index.suggest_thresholds()["otsu"] == threshold_otsu(image) / 255.0
+    # Multi-Otsu on every uint8 level; skimage bins images over their own value range instead
+    hist = (np.bincount(image.ravel(), minlength=256), np.arange(256))
+    assert index.suggest_thresholds()["multi_otsu"] == [v / 255.0 for v in threshold_multiotsu(hist=hist)]
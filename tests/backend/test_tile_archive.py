@@ -0,0 +1,76 @@
+import numpy as np
+import rasterio
+from affine import Affine
+from rio_tiler.io import Reader
+
+from backend.services.tile_archive import seed_archive, TileArchive, TileArchives
+from backend.services.tile_cache import cog_fingerprint
+
+
+def write_cog(path, value):
+    with rasterio.open(path, "w", driver="GTiff", width=512, height=512, count=3, dtype="uint8",
+                       crs="EPSG:32613", transform=Affine(0.02, 0, 500000, 0, -0.02, 4000000),
+                       tiled=True, blockxsize=256, blockysize=256) as dst:
+        dst.write(np.full((3, 512, 512), value, dtype=np.uint8))
+    return path
+
+
+# ✅ Seeding stores every tile with data, reports progress, and the archive serves the rendered bytes
+def test_seed_archive_serves_rendered_tiles(tmp_path):
+    cog_path = write_cog(str(tmp_path / "region_cog.tif"), 120)
+    archive_path = str(tmp_path / "region_tiles.mbtiles")
+
+    progress = list(seed_archive(cog_path, archive_path, 20, 22, workers=1, chunk_size=4))
+    assert progress[0]["done"] == 0
+    assert progress[-1]["done"] == progress[-1]["total"] == progress[-1]["stored"] > 0
+
+    archive = TileArchive(archive_path)
+    assert archive.covers(cog_fingerprint(cog_path), 22, 256)
+    assert not archive.covers(cog_fingerprint(cog_path), 23, 256)
+    assert not archive.covers("other", 22, 256)
+    with Reader(cog_path) as cog:
+        bounds = cog.get_geographic_bounds(cog.tms.rasterio_geographic_crs)
+        tile = next(iter(cog.tms.tiles(*bounds, zooms=[22])))
+        assert archive.tile(tile.z, tile.x, tile.y) == cog.tile(tile.x, tile.y, tile.z).render(img_format="PNG")
+    assert archive.tile(22, 0, 0) is None
+    archive.close()
+
+
+# ✅ Interleaved in-process seeds of two COGs each render their own COG
+def test_concurrent_serial_seeds(tmp_path):
+    cog_paths = [write_cog(str(tmp_path / f"cog_{value}.tif"), value) for value in (60, 180)]
+    archive_paths = [str(tmp_path / f"tiles_{i}.mbtiles") for i in range(2)]
+    seeds = [
+        seed_archive(cog_path, archive_path, 21, 21, workers=1, chunk_size=1)
+        for cog_path, archive_path in zip(cog_paths, archive_paths)
+    ]
+    active = list(seeds)
+    while active:
+        for seed in list(active):
+            if "archive_path" in next(seed):
+                active.remove(seed)
+
+    for cog_path, archive_path in zip(cog_paths, archive_paths):
+        archive = TileArchive(archive_path)
+        with Reader(cog_path) as cog:
+            bounds = cog.get_geographic_bounds(cog.tms.rasterio_geographic_crs)
+            for tile in cog.tms.tiles(*bounds, zooms=[21]):
+                assert archive.tile(tile.z, tile.x, tile.y) == cog.tile(tile.x, tile.y, tile.z).render(img_format="PNG")
+        archive.close()
+
+
+# ✅ An archive in use keeps serving its tiles after the COG is regenerated and the archive invalidated
+def test_invalidate_keeps_archive_in_use(tmp_path):
+    cog_path = write_cog(str(tmp_path / "region_cog.tif"), 120)
+    archive_path = str(tmp_path / "region_tiles.mbtiles")
+    list(seed_archive(cog_path, archive_path, 20, 20, workers=1))
+
+    archives = TileArchives()
+    archive = archives.get(archive_path)
+    z, x, y = archive.db.execute("SELECT zoom_level, tile_column, tile_row FROM tiles").fetchone()
+    y = (1 << z) - 1 - y
+    content = archive.tile(z, x, y)
+
+    archives.invalidate(archive_path)
+    assert archives.get(archive_path) is None
+    assert archive.tile(z, x, y) == content
@@ -0,0 +1,40 @@
+import os
+
+from backend.services.tile_cache import TileCache, TileKey, cog_fingerprint, etag_matches
+
+
+def key(fingerprint="abc", x=0):
+    return TileKey(fingerprint, 20, x, 0, 256, "png")
+
+
+# ✅ Tiles are served from memory, then from disk once evicted, within the memory budget
+def test_tile_cache_memory_and_disk(tmp_path):
+    cache = TileCache(memory_bytes=10)
+    cache_dir = TileCache.cache_dir(str(tmp_path))
+    cache.put(cache_dir, key(x=0), b"123456")
+    cache.put(cache_dir, key(x=1), b"abcdef") # Evicts x=0 from memory
+
+    assert cache.stats()["memory_tiles"] == 1 and cache.stats()["memory_bytes"] == 6
+    assert cache.get(cache_dir, key(x=1)) == b"abcdef"
+    assert cache.get(cache_dir, key(x=0)) == b"123456"
+    assert cache.get(cache_dir, key(x=2)) is None
+    assert cache.stats()["memory_hits"] == 1 and cache.stats()["disk_hits"] == 1 and cache.stats()["misses"] == 1
+
+    cache.invalidate(cache_dir)
+    assert cache.get(cache_dir, key(x=1)) is None
+    assert not os.path.exists(cache_dir)
+
+
+# ✅ ETags change with the COG and match If-None-Match lists, weak or strong
+def test_tile_etags(tmp_path):
+    cog_path = tmp_path / "region_cog.tif"
+    cog_path.write_bytes(b"a")
+    before = cog_fingerprint(cog_path)
+    cog_path.write_bytes(b"bb")
+    assert cog_fingerprint(cog_path) != before
+
+    etag = key().etag
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
@@ -0,0 +1,35 @@
+import pytest
+import numpy as np
+import rasterio
+from affine import Affine
+from rasterio.enums import Resampling
+from rio_tiler.io import Reader
+
+from backend.services.tile_coverage import CoverageIndex, transparent_tile
+
+
+# ✅ Tiles reported empty are outside the raster or its alpha footprint, and never hold data
+@pytest.mark.parametrize("overviews", [False, True])
+def test_coverage_index_matches_rendered_tiles(tmp_path, overviews):
+    path = str(tmp_path / "region_cog.tif")
+    rgba = np.full((4, 1024, 1024), 200, dtype=np.uint8)
+    rgba[3, :, 512:] = 0 # Eastern half outside the flight
+    with rasterio.open(path, "w", driver="GTiff", width=1024, height=1024, count=4, dtype="uint8",
+                       crs="EPSG:32613", transform=Affine(0.02, 0, 500000, 0, -0.02, 4000000),
+                       photometric="RGB", alpha="YES", tiled=True, blockxsize=256, blockysize=256) as dst:
+        dst.write(rgba)
+        if overviews:
+            dst.build_overviews([2, 4, 8, 16], Resampling.nearest)
+
+    index = CoverageIndex(path, size=128)
+    # 1024 px onto 128 cells: read from the 8x overview, not the full resolution or the 16x one
+    assert index.overview_level == (2 if overviews else None)
+    with Reader(path) as cog:
+        bounds = cog.get_geographic_bounds(cog.tms.rasterio_geographic_crs)
+        tiles = list(cog.tms.tiles(*bounds, zooms=[23]))
+        empty = [tile for tile in tiles if index.is_empty(tile.x, tile.y, tile.z)]
+        assert 0 < len(empty) < len(tiles)
+        assert not any(cog.tile(tile.x, tile.y, tile.z).mask.any() for tile in empty)
+
+    assert index.is_empty(0, 0, 10)
+    assert transparent_tile(256) is transparent_tile(256)
@@ -0,0 +1,54 @@
+import asyncio
+import threading
+from rasterio._env import get_gdal_config
+
+from backend.config import GDAL_CACHEMAX_MB
+from backend.services.tile_runtime import (
+    gdal_env, set_gdal_cache, run_in_tile_executor, start_tile_executor, shutdown_tile_executor
+)
+
+
+# ✅ Tile renders run on the tile executor under the tile serving GDAL configuration, which stays out of other threads
+def test_tile_renders_use_executor_and_gdal_env():
+    def render():
+        return threading.current_thread().name, get_gdal_config("GDAL_DISABLE_READDIR_ON_OPEN")
+
+    thread_name, readdir = asyncio.run(run_in_tile_executor(render))
+    assert thread_name.startswith("tile-render")
+    assert readdir == "EMPTY_DIR"
+    assert get_gdal_config("GDAL_DISABLE_READDIR_ON_OPEN") is None
+
+
+# ✅ The executor restarts after a shutdown, as with repeated app lifespans
+def test_tile_executor_restarts():
+    for _ in range(2):
+        start_tile_executor()
+        assert asyncio.run(run_in_tile_executor(sum, [1, 2])) == 3
+        shutdown_tile_executor()
+
+
+# ✅ The block cache keeps its startup size through overlapping renders
+def test_gdal_cache_survives_overlapping_renders():
+    set_gdal_cache()
+    first_in, second_in, first_out = threading.Event(), threading.Event(), threading.Event()
+
+    # The first render in is the first out, so a saved cache size would be restored out of order
+    def first():
+        with gdal_env():
+            first_in.set()
+            second_in.wait()
+        first_out.set()
+
+    def second():
+        first_in.wait()
+        with gdal_env():
+            second_in.set()
+            first_out.wait()
+
+    threads = [threading.Thread(target=first), threading.Thread(target=second)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # rasterio reads GDAL_CACHEMAX through GDALGetCacheMax64
+    assert get_gdal_config("GDAL_CACHEMAX") == GDAL_CACHEMAX_MB * 1024**2
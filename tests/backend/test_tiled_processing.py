@@ -0,0 +1,251 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import cv2
+import rasterio
+from affine import Affine
+from shapely.geometry import Point
+from rasterio.enums import Resampling
+from rasterio.windows import Window
+from skimage.exposure import equalize_adapthist
+
+from backend.services.plant_search.clahe import StreamingCLAHE
+from backend.services.plant_search.image_preprocess import (
+    preprocess_image, filter_exg, normalize_exg, CLAHE_CLIP_LIMIT
+)
+from backend.services.plant_search.vegetation_indices import calculate_exg, calculate_exg_int, normalize_rgb
+from backend.services.plant_search.filter_backends import get_filter_backend
+from backend.services.plant_search.tiled_processing import (
+    preprocess_raster, plan_windows, tile_size_for_budget, estimate_working_set, pad_window
+)
+from backend.services.plant_search.region_coverage import RegionCoverage
+from backend.services.plant_search.resampling import resample_raster
+from backend.services.plant_search.preview import preprocess_preview, read_reduced
+from backend.services.plant_search.coarse_detection import candidate_regions, candidate_block_size
+
+TRANSFORM = Affine(0.02, 0, 500000, 0, -0.02, 4000000)
+
+
+def windows(shape, tile):
+    return [
+        Window(col, row, min(tile, shape[1] - col), min(tile, shape[0] - row))
+        for row in range(0, shape[0], tile)
+        for col in range(0, shape[1], tile)
+    ]
+
+
+# ✅ Planned windows cover the raster exactly once, block-aligned, within the memory budget
+@pytest.mark.parametrize("budget", [10_000_000, 50_000_000])
+def test_plan_windows_cover_raster_within_budget(budget):
+    tile_size = tile_size_for_budget(budget, halo=32)
+    assert tile_size % 256 == 0
+    assert tile_size == 256 or estimate_working_set(tile_size + 64, tile_size + 64) <= budget
+
+    coverage = np.zeros((1000, 1300), dtype=np.uint8)
+    for window in plan_windows(1300, 1000, tile_size, (256, 256)):
+        assert window.col_off % 256 == 0 and window.row_off % 256 == 0
+        coverage[window.toslices()] += 1
+        halo, (rows, cols) = pad_window(window, 32, 1300, 1000)
+        assert (halo.row_off + rows.start, halo.col_off + cols.start) == (window.row_off, window.col_off)
+        assert (rows.stop - rows.start, cols.stop - cols.start) == (window.height, window.width)
+    assert (coverage == 1).all()
+
+
+# ✅ Windowed CLAHE gives exactly the whole-image equalize_adapthist output
+@pytest.mark.parametrize("shape, tile", [((300, 257), 64), ((517, 389), 100), ((9, 7), 4)])
+def test_streaming_clahe_matches_whole_image(shape, tile):
+    rng = np.random.default_rng(1)
+    image = cv2.GaussianBlur(rng.integers(20, 230, shape).astype(np.uint8), (0, 0), 3)
+    expected = equalize_adapthist(image / 255.0, clip_limit=0.008)
+
+    clahe = StreamingCLAHE(shape, clip_limit=0.008)
+    for window in windows(shape, tile)[::-1]: # Histogram order doesn't matter
+        clahe.add(image[window.toslices()], window)
+    clahe.finalize()
+
+    levels = np.zeros(shape, dtype=np.uint16)
+    for window in windows(shape, tile):
+        values = image[window.toslices()]
+        levels[window.toslices()] = clahe.apply(values, window)
+        lower, upper = clahe.level_bounds(values.min(), values.max(), window)
+        assert lower <= levels[window.toslices()].min() and levels[window.toslices()].max() <= upper
+
+    assert np.array_equal(StreamingCLAHE.to_unit(levels, levels.min(), levels.max()), expected)
+
+
+# ✅ The uint8/uint16 filter chain, chunked by the memory budget, gives exactly the float64 chain
+@pytest.mark.parametrize("backend", ["reference", "opencv"])
+@pytest.mark.parametrize("constant", [False, True])
+def test_filter_exg_matches_float_chain(backend, constant):
+    rng = np.random.default_rng(2)
+    image = cv2.GaussianBlur(rng.integers(0, 255, (240, 310)).astype(np.uint8), (0, 0), 2)
+    if constant:
+        image[:] = 90
+
+    filters = get_filter_backend(backend)
+    smoothed = filters.bilateral(image, 9, 50, 15) / 255.0
+    expected = filters.open_close(equalize_adapthist(smoothed, clip_limit=CLAHE_CLIP_LIMIT), 7)
+
+    assert np.array_equal(filter_exg(image, backend=backend, max_memory_bytes=2_000_000), expected)
+
+
+# ✅ Integer ExG scaling is the exact floor; the float formula only falls one short on whole quotients
+def test_normalize_exg_matches_float_formula():
+    rng = np.random.default_rng(3)
+    image = rng.integers(0, 256, (400, 500, 3), dtype=np.uint8)
+    image[0, 0], image[0, 1] = (255, 0, 255), (0, 255, 0) # Full ExG range
+
+    for crop in (image, image[:, :, ::-1], image[150:170, 20:40]):
+        exg_int = calculate_exg_int(crop)
+        exg_float = calculate_exg(*normalize_rgb(crop))
+        scaled = normalize_exg(exg_int, exg_int.min(), exg_int.max(), chunk_rows=64)
+        float_scaled = normalize_exg(exg_float, exg_float.min(), exg_float.max())
+
+        offset, span = exg_int.astype(np.int64) - exg_int.min(), int(exg_int.max()) - int(exg_int.min())
+        assert np.array_equal(scaled, offset * 255 // span)
+        whole = offset * 255 % span == 0
+        assert np.array_equal(scaled[~whole], float_scaled[~whole])
+        assert np.isin(scaled[whole].astype(int) - float_scaled[whole], (0, 1)).all()
+
+
+@pytest.fixture
+def ortho(tmp_path):
+    """Noisy soil with green discs, as a tiled RGB GeoTIFF."""
+    rng = np.random.default_rng(0)
+    image = np.empty((600, 700, 3), dtype=np.uint8)
+    image[:] = (140, 120, 95)
+    for row, col, radius in zip(rng.integers(0, 600, 150), rng.integers(0, 700, 150), rng.integers(3, 20, 150)):
+        cv2.circle(image, (int(col), int(row)), int(radius), (70, 150, 60), -1)
+    image = np.clip(image + rng.normal(0, 12, image.shape), 0, 255).astype(np.uint8)
+
+    path = tmp_path / "ortho.tif"
+    with rasterio.open(path, "w", driver="GTiff", width=700, height=600, count=3, dtype="uint8",
+                       crs="EPSG:32613", transform=TRANSFORM, tiled=True, blockxsize=256, blockysize=256) as dst:
+        dst.write(np.moveaxis(image, -1, 0))
+    return path, image
+
+
+def read_band(path):
+    with rasterio.open(path) as src:
+        return src.read(1)
+
+
+# ✅ Tiled preprocessing gives exactly the whole-image result
+def test_preprocess_raster_matches_preprocess_image(ortho, tmp_path):
+    src_path, image = ortho
+    dst_path = tmp_path / "processed.tif"
+
+    # Budget small enough for 256px tiles
+    preprocess_raster(src_path, dst_path, max_memory_bytes=10_000_000, workers=1, filter_backend="opencv")
+
+    assert np.array_equal(read_band(dst_path), preprocess_image(image))
+
+
+# ✅ A process pool and concurrent serial runs give the serial result
+def test_preprocess_raster_workers_and_concurrent_runs(ortho, tmp_path):
+    src_path, image = ortho
+    expected = preprocess_image(image)
+
+    pooled = tmp_path / "pooled.tif"
+    preprocess_raster(src_path, pooled, max_memory_bytes=20_000_000, workers=2, filter_backend="opencv")
+    assert np.array_equal(read_band(pooled), expected)
+
+    # Serial runs in threads of one process share nothing
+    flipped_path = tmp_path / "flipped.tif"
+    with rasterio.open(src_path) as src:
+        profile = src.profile
+    with rasterio.open(flipped_path, "w", **profile) as dst:
+        dst.write(np.moveaxis(image[::-1], -1, 0).copy())
+    jobs = [(path, tmp_path / f"run_{i}.tif") for i, path in enumerate([src_path, flipped_path] * 2)]
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        list(pool.map(lambda job: preprocess_raster(
+            *job, max_memory_bytes=10_000_000, workers=1, filter_backend="opencv"), jobs))
+    flipped = preprocess_image(image[::-1].copy())
+    for i, (_, dst_path) in enumerate(jobs):
+        assert np.array_equal(read_band(dst_path), flipped if i % 2 else expected)
+
+
+# ✅ With a region, output is the whole-image result inside it and zero outside, whatever the tiling
+@pytest.mark.parametrize("block_size", [64, 256])
+def test_preprocess_raster_region(ortho, tmp_path, block_size):
+    src_path, image = ortho
+    expected = preprocess_image(image)
+    center = TRANSFORM * (250, 300)
+    region = RegionCoverage(Point(center).buffer(4), TRANSFORM, (600, 700), block_size)
+    assert 0 < region.coverage_fraction() < 1
+
+    for budget in (10_000_000, 1_000_000_000): # 256px tiles, one tile
+        dst_path = tmp_path / f"processed_{budget}.tif"
+        preprocess_raster(src_path, dst_path, max_memory_bytes=budget, workers=1,
+                          filter_backend="opencv", region=region)
+        output = read_band(dst_path)
+
+        inside = region.mask(Window(0, 0, 700, 600))
+        assert np.array_equal(output[inside], expected[inside])
+        assert not output[~inside].any()
+
+
+# ✅ Inside coarse candidates, output equals the full-resolution run over the whole raster
+def test_preprocess_raster_coarse_candidates(tmp_path):
+    rng = np.random.default_rng(4)
+    image = np.empty((600, 700, 3), dtype=np.uint8)
+    image[:] = (140, 120, 95)
+    for row, col, radius in zip(rng.integers(0, 600, 12), rng.integers(0, 700, 12), rng.integers(5, 20, 12)):
+        cv2.circle(image, (int(col), int(row)), int(radius), (70, 150, 60), -1)
+    image = np.clip(image + rng.normal(0, 12, image.shape), 0, 255).astype(np.uint8)
+    src_path = tmp_path / "sparse.tif"
+    with rasterio.open(src_path, "w", driver="GTiff", width=700, height=600, count=3, dtype="uint8",
+                       crs="EPSG:32613", transform=TRANSFORM, tiled=True, blockxsize=256, blockysize=256) as dst:
+        dst.write(np.moveaxis(image, -1, 0))
+
+    candidates_path = tmp_path / "candidates.geojson"
+    candidate_regions(src_path, threshold=0.3, dilation=0.5, max_size=175).to_file(candidates_path, driver="GeoJSON")
+    block_size = candidate_block_size(candidates_path, src_path)
+    region = RegionCoverage.from_file(candidates_path, src_path, block_size)
+    assert block_size == 128 and 0 < region.coverage_fraction() < 1
+
+    dst_path = tmp_path / "coarse.tif"
+    preprocess_raster(src_path, dst_path, max_memory_bytes=10_000_000, workers=1,
+                      filter_backend="opencv", region=region)
+    output, expected = read_band(dst_path), preprocess_image(image)
+
+    inside = region.mask(Window(0, 0, 700, 600))
+    assert np.array_equal(output[inside], expected[inside])
+    assert not output[~inside].any()
+
+
+# ✅ Resampled reads cover the same bounds, averaging source pixels
+def test_resample_raster_keeps_georeferencing(ortho, tmp_path):
+    src_path, image = ortho
+    dst_path = tmp_path / "resampled.tif"
+    resample_raster(src_path, dst_path, scale=0.5)
+
+    with rasterio.open(src_path) as src, rasterio.open(dst_path) as dst:
+        assert dst.bounds == src.bounds
+        assert dst.res == (0.04, 0.04)
+        resampled = np.moveaxis(dst.read(), 0, -1)
+
+    expected = image.reshape(300, 2, 350, 2, 3).mean(axis=(1, 3))
+    assert np.abs(resampled - expected).max() <= 1
+
+
+# ✅ Reduced previews cover the source bounds at the reported scale
+@pytest.mark.parametrize("overview_level, max_size", [(None, 350), (0, 2048)])
+def test_preview_scale_and_georeferencing(ortho, tmp_path, overview_level, max_size):
+    src_path, image = ortho
+    with rasterio.open(src_path, "r+") as src:
+        src.build_overviews([2, 4], Resampling.average)
+
+    dst_path, png_path = tmp_path / "preview.tif", tmp_path / "preview.png"
+    scale = preprocess_preview(src_path, dst_path, png_path, overview_level=overview_level, max_size=max_size)
+    assert scale == 0.5
+
+    reduced, _, _, _ = read_reduced(src_path, overview_level, max_size)
+    assert reduced.shape == (300, 350, 3)
+    with rasterio.open(src_path) as src, rasterio.open(dst_path) as dst:
+        assert dst.crs == src.crs
+        assert np.allclose(dst.bounds, src.bounds)
+        assert dst.res == (0.04, 0.04)
+        preview = dst.read(1)
+    assert np.array_equal(preview, preprocess_image(reduced, scale=scale))
+    assert np.array_equal(cv2.imread(str(png_path), cv2.IMREAD_GRAYSCALE), preview)